@@ -0,0 +1,427 @@
+import time
+import zlib
+import random
+import socket
+import threading
+import collections
+import numpy as np
+from plexflo.connect import protocol
+
+# Class holding the readings of a meter that have not been acknowledged yet
+class MeterQueue:
+
+    def __init__(self):
+
+        """
+        Description:
+        -----------
+        This class is used to hold the readings of a meter until the collector acknowledges them, with the sequence of the
+        next reading, of the first reading that has not been acknowledged and of the first that has not been sent on the current connection.
+
+        Parameters:
+        -----------
+        None
+
+        Returns:
+        --------
+        None
+        """
+
+        self.chunks = collections.deque()
+        self.next = 0
+        self.acked = 0
+        self.sent = 0
+
+# Class for one persistent connection of the client
+class Link:
+
+    def __init__(self, client, index):
+
+        """
+        Description:
+        -----------
+        This class is used to send the readings of its share of the meters over one connection, reconnecting with exponential backoff
+        whenever the connection is lost. A writer thread sends the readings and a reader thread receives the acknowledgements.
+
+        Parameters:
+        -----------
+        client: The client the connection belongs to (MeterClient)
+        index: The position of the connection in the pool (int)
+
+        Returns:
+        --------
+        None
+        """
+
+        self.client = client
+        self.index = index
+        self.meters = {}
+        self.dirty = set()
+        self.broken = False
+        self.sock = None
+        self.reconnects = 0
+
+        self.thread = threading.Thread(target = self.run, daemon = True)
+        self.thread.start()
+
+    def run(self):
+
+        client = self.client
+        delay = client.backoff
+
+        while not client.closing:
+
+            # Connecting, waiting twice as long after every failed attempt, with jitter so that many gateways do not retry in step
+            try:
+                sock = socket.create_connection((client.host, client.port), timeout = client.timeout)
+
+            except OSError as e:
+
+                print("Connection " + str(self.index) + " to " + client.host + ":" + str(client.port) + " failed (" + str(e) + "), retrying in " + str(round(delay, 2)) + " s")
+
+                with client.condition:
+                    client.condition.wait_for(lambda: client.closing, delay * random.uniform(0.5, 1.0))
+
+                delay = min(delay * 2, client.max_backoff)
+                continue
+
+            delay = client.backoff
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            sock.settimeout(None)
+
+            # Resending every reading that was not acknowledged on the previous connection
+            with client.condition:
+
+                self.sock = sock
+                self.broken = False
+
+                for meter_id, meter in self.meters.items():
+                    if meter.acked < meter.next:
+                        meter.sent = meter.acked
+                        self.dirty.add(meter_id)
+
+            reader = threading.Thread(target = self.receive, args = (sock,), daemon = True)
+            reader.start()
+
+            try:
+
+                while True:
+
+                    with client.condition:
+
+                        client.condition.wait_for(lambda: self.broken or client.closing or self.dirty)
+
+                        if self.broken or client.closing:
+                            break
+
+                        packet = self.take()
+
+                    sock.sendall(packet)
+
+            except OSError as e:
+                print("Connection " + str(self.index) + " lost: " + str(e))
+
+            finally:
+
+                # Closing the socket also ends the reader thread
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+
+                sock.close()
+                reader.join()
+
+                with client.condition:
+                    self.sock = None
+
+            if not client.closing:
+                self.reconnects += 1
+
+    def take(self):
+
+        # Encoding the readings that have not been sent on this connection, at most batch_size readings per frame
+        frames = []
+
+        for meter_id in self.dirty:
+
+            meter = self.meters[meter_id]
+            timestamps, values = [], []
+
+            if meter.sent >= meter.next:
+                continue
+
+            for sequence, chunk_timestamps, chunk_values in meter.chunks:
+
+                end = sequence + chunk_values.shape[0]
+
+                if end <= meter.sent:
+                    continue
+
+                start = max(meter.sent - sequence, 0)
+                timestamps.append(chunk_timestamps[start:])
+                values.append(chunk_values[start:])
+
+            timestamps, values = np.concatenate(timestamps), np.concatenate(values)
+
+            for start in range(0, values.shape[0], self.client.batch_size):
+                frames.append(protocol.encode(meter_id, timestamps[start:start + self.client.batch_size], values[start:start + self.client.batch_size], self.client.session, meter.sent + start))
+
+            meter.sent = meter.next
+            self.client.sent += values.shape[0]
+
+        self.dirty.clear()
+
+        return b"".join(frames)
+
+    def receive(self, sock):
+
+        client = self.client
+        decoder = protocol.Decoder()
+
+        try:
+
+            while True:
+
+                data = sock.recv(65536)
+
+                # The collector closed the connection
+                if not data:
+                    break
+
+                acks = [ack for ack in decoder.feed(data) if isinstance(ack, protocol.Ack) and ack.session == client.session]
+
+                with client.condition:
+
+                    for ack in acks:
+
+                        meter = self.meters.get(ack.meter_id)
+
+                        if meter is not None:
+                            client.release(meter, ack.sequence)
+
+                    client.condition.notify_all()
+
+        except Exception as e:
+            if not client.closing:
+                print("Connection " + str(self.index) + " failed: " + str(e))
+
+        finally:
+
+            with client.condition:
+                self.broken = True
+                client.condition.notify_all()
+
+# Class for sending the readings of many meters over a few persistent connections
+class MeterClient:
+
+    def __init__(self, host = "127.0.0.1", port = 5999, connections = 1, max_buffered = 1000000, batch_size = 900, backoff = 0.5, max_backoff = 30, timeout = 10, session = None):
+
+        """
+        Description:
+        -----------
+        This class is used to send the readings of many meters to a collector running the binary protocol, over one persistent
+        connection or a small pool of them. Every meter is always sent over the same connection, so its readings arrive in order.
+
+        Readings are numbered per meter and kept in a bounded buffer until the collector acknowledges them. When a connection is lost
+        it is reopened with exponential backoff and the readings that were not acknowledged are sent again from the first one,
+        the collector drops the ones it already received, so readings are neither lost nor duplicated.
+
+        Parameters:
+        -----------
+        host: The hostname of the collector (str)
+        port: The port of the collector (int)
+        connections: The number of connections the meters are spread over (int)
+        max_buffered: The largest number of readings waiting for an acknowledgement, send() waits for room beyond it (int)
+        batch_size: The largest number of readings in a frame (int)
+        backoff: The number of seconds before the first reconnection attempt (float)
+        max_backoff: The longest wait in seconds between two reconnection attempts (float)
+        timeout: The number of seconds a connection attempt may take (float)
+        session: The session of the client, readings are numbered per session, random by default (int)
+
+        Returns:
+        --------
+        None
+        """
+
+        self.host = host
+        self.port = port
+        self.max_buffered = max_buffered
+        self.batch_size = batch_size
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.session = random.getrandbits(63) if session is None else session
+
+        self.condition = threading.Condition()
+        self.closing = False
+        self.buffered = 0
+        self.sent = 0
+        self.acked = 0
+
+        self.links = [Link(self, i) for i in range(connections)]
+
+    def send(self, meter_id, timestamps, values, timeout = None):
+
+        """
+        Description:
+        -----------
+        This function is used to queue readings of a meter, from any thread. The readings are sent in the background.
+
+        Parameters:
+        -----------
+        meter_id: The id of the meter (str)
+        timestamps: The timestamps of the readings in nanoseconds since the epoch (numpy.ndarray or list)
+        values: The readings (numpy.ndarray or list)
+        timeout: The longest time in seconds to wait for room in the buffer, None waits as long as needed, 0 does not wait (float)
+
+        Returns:
+        --------
+        queued: Whether the readings were queued, False when the buffer stayed full for timeout seconds (bool)
+        """
+
+        timestamps = np.array(timestamps, dtype = np.int64).reshape(-1)
+        values = np.array(values, dtype = np.float32).reshape(-1)
+        n = values.shape[0]
+
+        # Raise an exception if the timestamps and readings do not pair up
+        if timestamps.shape != values.shape:
+            raise Exception("Timestamps and values must have the same number of readings")
+
+        # Raise an exception if the readings can never fit in the buffer
+        if n > self.max_buffered:
+            raise Exception("Cannot queue " + str(n) + " readings at once, the buffer holds " + str(self.max_buffered))
+
+        # There is nothing to send without readings
+        if n == 0:
+            return True
+
+        link = self.links[zlib.crc32(str(meter_id).encode("utf-8")) % len(self.links)]
+
+        with self.condition:
+
+            if not self.condition.wait_for(lambda: self.closing or self.buffered + n <= self.max_buffered, timeout):
+                return False
+
+            # Raise an exception if the client is closed
+            if self.closing:
+                raise Exception("The client is closed")
+
+            meter = link.meters.get(meter_id)
+
+            if meter is None:
+                meter = link.meters[meter_id] = MeterQueue()
+
+            meter.chunks.append((meter.next, timestamps, values))
+            meter.next += n
+            self.buffered += n
+
+            link.dirty.add(meter_id)
+            self.condition.notify_all()
+
+        return True
+
+    def release(self, meter, sequence):
+
+        # Dropping the readings before the acknowledged sequence, called with the condition held
+        sequence = min(sequence, meter.next)
+
+        if sequence <= meter.acked:
+            return
+
+        while meter.chunks:
+
+            start, timestamps, values = meter.chunks[0]
+            end = start + values.shape[0]
+
+            if end <= sequence:
+                meter.chunks.popleft()
+
+            elif start < sequence:
+                meter.chunks[0] = (sequence, timestamps[sequence - start:], values[sequence - start:])
+
+            if end > sequence:
+                break
+
+        self.buffered -= sequence - meter.acked
+        self.acked += sequence - meter.acked
+        meter.acked = sequence
+
+    def flush(self, timeout = None):
+
+        """
+        Description:
+        -----------
+        This function is used to wait until every queued reading has been acknowledged.
+
+        Parameters:
+        -----------
+        timeout: The longest time in seconds to wait, None waits as long as needed (float)
+
+        Returns:
+        --------
+        flushed: Whether every reading was acknowledged (bool)
+        """
+
+        with self.condition:
+            return self.condition.wait_for(lambda: self.buffered == 0, timeout)
+
+    def stats(self):
+
+        """
+        Description:
+        -----------
+        This function is used to count the readings of the client.
+
+        Parameters:
+        -----------
+        None
+
+        Returns:
+        --------
+        stats: The readings sent including the ones sent again, acknowledged and waiting for an acknowledgement, the meters and the reconnections (dict)
+        """
+
+        with self.condition:
+            return {
+                'sent': self.sent,
+                'acked': self.acked,
+                'buffered': self.buffered,
+                'meters': sum(len(link.meters) for link in self.links),
+                'reconnects': sum(link.reconnects for link in self.links),
+            }
+
+    def close(self, timeout = None):
+
+        """
+        Description:
+        -----------
+        This function is used to wait for the queued readings to be acknowledged, then close every connection.
+
+        Parameters:
+        -----------
+        timeout: The longest time in seconds to wait for the acknowledgements, None waits as long as needed (float)
+
+        Returns:
+        --------
+        flushed: Whether every reading was acknowledged before closing (bool)
+        """
+
+        flushed = self.flush(timeout)
+
+        with self.condition:
+            self.closing = True
+            self.condition.notify_all()
+
+            # Waking the reader threads blocked on their sockets
+            for link in self.links:
+                if link.sock is not None:
+                    try:
+                        link.sock.shutdown(socket.SHUT_RDWR)
+                    except OSError:
+                        pass
+
+        for link in self.links:
+            link.thread.join()
+
+        return flushed
@@ -0,0 +1,396 @@
+import sys
+import errno
+import socket
+import ctypes
+import ctypes.util
+from plexflo.connect import protocol
+
+# The size of the datagrams sent by default, the UDP payload of a 1500 byte Ethernet frame, so that datagrams are never fragmented
+datagram_size = 1472
+
+# Defining a function for counting the readings that fit in a datagram
+def max_readings(meter_id, size = datagram_size):
+
+    """
+    Description:
+    -----------
+    This function is used to find the largest number of readings of a meter a sequenced frame can carry within a datagram.
+
+    Parameters:
+    -----------
+    meter_id: The id of the meter (str)
+    size: The largest datagram in bytes (int)
+
+    Returns:
+    --------
+    n: The number of readings (int)
+    """
+
+    overhead = protocol.header.size + protocol.meter_header.size + len(str(meter_id).encode("utf-8")) + protocol.sequence_header.size + protocol.count_header.size
+    n = (size - overhead) // 12
+
+    # Raise an exception if not even one reading fits
+    if n < 1:
+        raise Exception("A datagram of " + str(size) + " bytes cannot hold a reading of meter " + str(meter_id))
+
+    return n
+
+# Defining a function for creating the receiving UDP socket
+def datagram_socket(host = "127.0.0.1", port = 5999, reuse_port = False, receive_buffer = 8 * 1024 * 1024):
+
+    """
+    Description:
+    -----------
+    This function is used to create the non-blocking UDP socket of the collector, with a large receive buffer to absorb bursts.
+    The kernel may cap the buffer, see net.core.rmem_max on Linux.
+
+    Parameters:
+    -----------
+    host: The hostname of the server (str)
+    port: The port of the server (int)
+    reuse_port: Whether other processes can receive on the same port, the kernel spreads the senders across them (bool)
+    receive_buffer: The size of the receive buffer in bytes (int)
+
+    Returns:
+    --------
+    s: The UDP socket (socket)
+    """
+
+    # Raise an exception if the port cannot be shared on this platform
+    if reuse_port and not hasattr(socket, "SO_REUSEPORT"):
+        raise Exception("SO_REUSEPORT is not supported on this platform, use a single worker")
+
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    s.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, receive_buffer)
+
+    if reuse_port:
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+
+    s.bind((host, port))
+    s.setblocking(False)
+
+    return s
+
+# The structures of recvmmsg, see recvmmsg(2)
+class iovec(ctypes.Structure):
+    _fields_ = [("iov_base", ctypes.c_void_p), ("iov_len", ctypes.c_size_t)]
+
+class msghdr(ctypes.Structure):
+    _fields_ = [
+        ("msg_name", ctypes.c_void_p), ("msg_namelen", ctypes.c_uint32),
+        ("msg_iov", ctypes.POINTER(iovec)), ("msg_iovlen", ctypes.c_size_t),
+        ("msg_control", ctypes.c_void_p), ("msg_controllen", ctypes.c_size_t),
+        ("msg_flags", ctypes.c_int),
+    ]
+
+class mmsghdr(ctypes.Structure):
+    _fields_ = [("msg_hdr", msghdr), ("msg_len", ctypes.c_uint)]
+
+# Defining a function for finding recvmmsg in the C library
+def load_recvmmsg():
+
+    """
+    Description:
+    -----------
+    This function is used to find recvmmsg, which only Linux provides.
+
+    Parameters:
+    -----------
+    None
+
+    Returns:
+    --------
+    recvmmsg: The C function, None when it is not available (ctypes function)
+    """
+
+    if not sys.platform.startswith("linux"):
+        return None
+
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or None, use_errno = True)
+        recvmmsg = libc.recvmmsg
+
+    except (OSError, AttributeError):
+        return None
+
+    recvmmsg.argtypes = [ctypes.c_int, ctypes.POINTER(mmsghdr), ctypes.c_uint, ctypes.c_int, ctypes.c_void_p]
+    recvmmsg.restype = ctypes.c_int
+
+    return recvmmsg
+
+# Class for receiving many datagrams at once
+class BulkReceiver:
+
+    def __init__(self, sock, batch = 64, size = 65536, bulk = True):
+
+        """
+        Description:
+        -----------
+        This class is used to drain a non-blocking UDP socket. On Linux recvmmsg fills up to batch datagrams in a single system call,
+        elsewhere the datagrams are read one by one into a preallocated buffer.
+
+        Parameters:
+        -----------
+        sock: The non-blocking UDP socket (socket)
+        batch: The largest number of datagrams received in one call (int)
+        size: The largest datagram received, longer datagrams are truncated and fail to decode (int)
+        bulk: Whether recvmmsg is used when it is available (bool)
+
+        Returns:
+        --------
+        None
+        """
+
+        self.sock = sock
+        self.batch = batch
+        self.size = size
+        self.buffer = bytearray(batch * size)
+        self.view = memoryview(self.buffer)
+
+        self.recvmmsg = load_recvmmsg() if bulk else None
+
+        # Pointing every message header at its own slice of the buffer
+        if self.recvmmsg is not None:
+
+            base = ctypes.addressof(ctypes.c_char.from_buffer(self.buffer))
+
+            self.iovecs = (iovec * batch)()
+            self.messages = (mmsghdr * batch)()
+
+            for i in range(batch):
+                self.iovecs[i].iov_base = base + i * size
+                self.iovecs[i].iov_len = size
+                self.messages[i].msg_hdr.msg_iov = ctypes.pointer(self.iovecs[i])
+                self.messages[i].msg_hdr.msg_iovlen = 1
+
+    def receive(self):
+
+        """
+        Description:
+        -----------
+        This function is used to receive the datagrams that are waiting, at most batch of them.
+
+        Parameters:
+        -----------
+        None
+
+        Returns:
+        --------
+        datagrams: The received datagrams, copied out of the buffer (list)
+        """
+
+        if self.recvmmsg is not None:
+
+            n = self.recvmmsg(self.sock.fileno(), self.messages, self.batch, socket.MSG_DONTWAIT, None)
+
+            if n < 0:
+
+                err = ctypes.get_errno()
+
+                if err in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                    return []
+
+                raise OSError(err, "recvmmsg failed")
+
+            return [bytes(self.view[i * self.size:i * self.size + self.messages[i].msg_len]) for i in range(n)]
+
+        datagrams = []
+
+        while len(datagrams) < self.batch:
+
+            try:
+                n = self.sock.recv_into(self.view[:self.size])
+            except (BlockingIOError, InterruptedError):
+                break
+
+            datagrams.append(bytes(self.view[:n]))
+
+        return datagrams
+
+# Class holding the sequence state of a meter
+class MeterSequence:
+
+    def __init__(self, session, sequence):
+
+        """
+        Description:
+        -----------
+        This class is used to hold the sequence of the next reading expected from a meter, the gaps of readings that have not arrived,
+        the end of the last gap given up and the counters of the meter.
+
+        Parameters:
+        -----------
+        session: The session of the sender (int)
+        sequence: The sequence of the first reading received (int)
+
+        Returns:
+        --------
+        None
+        """
+
+        self.session = session
+        self.next = sequence
+        self.gaps = []
+        self.horizon = sequence
+
+        self.received = 0
+        self.duplicates = 0
+        self.out_of_order = 0
+        self.missing = 0
+        self.lost = 0
+        self.expired = 0
+
+# Class for detecting lost, duplicated and reordered datagrams
+class SequenceTracker:
+
+    def __init__(self, max_gaps = 64):
+
+        """
+        Description:
+        -----------
+        This class is used to follow the sequences of many meters sent over UDP. A datagram beyond the next expected reading opens a gap,
+        a late datagram filling a gap is accepted as out of order, and readings received before are dropped as duplicates.
+        Only the last max_gaps gaps of a meter can still be filled, the readings of older ones are counted as lost instead of missing.
+        Readings below the last gap given up, or below the first reading of the sequence, are dropped as expired, as they can no longer be
+        told apart from duplicates.
+
+        The first datagram of a meter or of a new session starts its sequence, so readings lost before it are not counted.
+
+        Parameters:
+        -----------
+        max_gaps: The number of open gaps kept per meter (int)
+
+        Returns:
+        --------
+        None
+        """
+
+        self.max_gaps = max_gaps
+        self.meters = {}
+
+        self.received = 0
+        self.duplicates = 0
+        self.out_of_order = 0
+        self.missing = 0
+        self.lost = 0
+        self.expired = 0
+
+    def accept(self, meter_id, session, sequence, count):
+
+        """
+        Description:
+        -----------
+        This function is used to check the readings of a datagram against the sequence of their meter.
+
+        Parameters:
+        -----------
+        meter_id: The id of the meter (str)
+        session: The session of the sender (int)
+        sequence: The sequence of the first reading of the datagram (int)
+        count: The number of readings of the datagram (int)
+
+        Returns:
+        --------
+        slices: The (offset, length) of the readings of the datagram that were not received before (list)
+        """
+
+        meter = self.meters.get(meter_id)
+
+        if meter is None or meter.session != session:
+            meter = self.meters[meter_id] = MeterSequence(session, sequence)
+
+        end = sequence + count
+        slices = []
+        late = 0
+
+        # Filling the gaps the datagram overlaps, when it arrives after readings with a higher sequence
+        if sequence < meter.next and meter.gaps:
+
+            gaps = []
+
+            for start, stop in meter.gaps:
+
+                first, last = max(start, sequence), min(stop, end)
+
+                if first >= last:
+                    gaps.append((start, stop))
+                    continue
+
+                slices.append((first - sequence, last - first))
+                late += last - first
+
+                if start < first:
+                    gaps.append((start, first))
+                if last < stop:
+                    gaps.append((last, stop))
+
+            meter.gaps = gaps
+
+        # Accepting the readings beyond the next expected one, opening a gap when some were skipped
+        if end > meter.next:
+
+            if sequence > meter.next:
+
+                meter.gaps.append((meter.next, sequence))
+                meter.missing += sequence - meter.next
+                self.missing += sequence - meter.next
+
+                # Giving up on the oldest gaps, moving their readings from missing to lost
+                if len(meter.gaps) > self.max_gaps:
+
+                    dropped = meter.gaps[:len(meter.gaps) - self.max_gaps]
+                    del meter.gaps[:len(dropped)]
+
+                    lost = sum(stop - start for start, stop in dropped)
+                    meter.horizon = dropped[-1][1]
+                    meter.missing -= lost
+                    meter.lost += lost
+                    self.missing -= lost
+                    self.lost += lost
+
+            first = max(sequence, meter.next)
+            slices.append((first - sequence, end - first))
+            meter.next = end
+
+        accepted = sum(length for _, length in slices)
+
+        # The readings below the horizon were either received before or belong to a gap given up, which is not known any more
+        expired = max(0, min(end, meter.horizon) - sequence)
+
+        meter.received += accepted
+        meter.out_of_order += late
+        meter.missing -= late
+        meter.expired += expired
+        meter.duplicates += count - accepted - expired
+
+        self.received += accepted
+        self.out_of_order += late
+        self.missing -= late
+        self.expired += expired
+        self.duplicates += count - accepted - expired
+
+        return slices
+
+    def stats(self, meter_id = None):
+
+        """
+        Description:
+        -----------
+        This function is used to read the counters of a meter or the totals of every meter.
+
+        Parameters:
+        -----------
+        meter_id: The id of the meter, None for the totals (str)
+
+        Returns:
+        --------
+        stats: The readings received, dropped as duplicates, received out of order, still missing, lost in the gaps given up and dropped as expired,
+               and the open gaps or the number of meters (dict)
+        """
+
+        if meter_id is None:
+            return {'meters': len(self.meters), 'received': self.received, 'duplicates': self.duplicates, 'out_of_order': self.out_of_order, 'missing': self.missing, 'lost': self.lost, 'expired': self.expired}
+
+        meter = self.meters[meter_id]
+
+        return {'received': meter.received, 'duplicates': meter.duplicates, 'out_of_order': meter.out_of_order, 'missing': meter.missing, 'lost': meter.lost, 'expired': meter.expired, 'gaps': list(meter.gaps)}
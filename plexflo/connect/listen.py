@@ -1,10 +1,11 @@
 import sys
-import time
 import signal
 import socket
 import pandas as pd
 from datetime import datetime
 from _thread import start_new_thread
+from plexflo.connect import server
+from plexflo.connect.metrics import PacketSampler
 
 s = None
 
@@ -35,11 +36,8 @@ def signal_handler(signal, frame):
     # Exit the program
     sys.exit(1)
 
-# Catch the SIGINT signal
-signal.signal(signal.SIGINT, signal_handler)
-
 # Defining a function for handling the data from a client
-def client_handler(conn, addr):
+def client_handler(conn, addr, log_sample = 0):
 
     """
     Description:
@@ -50,6 +48,7 @@ def client_handler(conn, addr):
     -----------
     conn: The connection of the client (socket)
     addr: The address of the client (tuple)
+    log_sample: The share of the received packets printed for debugging, 0 prints none and 1 every packet (float)
 
     Returns:
     --------
@@ -58,6 +57,7 @@ def client_handler(conn, addr):
 
     # List to hold the data from the client
     data_list = []
+    sampler = PacketSampler(log_sample)
 
     while True:
         
@@ -85,7 +85,7 @@ def client_handler(conn, addr):
                     
                     # If the packet is not empty, append the data to the list after decoding it
                     data_list.append(packet.decode())
-                    print(f"Received {packet!r}")
+                    sampler.log(addr, packet)
                 
                 # Handle any excpetions
                 except Exception as e:
@@ -100,7 +100,7 @@ def client_handler(conn, addr):
     return    
 
 # Defining a function for accepting connections from clients
-def accept_connections(s):
+def accept_connections(s, log_sample = 0):
     
         """
         Description:
@@ -110,6 +110,7 @@ def accept_connections(s):
         Parameters:
         -----------
         s: The socket of the server (socket)
+        log_sample: The share of the received packets printed for debugging (float)
         
         Returns:
         --------
@@ -120,25 +121,38 @@ def accept_connections(s):
         conn, addr = s.accept()
 
         # Spawn a thread for the client
-        start_new_thread(client_handler, (conn, addr))
+        start_new_thread(client_handler, (conn, addr, log_sample))
 
 # Defining a function for starting a multi-threaded server
-def collect(host = "127.0.0.1", port = 5999):
+def collect(host = "127.0.0.1", port = 5999, mode = "thread", workers = 1, **options):
 
     """
     Description:
     -----------
     This function is used to collect create a server capable of collecing data from multiple clients.
+    The thread mode spawns a thread for every client. The asyncio server, opt-in with mode = "async", serves every client in one process, see server.Collector.
 
     Parameters:
     -----------
     host: The hostname of the client (str)
     port: The port of the client (int)
+    mode: Either "thread" or "async" (str)
+    workers: The number of processes sharing the port, async mode only (int)
+    options: The keyword arguments of server.Collector, async mode only apart from log_sample (dict)
 
     Returns:
     --------
     None
     """
+
+    if mode == "async":
+        server.serve(host, port, workers, **options)
+        return
+
+    # Raise an exception if the mode is not supported
+    if mode != "thread":
+        raise Exception("Mode must be either 'thread' or 'async'")
+
     # localhost IP Address
     HOST = host
 
@@ -156,6 +170,9 @@ def collect(host = "127.0.0.1", port = 5999):
         s.bind((HOST, PORT))
         s.listen()
 
+        # Catch the SIGINT signal
+        signal.signal(signal.SIGINT, signal_handler)
+
         # Setting a timeout for the socket to close if there are no connections for 30s
         # s.settimeout(30)
 
@@ -164,8 +181,7 @@ def collect(host = "127.0.0.1", port = 5999):
         # Accept connections from clients
         while True:
                 
-            accept_connections(s)
-            time.sleep(1)   
+            accept_connections(s, options.get("log_sample", 0))
 
     # Handle any exceptions
     except Exception as e:
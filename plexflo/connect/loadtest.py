@@ -0,0 +1,371 @@
+import os
+import sys
+import time
+import socket
+import signal
+import tempfile
+import asyncio
+import multiprocessing
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from plexflo.connect import protocol as frames
+from plexflo.connect.server import Collector
+from plexflo.datastream.utils import peak_rss_mb
+
+# The number of latency samples kept by the collector, a uniform sample of all frames
+latency_samples = 100000
+
+# Defining a function for finding a free port on the loopback interface
+def free_port(kind = socket.SOCK_STREAM):
+
+    """
+    Description:
+    -----------
+    This function is used to find a port nothing listens on.
+
+    Parameters:
+    -----------
+    kind: The type of the socket, socket.SOCK_STREAM or socket.SOCK_DGRAM (int)
+
+    Returns:
+    --------
+    port: The free port (int)
+    """
+
+    with socket.socket(socket.AF_INET, kind) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+# Defining a function for reading the resources used by this process
+def usage():
+
+    """
+    Description:
+    -----------
+    This function is used to read the CPU time and the peak resident memory of the process so far, see datastream.utils.peak_rss_mb.
+
+    Parameters:
+    -----------
+    None
+
+    Returns:
+    --------
+    cpu: The user and system CPU time in seconds, None when it cannot be read on this platform (float)
+    rss: The peak resident memory in MB, None when it cannot be read on this platform (float)
+    """
+
+    try:
+        import resource
+    except ImportError:
+        return None, None
+
+    rusage = resource.getrusage(resource.RUSAGE_SELF)
+
+    return rusage.ru_utime + rusage.ru_stime, peak_rss_mb()
+
+# Class for a collector measuring the latency of the readings it receives
+class ProbedCollector(Collector):
+
+    def __init__(self, *args, **kwargs):
+
+        """
+        Description:
+        -----------
+        This class is used to run the collector while measuring the end-to-end latency of every frame, from the timestamp of its last
+        reading, which the simulated meters set to the time they send the frame, to the moment the collector has processed it.
+        Sender and collector share the clock of the host, so the latency is only meaningful on loopback.
+
+        Parameters:
+        -----------
+        args: The arguments of the collector (list)
+        kwargs: The keyword arguments of the collector (dict)
+
+        Returns:
+        --------
+        None
+        """
+
+        super().__init__(*args, **kwargs)
+
+        self.latencies = np.empty(latency_samples, dtype = np.float64)
+        self.frames_seen = 0
+        self.rng = np.random.default_rng(0)
+
+    def process(self, conn, packet, received = None):
+
+        super().process(conn, packet, received)
+
+        if not isinstance(packet, frames.Frame) or packet.values.shape[0] == 0:
+            return
+
+        latency = (time.time_ns() - int(packet.timestamps[-1])) / 1e9
+
+        # Keeping a uniform sample of the latencies with reservoir sampling, so long runs use a fixed amount of memory
+        if self.frames_seen < latency_samples:
+            self.latencies[self.frames_seen] = latency
+        else:
+            slot = self.rng.integers(0, self.frames_seen + 1)
+            if slot < latency_samples:
+                self.latencies[slot] = latency
+
+        self.frames_seen += 1
+
+# Defining a function for running the collector of a load test
+def run_server(port, protocol, options, results):
+
+    """
+    Description:
+    -----------
+    This function is used as the target of the collector process. It reports when it is ready, and when it is shut down
+    reports the stats, the latency sample and the resources it used.
+
+    Parameters:
+    -----------
+    port: The port of the collector (int)
+    protocol: The protocol of the collector (str)
+    options: The keyword arguments of the collector (dict)
+    results: The queue the collector reports to (multiprocessing.Queue)
+
+    Returns:
+    --------
+    None
+    """
+
+    collector = ProbedCollector("127.0.0.1", port, frame_protocol = protocol, **options)
+
+    async def serve():
+
+        await collector.start()
+
+        loop = asyncio.get_running_loop()
+        loop.add_signal_handler(signal.SIGTERM, collector.stopping.set)
+
+        start_cpu, _ = usage()
+        results.put(("ready", None))
+
+        started = time.perf_counter()
+        await collector.stopping.wait()
+        seconds = time.perf_counter() - started
+
+        stats = collector.stats()
+        await collector.close()
+
+        cpu, rss = usage()
+
+        results.put(("done", {
+            'stats': stats,
+            'latencies': collector.latencies[:min(collector.frames_seen, latency_samples)],
+            'cpu_seconds': None if cpu is None else cpu - start_cpu,
+            'seconds': seconds,
+            'peak_rss_mb': rss,
+        }))
+
+    # Keeping the prints of every connection out of the report
+    with open(os.devnull, "w") as devnull:
+        sys.stdout = devnull
+        asyncio.run(serve())
+
+# Defining a function for simulating meters
+def run_meters(port, protocol, meter_ids, rate, batch_size, duration, start_at, results):
+
+    """
+    Description:
+    -----------
+    This function is used as the target of a load process, simulating meters as asyncio tasks. Every meter connects at start_at,
+    then sends rate readings per second in frames of batch_size readings for duration seconds, stamping the readings with the time they are sent.
+
+    Parameters:
+    -----------
+    port: The port of the collector (int)
+    protocol: Either "text", "binary" or "udp" (str)
+    meter_ids: The ids of the meters simulated by this process (list)
+    rate: The number of readings per second of every meter (float)
+    batch_size: The number of readings in a frame, a text packet always holds one (int)
+    duration: The number of seconds the meters send for (float)
+    start_at: The time.time() the meters start connecting at, shared by every load process (float)
+    results: The queue the process reports the readings sent, the connection setup times and the failed meters to (multiprocessing.Queue)
+
+    Returns:
+    --------
+    None
+    """
+
+    size = 1 if protocol == "text" else batch_size
+    interval = size / rate
+
+    async def meter(meter_id, setups, counts):
+
+        # Spreading the first frames of the meters over one interval so that they do not all send at once
+        await asyncio.sleep(max(start_at - time.time(), 0) + np.random.uniform(0, interval))
+
+        started = time.perf_counter()
+
+        if protocol == "udp":
+            transport, _ = await asyncio.get_running_loop().create_datagram_endpoint(asyncio.DatagramProtocol, remote_addr = ("127.0.0.1", port))
+            writer = None
+        else:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+
+        setups.append(time.perf_counter() - started)
+
+        sent, sequence = 0, 0
+        end = started + duration
+        due = time.perf_counter()
+        values = np.random.rand(size).astype(np.float32)
+
+        while due < end:
+
+            timestamps = np.full(size, time.time_ns(), dtype = np.int64)
+
+            if protocol == "udp":
+                transport.sendto(frames.encode(meter_id, timestamps, values, 1, sequence))
+                sequence += size
+
+            elif protocol == "binary":
+                writer.write(frames.encode(meter_id, timestamps, values))
+                await writer.drain()
+
+            else:
+                writer.write(str(float(values[0])).encode())
+                await writer.drain()
+
+            sent += size
+
+            # Pacing the frames on a fixed schedule, a meter that falls behind sends its late frames right away
+            due += interval
+            await asyncio.sleep(max(due - time.perf_counter(), 0))
+
+        if protocol == "udp":
+            transport.close()
+        else:
+            writer.close()
+            await writer.wait_closed()
+
+        counts.append(sent)
+
+    async def main():
+
+        setups, counts = [], []
+        outcomes = await asyncio.gather(*[meter(meter_id, setups, counts) for meter_id in meter_ids], return_exceptions = True)
+
+        return sum(counts), setups, sum(isinstance(outcome, Exception) for outcome in outcomes)
+
+    results.put(asyncio.run(main()))
+
+# Function to measure how many simulated meters the collector sustains
+def run(meters = (10, 100, 1000), rate = 1.0, batch_size = 1, duration = 10, protocol = "binary", processes = 1, collector_options = None, out_fname = None):
+
+    """
+    Description:
+    -----------
+    This function is used to load test the collector on loopback. For every number of meters a collector is started in its own process,
+    the meters are simulated as asyncio tasks spread over processes, and the collector is shut down once they are done.
+
+    Parameters:
+    -----------
+    meters: The numbers of meters to be simulated, one run each (tuple)
+    rate: The number of readings per second of every meter (float)
+    batch_size: The number of readings in a frame, which sets the payload size: 12 bytes per reading plus the frame header and meter id (int)
+    duration: The number of seconds the meters send for (float)
+    protocol: Either "text", "binary" or "udp" (str)
+    processes: The number of processes simulating the meters (int)
+    collector_options: The keyword arguments of the collector, see server.Collector. Without a storage the readings are stored
+                       in a temporary folder that is removed after every run, so no files are left behind (dict)
+    out_fname: The file name of the exported results inside output/files, None only returns them (str)
+
+    Returns:
+    --------
+    results: The dataframe with one row per number of meters: the readings sent and received per second, the failed meters,
+             the connection setup time percentiles, the end-to-end latency percentiles, None in text mode as text packets carry no timestamp,
+             and the CPU use of the collector averaged from its start to its shutdown and its peak memory (pandas.DataFrame)
+    """
+
+    # Raise an exception if the protocol is not supported
+    if protocol not in ("text", "binary", "udp"):
+        raise Exception("Protocol must be either 'text', 'binary' or 'udp'")
+
+    context = multiprocessing.get_context("spawn")
+    options = dict(collector_options or {})
+    options.setdefault("max_connections", max(meters) + 1000)
+    options.setdefault("backlog", 4096)
+
+    rows = []
+
+    for n_meters in meters:
+
+        port = free_port(socket.SOCK_DGRAM if protocol == "udp" else socket.SOCK_STREAM)
+        results = context.Queue()
+
+        # Storing the readings in a temporary folder, as without a storage every meter would leave a csv file in the working directory
+        folder = tempfile.TemporaryDirectory() if options.get("storage") is None else None
+        run_options = options if folder is None else dict(options, storage = {'root': folder.name})
+
+        server = context.Process(target = run_server, args = (port, protocol, run_options, results))
+        server.start()
+
+        # Raise an exception if the collector did not start
+        kind, _ = results.get(timeout = 60)
+        if kind != "ready":
+            raise Exception("The collector did not start")
+
+        # Starting the meters a little later so that every load process is running when they connect
+        meter_ids = ["meter-" + str(i) for i in range(n_meters)]
+        start_at = time.time() + 2
+        loads = context.Queue()
+
+        clients = [context.Process(target = run_meters, args = (port, protocol, meter_ids[i::processes], rate, batch_size, duration, start_at, loads)) for i in range(processes)]
+
+        for client in clients:
+            client.start()
+
+        outcomes = [loads.get() for _ in clients]
+
+        for client in clients:
+            client.join()
+
+        # Giving the collector a moment to process what is still queued before shutting it down
+        time.sleep(1)
+        server.terminate()
+
+        kind, report = results.get(timeout = 120)
+        server.join()
+
+        if folder is not None:
+            folder.cleanup()
+
+        sent = sum(outcome[0] for outcome in outcomes)
+        setups = np.concatenate([np.asarray(outcome[1], dtype = np.float64) for outcome in outcomes]) * 1000
+        latencies = report['latencies'] * 1000
+        counters = report['stats']['counters']
+
+        rows.append({
+            "meters": n_meters,
+            "protocol": protocol,
+            "rate": rate,
+            "batch_size": batch_size,
+            "failed_meters": sum(outcome[2] for outcome in outcomes),
+            "sent_per_second": sent / duration,
+            "received_per_second": counters['readings'] / duration,
+            "received_share": counters['readings'] / sent if sent else None,
+            "setup_p50_ms": float(np.percentile(setups, 50)) if setups.size else None,
+            "setup_p99_ms": float(np.percentile(setups, 99)) if setups.size else None,
+            "latency_p50_ms": float(np.percentile(latencies, 50)) if latencies.size else None,
+            "latency_p95_ms": float(np.percentile(latencies, 95)) if latencies.size else None,
+            "latency_p99_ms": float(np.percentile(latencies, 99)) if latencies.size else None,
+            "server_cpu_percent": None if report['cpu_seconds'] is None else 100 * report['cpu_seconds'] / report['seconds'],
+            "server_peak_rss_mb": report['peak_rss_mb'],
+        })
+
+        print("meters: " + str(n_meters) + ", readings/s: " + str(round(rows[-1]["received_per_second"], 1)) + ", latency p99: " + str(rows[-1]["latency_p99_ms"]) + " ms")
+
+    results = pd.DataFrame(rows)
+
+    if out_fname is not None:
+        Path(os.path.join(os.getcwd(), "output", "files")).mkdir(parents=True, exist_ok=True)
+        results.to_csv(os.path.join(os.getcwd(), "output", "files", out_fname), index = False)
+
+    return results
+
+if __name__ == "__main__":
+    print(run().to_string(index = False))
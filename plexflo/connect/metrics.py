@@ -0,0 +1,388 @@
+import time
+import asyncio
+import threading
+
+# The bucket bounds in seconds of the latency and duration histograms
+latency_buckets = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60)
+duration_buckets = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)
+
+# Class for a cumulative histogram in the Prometheus style
+class Histogram:
+
+    def __init__(self, buckets):
+
+        """
+        Description:
+        -----------
+        This class is used to count observations into cumulative buckets, with their sum and count.
+
+        Parameters:
+        -----------
+        buckets: The upper bounds of the buckets in increasing order (tuple)
+
+        Returns:
+        --------
+        None
+        """
+
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+
+        """
+        Description:
+        -----------
+        This function is used to add an observation.
+
+        Parameters:
+        -----------
+        value: The observed value (float)
+
+        Returns:
+        --------
+        None
+        """
+
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+        self.sum += value
+        self.count += 1
+
+    def snapshot(self):
+
+        """
+        Description:
+        -----------
+        This function is used to read the histogram.
+
+        Parameters:
+        -----------
+        None
+
+        Returns:
+        --------
+        histogram: The cumulative count of every bucket bound, the sum and the count of the observations (dict)
+        """
+
+        cumulative, total = {}, 0
+
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            cumulative[bound] = total
+
+        return {'buckets': cumulative, 'sum': self.sum, 'count': self.count}
+
+# Class for the counters and histograms of the collector
+class Metrics:
+
+    def __init__(self):
+
+        """
+        Description:
+        -----------
+        This class is used to hold the totals of the collector that outlive a connection, updated from the event loop and from the threads
+        writing files. The state of the connections themselves is read from the collector, see Collector.stats().
+
+        Parameters:
+        -----------
+        None
+
+        Returns:
+        --------
+        None
+        """
+
+        self.lock = threading.Lock()
+        self.started = time.time()
+
+        self.counters = {
+            'connections': 0,
+            'refused_connections': 0,
+            'bytes': 0,
+            'readings': 0,
+            'dropped_packets': 0,
+            'failed_packets': 0,
+            'frame_errors': 0,
+            'export_errors': 0,
+            'duplicate_readings': 0,
+            'missing_readings': 0,
+            'out_of_order_readings': 0,
+            'lost_readings': 0,
+            'expired_readings': 0,
+            'persisted_readings': 0,
+        }
+
+        self.persist_latency = Histogram(latency_buckets)
+        self.flush_duration = Histogram(duration_buckets)
+
+    def add(self, name, value = 1):
+
+        """
+        Description:
+        -----------
+        This function is used to increase a counter.
+
+        Parameters:
+        -----------
+        name: The name of the counter (str)
+        value: The increase (int)
+
+        Returns:
+        --------
+        None
+        """
+
+        with self.lock:
+            self.counters[name] += value
+
+    def observe_write(self, rows, latency, seconds):
+
+        """
+        Description:
+        -----------
+        This function is used to record a write of readings to disk, as the on_write of a ChunkStore or after a file export.
+
+        Parameters:
+        -----------
+        rows: The number of readings written (int)
+        latency: The seconds the oldest reading waited from its receipt to the end of the write, None when unknown (float)
+        seconds: The duration of the write (float)
+
+        Returns:
+        --------
+        None
+        """
+
+        with self.lock:
+
+            self.counters['persisted_readings'] += rows
+            self.flush_duration.observe(seconds)
+
+            if latency is not None:
+                self.persist_latency.observe(latency)
+
+    def snapshot(self):
+
+        """
+        Description:
+        -----------
+        This function is used to read the counters and histograms.
+
+        Parameters:
+        -----------
+        None
+
+        Returns:
+        --------
+        metrics: The counters, the persist latency and flush duration histograms and the uptime in seconds (dict)
+        """
+
+        with self.lock:
+            return {
+                'uptime_seconds': time.time() - self.started,
+                'counters': dict(self.counters),
+                'persist_latency_seconds': self.persist_latency.snapshot(),
+                'flush_duration_seconds': self.flush_duration.snapshot(),
+            }
+
+# Class for printing a sample of the received packets
+class PacketSampler:
+
+    def __init__(self, rate = 0):
+
+        """
+        Description:
+        -----------
+        This class is used to print one in every 1 / rate received packets, so that debugging output does not slow down the collector.
+
+        Parameters:
+        -----------
+        rate: The share of the packets printed, 0 prints none and 1 every packet (float)
+
+        Returns:
+        --------
+        None
+        """
+
+        self.every = round(1 / rate) if rate > 0 else 0
+        self.count = 0
+
+    def log(self, addr, packet):
+
+        """
+        Description:
+        -----------
+        This function is used to print the packet when it is part of the sample.
+
+        Parameters:
+        -----------
+        addr: The address of the client (tuple)
+        packet: The received packet (bytes or protocol.Frame)
+
+        Returns:
+        --------
+        None
+        """
+
+        if not self.every:
+            return
+
+        self.count += 1
+
+        if self.count % self.every == 0:
+
+            if isinstance(packet, bytes):
+                print(f"Received {packet!r} from {addr}")
+            else:
+                print(f"Received {packet.values.shape[0]} readings of meter {packet.meter_id} from {addr}")
+
+# Defining a function for escaping a label value
+def label(value):
+
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+# Defining a function for writing the stats of the collector in the Prometheus text format
+def render(stats):
+
+    """
+    Description:
+    -----------
+    This function is used to write the stats of a collector in the Prometheus text exposition format.
+    The per client rates are the ones of the last second, the counters are meant for rate() in Prometheus.
+
+    Parameters:
+    -----------
+    stats: The stats of the collector (dict, see Collector.stats())
+
+    Returns:
+    --------
+    text: The metrics in the Prometheus text format (str)
+    """
+
+    lines = []
+
+    def metric(name, kind, help, samples):
+
+        lines.append("# HELP plexflo_" + name + " " + help)
+        lines.append("# TYPE plexflo_" + name + " " + kind)
+
+        for labels, value in samples:
+            text = "{" + ",".join(key + "=\"" + label(val) + "\"" for key, val in labels.items()) + "}" if labels else ""
+            lines.append("plexflo_" + name + text + " " + repr(float(value)))
+
+    def histogram(name, help, snapshot):
+
+        lines.append("# HELP plexflo_" + name + " " + help)
+        lines.append("# TYPE plexflo_" + name + " histogram")
+
+        for bound, count in snapshot['buckets'].items():
+            lines.append("plexflo_" + name + "_bucket{le=\"" + repr(float(bound)) + "\"} " + str(count))
+
+        lines.append("plexflo_" + name + "_bucket{le=\"+Inf\"} " + str(snapshot['count']))
+        lines.append("plexflo_" + name + "_sum " + repr(float(snapshot['sum'])))
+        lines.append("plexflo_" + name + "_count " + str(snapshot['count']))
+
+    counters = stats['counters']
+    clients = stats['clients']
+
+    metric("uptime_seconds", "gauge", "Seconds since the collector started.", [({}, stats['uptime_seconds'])])
+    metric("active_connections", "gauge", "Clients connected right now.", [({}, len(clients))])
+    metric("connections_total", "counter", "Clients accepted.", [({}, counters['connections'])])
+    metric("refused_connections_total", "counter", "Clients refused because the collector was full or shutting down.", [({}, counters['refused_connections'])])
+    metric("received_bytes_total", "counter", "Bytes received from all clients.", [({}, counters['bytes'])])
+    metric("received_readings_total", "counter", "Readings received from all clients.", [({}, counters['readings'])])
+    metric("persisted_readings_total", "counter", "Readings written to disk.", [({}, counters['persisted_readings'])])
+    metric("dropped_packets_total", "counter", "Text packets dropped because they were not a single number.", [({}, counters['dropped_packets'])])
+    metric("failed_packets_total", "counter", "Packets dropped because processing them failed.", [({}, counters['failed_packets'])])
+    metric("frame_errors_total", "counter", "Connections closed on a malformed or oversized frame.", [({}, counters['frame_errors'])])
+    metric("export_errors_total", "counter", "Connections whose readings could not be exported or stored when they closed.", [({}, counters['export_errors'])])
+    metric("duplicate_readings_total", "counter", "Resent readings dropped because they were received before.", [({}, counters['duplicate_readings'])])
+    metric("missing_readings", "gauge", "Readings that have not arrived, from the gaps in the sequences, lowered when a late datagram fills a gap.", [({}, counters['missing_readings'])])
+    metric("out_of_order_readings_total", "counter", "Readings of late datagrams that filled a gap in the sequence.", [({}, counters['out_of_order_readings'])])
+    metric("lost_readings_total", "counter", "Readings of the gaps given up, no longer waited for.", [({}, counters['lost_readings'])])
+    metric("expired_readings_total", "counter", "Readings of late datagrams dropped as they arrived after their gap was given up.", [({}, counters['expired_readings'])])
+
+    metric("client_received_bytes_total", "counter", "Bytes received from a client.", [({'client': c['client']}, c['bytes']) for c in clients])
+    metric("client_received_readings_total", "counter", "Readings received from a client.", [({'client': c['client']}, c['readings']) for c in clients])
+    metric("client_bytes_per_second", "gauge", "Bytes received from a client in the last second.", [({'client': c['client']}, c['bytes_per_second']) for c in clients])
+    metric("client_readings_per_second", "gauge", "Readings received from a client in the last second.", [({'client': c['client']}, c['readings_per_second']) for c in clients])
+    metric("client_queue_depth", "gauge", "Packets a client queued for processing.", [({'client': c['client']}, c['queued']) for c in clients])
+
+    histogram("persist_latency_seconds", "Seconds from the receipt of the oldest reading of a write to the end of the write.", stats['persist_latency_seconds'])
+    histogram("flush_duration_seconds", "Seconds taken by a write of readings to disk.", stats['flush_duration_seconds'])
+
+    if stats.get('storage') is not None:
+        metric("storage_buffered_readings", "gauge", "Readings buffered in memory waiting to be written.", [({}, stats['storage']['buffered'])])
+        metric("storage_open_chunks", "gauge", "Chunk files open for writing.", [({}, stats['storage']['open_chunks'])])
+        metric("storage_write_errors_total", "counter", "Writes of readings to disk that failed, their readings stay buffered for the next write.", [({}, stats['storage']['write_errors'])])
+
+    if stats.get('detector') is not None:
+        detector = stats['detector']
+        metric("detector_queue_depth", "gauge", "Windows waiting to be scored.", [({}, detector['queued'])])
+        metric("detector_windows_total", "counter", "Windows scored.", [({}, detector['windows'])])
+        metric("detector_dropped_windows_total", "counter", "Windows dropped because the scoring queue was full.", [({}, detector['dropped'])])
+        metric("detector_errors_total", "counter", "Batches of windows that failed to score.", [({}, detector['errors'])])
+        metric("detector_failed_windows_total", "counter", "Windows dropped because their batch failed to score.", [({}, detector['failed'])])
+        metric("detector_meters", "gauge", "Meters with a ring buffer.", [({}, detector['meters'])])
+
+    return "\n".join(lines) + "\n"
+
+# Defining a function for serving the metrics over HTTP
+async def serve_http(stats, host = "127.0.0.1", port = 9108):
+
+    """
+    Description:
+    -----------
+    This function is used to serve the stats in the Prometheus text format at /metrics, and as plain HTTP for any other path.
+    Only GET is supported, which is all a Prometheus scraper needs.
+
+    Parameters:
+    -----------
+    stats: The function returning the stats of the collector (function)
+    host: The hostname the endpoint listens on (str)
+    port: The port the endpoint listens on (int)
+
+    Returns:
+    --------
+    server: The HTTP server (asyncio.Server)
+    """
+
+    async def handle(reader, writer):
+
+        try:
+
+            request = await asyncio.wait_for(reader.readline(), 10)
+
+            # Reading the headers of the request up to the empty line
+            while (await asyncio.wait_for(reader.readline(), 10)) not in (b"\r\n", b"\n", b""):
+                pass
+
+            parts = request.split()
+
+            if len(parts) >= 2 and parts[0] == b"GET" and parts[1].split(b"?")[0] == b"/metrics":
+                status, body = "200 OK", render(stats()).encode("utf-8")
+            else:
+                status, body = "404 Not Found", b"Metrics are served at /metrics\n"
+
+            writer.write((
+                "HTTP/1.0 " + status + "\r\n"
+                "Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                "Content-Length: " + str(len(body)) + "\r\n"
+                "Connection: close\r\n\r\n"
+            ).encode("ascii") + body)
+
+            await writer.drain()
+
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, host, port)
@@ -0,0 +1,345 @@
+import struct
+import numpy as np
+
+# Frame layout, all little-endian:
+#   header  : magic b"PX", version (uint8), frame type (uint8), payload length (uint32)
+#   payload : meter id length (uint16), meter id (utf-8), reading count (uint32),
+#             timestamps (int64 nanoseconds since the epoch, one per reading), readings (float32, one per reading)
+#
+# Version 2 adds two frame types, plain readings frames are still sent as version 1:
+#   sequenced readings : meter id length (uint16), meter id (utf-8), session (uint64), sequence (uint64), then as a readings frame.
+#                        The sequence is the position of the first reading in the series of the meter sent in this session
+#   ack                : meter id length (uint16), meter id (utf-8), session (uint64), sequence (uint64).
+#                        Sent by the listener, every reading before the sequence has been received
+MAGIC = b"PX"
+VERSION = 2
+READINGS = 1
+SEQUENCED = 2
+ACK = 3
+
+header = struct.Struct("<2sBBI")
+meter_header = struct.Struct("<H")
+count_header = struct.Struct("<I")
+sequence_header = struct.Struct("<QQ")
+
+# The largest payload accepted by default, a frame of a million readings is about 12 MB
+max_payload = 16 * 1024 * 1024
+
+# Class holding the readings of a decoded frame
+class Frame:
+
+    def __init__(self, meter_id, timestamps, values, session = None, sequence = None):
+
+        """
+        Description:
+        -----------
+        This class is used to hold the readings of one meter decoded from a frame.
+
+        Parameters:
+        -----------
+        meter_id: The id of the meter (str)
+        timestamps: The timestamps of the readings in nanoseconds since the epoch (numpy.ndarray)
+        values: The readings (numpy.ndarray)
+        session: The session of the sender, None for frames without a sequence (int)
+        sequence: The position of the first reading in the series of the meter, None for frames without a sequence (int)
+
+        Returns:
+        --------
+        None
+        """
+
+        self.meter_id = meter_id
+        self.timestamps = timestamps
+        self.values = values
+        self.session = session
+        self.sequence = sequence
+
+# Class holding a decoded acknowledgement
+class Ack:
+
+    def __init__(self, meter_id, session, sequence):
+
+        """
+        Description:
+        -----------
+        This class is used to hold an acknowledgement of the readings of a meter.
+
+        Parameters:
+        -----------
+        meter_id: The id of the meter (str)
+        session: The session of the sender (int)
+        sequence: The position of the first reading that has not been received yet (int)
+
+        Returns:
+        --------
+        None
+        """
+
+        self.meter_id = meter_id
+        self.session = session
+        self.sequence = sequence
+
+# Defining a function for encoding readings into a frame
+def encode(meter_id, timestamps, values, session = None, sequence = None):
+
+    """
+    Description:
+    -----------
+    This function is used to pack the readings of a meter into a single frame, a sequenced frame when a sequence is given.
+
+    Parameters:
+    -----------
+    meter_id: The id of the meter (str)
+    timestamps: The timestamps of the readings in nanoseconds since the epoch (numpy.ndarray or list)
+    values: The readings (numpy.ndarray or list)
+    session: The session of the sender, required with a sequence (int)
+    sequence: The position of the first reading in the series of the meter sent in this session (int)
+
+    Returns:
+    --------
+    frame: The bytes of the frame (bytes)
+    """
+
+    meter = str(meter_id).encode("utf-8")
+    timestamps = np.asarray(timestamps, dtype = "<i8")
+    values = np.asarray(values, dtype = "<f4")
+
+    # Raise an exception if the timestamps and readings do not pair up
+    if timestamps.shape != values.shape or values.ndim != 1:
+        raise Exception("Timestamps and values must have the same number of readings")
+
+    if sequence is None:
+        version, kind, sequenced = 1, READINGS, b""
+    else:
+        version, kind, sequenced = 2, SEQUENCED, sequence_header.pack(session, sequence)
+
+    length = meter_header.size + len(meter) + len(sequenced) + count_header.size + timestamps.nbytes + values.nbytes
+
+    return b"".join((
+        header.pack(MAGIC, version, kind, length),
+        meter_header.pack(len(meter)), meter, sequenced,
+        count_header.pack(values.shape[0]),
+        timestamps.tobytes(), values.tobytes(),
+    ))
+
+# Defining a function for encoding an acknowledgement
+def encode_ack(meter_id, session, sequence):
+
+    """
+    Description:
+    -----------
+    This function is used to pack an acknowledgement of the readings of a meter into a frame.
+
+    Parameters:
+    -----------
+    meter_id: The id of the meter (str)
+    session: The session of the sender (int)
+    sequence: The position of the first reading that has not been received yet (int)
+
+    Returns:
+    --------
+    frame: The bytes of the frame (bytes)
+    """
+
+    meter = str(meter_id).encode("utf-8")
+
+    return b"".join((
+        header.pack(MAGIC, 2, ACK, meter_header.size + len(meter) + sequence_header.size),
+        meter_header.pack(len(meter)), meter,
+        sequence_header.pack(session, sequence),
+    ))
+
+# Defining a function for checking a frame header
+def parse_header(data, max_size = max_payload):
+
+    """
+    Description:
+    -----------
+    This function is used to validate a frame header and read the length of its payload.
+
+    Parameters:
+    -----------
+    data: The bytes of the header (bytes)
+    max_size: The largest payload accepted (int)
+
+    Returns:
+    --------
+    length: The length of the payload in bytes (int)
+    """
+
+    return unpack_header(data, max_size)[1]
+
+# Defining a function for reading the type and length of a frame
+def unpack_header(data, max_size = max_payload):
+
+    """
+    Description:
+    -----------
+    This function is used to validate a frame header and read the type of the frame and the length of its payload.
+
+    Parameters:
+    -----------
+    data: The bytes of the header (bytes)
+    max_size: The largest payload accepted (int)
+
+    Returns:
+    --------
+    kind: The type of the frame (int)
+    length: The length of the payload in bytes (int)
+    """
+
+    magic, version, kind, length = header.unpack(data)
+
+    # Raise an exception if the stream is not made of frames of a known version and type
+    if magic != MAGIC:
+        raise Exception("Not a plexflo frame, the stream is out of sync or uses the text protocol")
+
+    if version > VERSION:
+        raise Exception("Unsupported frame version " + str(version) + ", this listener supports up to version " + str(VERSION))
+
+    if kind not in (READINGS, SEQUENCED, ACK):
+        raise Exception("Unsupported frame type " + str(kind))
+
+    if length > max_size:
+        raise Exception("Frame of " + str(length) + " bytes exceeds the limit of " + str(max_size) + " bytes")
+
+    return kind, length
+
+# Defining a function for decoding the payload of a frame
+def decode_payload(payload, kind = READINGS):
+
+    """
+    Description:
+    -----------
+    This function is used to decode the payload of a frame into NumPy arrays without copying the readings.
+
+    Parameters:
+    -----------
+    payload: The bytes of the payload (bytes)
+    kind: The type of the frame (int)
+
+    Returns:
+    --------
+    frame: The decoded frame (Frame or Ack)
+    """
+
+    (size,) = meter_header.unpack_from(payload, 0)
+    offset = meter_header.size
+
+    meter_id = bytes(payload[offset:offset + size]).decode("utf-8")
+    offset += size
+
+    session = sequence = None
+
+    if kind in (SEQUENCED, ACK):
+        session, sequence = sequence_header.unpack_from(payload, offset)
+        offset += sequence_header.size
+
+    if kind == ACK:
+        return Ack(meter_id, session, sequence)
+
+    (count,) = count_header.unpack_from(payload, offset)
+    offset += count_header.size
+
+    # Raise an exception if the payload does not hold the number of readings it announces
+    if len(payload) != offset + 12 * count:
+        raise Exception("Frame payload does not match its reading count")
+
+    timestamps = np.frombuffer(payload, dtype = "<i8", count = count, offset = offset)
+    values = np.frombuffer(payload, dtype = "<f4", count = count, offset = offset + 8 * count)
+
+    return Frame(meter_id, timestamps, values, session, sequence)
+
+# Defining a function for reading a frame from an asyncio stream
+async def read_frame(reader, max_size = max_payload):
+
+    """
+    Description:
+    -----------
+    This function is used to read the next frame from a stream.
+
+    Parameters:
+    -----------
+    reader: The stream the frames are read from (asyncio.StreamReader)
+    max_size: The largest payload accepted (int)
+
+    Returns:
+    --------
+    frame: The decoded frame, None when the stream ended between two frames (Frame)
+    """
+
+    import asyncio
+
+    try:
+        data = await reader.readexactly(header.size)
+
+    # The client closed the connection after its last frame
+    except asyncio.IncompleteReadError as e:
+
+        if not e.partial:
+            return None
+
+        raise Exception("Connection closed in the middle of a frame header")
+
+    kind, length = unpack_header(data, max_size)
+    payload = await reader.readexactly(length)
+
+    return decode_payload(payload, kind)
+
+# Class for decoding frames from a byte stream received in arbitrary pieces
+class Decoder:
+
+    def __init__(self, max_size = max_payload):
+
+        """
+        Description:
+        -----------
+        This class is used to decode the frames of a byte stream that arrives in pieces, keeping the incomplete frame until the rest arrives.
+
+        Parameters:
+        -----------
+        max_size: The largest payload accepted (int)
+
+        Returns:
+        --------
+        None
+        """
+
+        self.max_size = max_size
+        self.buffer = bytearray()
+
+    def feed(self, data):
+
+        """
+        Description:
+        -----------
+        This function is used to add received bytes and decode every frame they complete.
+
+        Parameters:
+        -----------
+        data: The received bytes (bytes)
+
+        Returns:
+        --------
+        frames: The completed frames (list)
+        """
+
+        self.buffer += data
+
+        frames = []
+        offset = 0
+
+        while len(self.buffer) - offset >= header.size:
+
+            kind, length = unpack_header(bytes(self.buffer[offset:offset + header.size]), self.max_size)
+
+            if len(self.buffer) - offset < header.size + length:
+                break
+
+            start = offset + header.size
+            frames.append(decode_payload(bytes(self.buffer[start:start + length]), kind))
+            offset = start + length
+
+        del self.buffer[:offset]
+
+        return frames
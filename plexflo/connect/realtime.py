@@ -0,0 +1,443 @@
+import time
+import queue
+import threading
+import collections
+import numpy as np
+import pandas as pd
+from plexflo.datastream.inference import seqlen, binary_threshold_15_min, predict_windows
+
+# Class for keeping the last readings of a meter
+class RingBuffer:
+
+    def __init__(self, seqlen = seqlen, hop = None):
+
+        """
+        Description:
+        -----------
+        This class is used to keep the last seqlen readings of a meter and cut a window whenever one completes.
+
+        Every reading is written twice, seqlen positions apart, so the last seqlen readings are always one contiguous slice
+        of the buffer and a completed window is copied out in one go. Like predict(), windows are back to back by default,
+        or start every hop readings.
+
+        Parameters:
+        -----------
+        seqlen: The number of readings in a window (int)
+        hop: The number of readings between the starts of two windows, None for back-to-back windows (int)
+
+        Returns:
+        --------
+        None
+        """
+
+        self.seqlen = seqlen
+        self.hop = seqlen if hop is None else hop
+        self.buffer = np.zeros(2 * seqlen, dtype = np.float32)
+        self.count = 0
+
+    def last(self, n):
+
+        # The last n readings in the order they were received, n must not exceed seqlen or the number of readings so far
+        end = self.count % self.seqlen + self.seqlen
+        return self.buffer[end - n:end]
+
+    def extend(self, values):
+
+        """
+        Description:
+        -----------
+        This function is used to add readings and return the windows they complete.
+
+        Parameters:
+        -----------
+        values: The readings in the order they were recorded (numpy.ndarray)
+
+        Returns:
+        --------
+        windows: The completed windows with shape (n_windows, seqlen) (numpy.ndarray)
+        ends: The position of the last reading of every window in values (numpy.ndarray)
+        """
+
+        values = np.asarray(values, dtype = np.float32).reshape(-1)
+        n = values.shape[0]
+
+        # Finding the readings that complete a window, counting the readings from the first one ever received
+        first = max(self.count + 1, self.seqlen)
+        first = first + (-(first - self.seqlen)) % self.hop
+        ends = np.arange(first, self.count + n + 1, self.hop) - self.count - 1
+
+        if ends.shape[0] == 0:
+            windows = np.empty((0, self.seqlen), dtype = np.float32)
+
+        # A single reading completing a window, copied straight out of the buffer
+        elif n == 1:
+            self.write(values)
+            return self.last(self.seqlen)[None].copy(), ends
+
+        # Cutting the windows from the readings kept so far followed by the new ones
+        else:
+            kept = min(self.count, self.seqlen - 1)
+            series = np.concatenate((self.last(kept), values))
+            windows = np.lib.stride_tricks.sliding_window_view(series, self.seqlen)[ends + kept + 1 - self.seqlen]
+
+        self.write(values)
+
+        return windows, ends
+
+    def write(self, values):
+
+        # Writing only the readings that are still part of the last seqlen, at both of their positions
+        kept = values[-self.seqlen:]
+        positions = (self.count + values.shape[0] - kept.shape[0] + np.arange(kept.shape[0])) % self.seqlen
+
+        self.buffer[positions] = kept
+        self.buffer[positions + self.seqlen] = kept
+
+        self.count += values.shape[0]
+
+# Class for running the model on the windows of many meters in shared batches
+class InferenceWorker:
+
+    def __init__(self, model, max_batch = 256, max_wait = 0.01, on_detection = None, queue_size = 100000, threshold = binary_threshold_15_min, seqlen = seqlen):
+
+        """
+        Description:
+        -----------
+        This class is used to score the windows of all meters on a background thread. Windows are queued as they complete and
+        scored in micro-batches: a batch is sent to the model once it holds max_batch windows, or max_wait seconds after its first
+        window arrived, whichever comes first. A larger max_wait gives larger batches and more throughput, a smaller one lower latency.
+
+        TensorFlow releases the GIL while the model runs, so the collector keeps reading from its clients during a batch.
+        A batch that fails to score is dropped and counted, the error is printed and kept for stats(), and the worker goes on with the next batch.
+
+        Parameters:
+        -----------
+        model: The loaded model or inference backend (plexflo.datastream.model.Model)
+        max_batch: The largest number of windows sent to the model in a single call (int)
+        max_wait: The longest time in seconds a window waits for the batch to fill up (float)
+        on_detection: The function called from the worker thread with the dataframe of every scored batch, see score() (function)
+        queue_size: The number of windows waiting to be scored before new windows are dropped (int)
+        threshold: The model output above which a window is labelled as an EV charge (float)
+        seqlen: The number of readings in a window (int)
+
+        Returns:
+        --------
+        None
+        """
+
+        self.model = model
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.on_detection = on_detection
+        self.threshold = threshold
+        self.seqlen = seqlen
+
+        self.queue = queue.Queue(queue_size)
+        self.stopping = False
+
+        self.windows = 0
+        self.batches = 0
+        self.dropped = 0
+        self.latencies = collections.deque(maxlen = 10000)
+        self.errors = 0
+        self.failed = 0
+        self.error = None
+
+        self.thread = threading.Thread(target = self.run, daemon = True)
+        self.thread.start()
+
+    def submit(self, meter_id, timestamp, window):
+
+        """
+        Description:
+        -----------
+        This function is used to queue a completed window, from any thread. The window is dropped when the queue is full,
+        so a model that cannot keep up never slows down the collector.
+
+        Parameters:
+        -----------
+        meter_id: The id of the meter (str)
+        timestamp: The timestamp of the last reading of the window in nanoseconds since the epoch (int)
+        window: The readings of the window (numpy.ndarray)
+
+        Returns:
+        --------
+        queued: Whether the window was queued (bool)
+        """
+
+        try:
+            self.queue.put_nowait((meter_id, timestamp, window, time.perf_counter()))
+            return True
+
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def run(self):
+
+        # Collecting windows into batches until the worker is stopped and the queue is empty
+        while True:
+
+            item = self.queue.get()
+
+            if item is None:
+                return
+
+            batch = [item]
+            deadline = time.perf_counter() + self.max_wait
+            stop = False
+
+            while len(batch) < self.max_batch:
+
+                timeout = deadline - time.perf_counter()
+
+                try:
+                    item = self.queue.get(timeout = timeout) if timeout > 0 else self.queue.get_nowait()
+                except queue.Empty:
+                    break
+
+                if item is None:
+                    stop = True
+                    break
+
+                batch.append(item)
+
+            try:
+                self.score(batch)
+
+            # Dropping the batch and keeping the error for stats(), so a failed batch never reaches the threads submitting windows
+            except Exception as e:
+                self.errors += 1
+                self.failed += len(batch)
+                self.error = str(e)
+                print("Real-time inference failed, dropped " + str(len(batch)) + " windows: " + str(e))
+
+            if stop:
+                return
+
+    def score(self, batch):
+
+        """
+        Description:
+        -----------
+        This function is used to run the model once on a batch of windows and emit the detections.
+
+        Parameters:
+        -----------
+        batch: The queued windows as (meter_id, timestamp, window, queued_at) tuples (list)
+
+        Returns:
+        --------
+        detections: The dataframe with the meter_id, timestamp, output and EV columns, EV is 1/0 (pandas.DataFrame)
+        """
+
+        meter_ids, timestamps, windows, queued = zip(*batch)
+
+        outputs = predict_windows(self.model, np.stack(windows), self.max_batch)
+
+        detections = pd.DataFrame({
+            'meter_id': list(meter_ids),
+            'timestamp': np.asarray(timestamps, dtype = np.int64).view("datetime64[ns]"),
+            'output': outputs,
+            'EV': (outputs > self.threshold).astype(np.int8),
+        })
+
+        if self.on_detection is not None:
+            self.on_detection(detections)
+
+        done = time.perf_counter()
+        self.latencies.extend(done - np.asarray(queued))
+        self.windows += len(batch)
+        self.batches += 1
+
+        return detections
+
+    def stats(self):
+
+        """
+        Description:
+        -----------
+        This function is used to summarise the work of the worker, the latency runs from queueing a window to emitting its detection.
+
+        Parameters:
+        -----------
+        None
+
+        Returns:
+        --------
+        stats: The number of scored windows, batches and dropped windows, the failed batches and their windows with the last error,
+               the mean batch size, the queued windows and the latency percentiles in ms (dict)
+        """
+
+        latencies = np.asarray(self.latencies) * 1000
+
+        return {
+            'windows': self.windows,
+            'batches': self.batches,
+            'dropped': self.dropped,
+            'errors': self.errors,
+            'failed': self.failed,
+            'last_error': self.error,
+            'queued': self.queue.qsize(),
+            'mean_batch': self.windows / self.batches if self.batches else 0.0,
+            'latency_p50_ms': float(np.percentile(latencies, 50)) if latencies.size else None,
+            'latency_p95_ms': float(np.percentile(latencies, 95)) if latencies.size else None,
+            'latency_p99_ms': float(np.percentile(latencies, 99)) if latencies.size else None,
+        }
+
+    def stop(self):
+
+        """
+        Description:
+        -----------
+        This function is used to score the windows still queued and stop the worker.
+
+        Parameters:
+        -----------
+        None
+
+        Returns:
+        --------
+        None
+        """
+
+        if not self.stopping:
+            self.stopping = True
+            self.queue.put(None)
+
+        self.thread.join()
+
+# Defining a function for printing the EV charges detected in a batch
+def print_detections(detections):
+
+    """
+    Description:
+    -----------
+    This function is used as the default on_detection, printing the meters a window labelled as an EV charge.
+
+    Parameters:
+    -----------
+    detections: The detections of a batch (pandas.DataFrame)
+
+    Returns:
+    --------
+    None
+    """
+
+    for meter_id, timestamp in detections.loc[detections.EV == 1, ['meter_id', 'timestamp']].itertuples(index = False):
+        print("EV charging detected on meter " + str(meter_id) + " in the 15 min up to " + str(timestamp))
+
+# Class for detecting EV charging in the readings of many meters as they arrive
+class Detector:
+
+    def __init__(self, model, hop = None, max_batch = 256, max_wait = 0.01, on_detection = print_detections, queue_size = 100000, threshold = binary_threshold_15_min):
+
+        """
+        Description:
+        -----------
+        This class is used to detect EV charging in real time. Every meter gets a ring buffer of its last 900 readings, and every
+        completed window is queued to a single InferenceWorker shared by all meters, which scores the windows in micro-batches.
+        A buffer takes about 7 KB, so thousands of meters fit in the memory of one host.
+
+        Parameters:
+        -----------
+        model: The loaded model or inference backend (plexflo.datastream.model.Model)
+        hop: The number of readings between the starts of two windows of a meter, None for back-to-back windows (int)
+        max_batch: The largest number of windows sent to the model in a single call (int)
+        max_wait: The longest time in seconds a window waits for the batch to fill up (float)
+        on_detection: The function called from the worker thread with the dataframe of every scored batch, see InferenceWorker.score() (function)
+        queue_size: The number of windows waiting to be scored before new windows are dropped (int)
+        threshold: The model output above which a window is labelled as an EV charge (float)
+
+        Returns:
+        --------
+        None
+        """
+
+        self.hop = hop
+        self.buffers = {}
+        self.worker = InferenceWorker(model, max_batch, max_wait, on_detection, queue_size, threshold)
+
+    def add(self, meter_id, timestamps, values):
+
+        """
+        Description:
+        -----------
+        This function is used to add the readings of a meter and queue the windows they complete.
+
+        Parameters:
+        -----------
+        meter_id: The id of the meter (str)
+        timestamps: The timestamps of the readings in nanoseconds since the epoch (numpy.ndarray)
+        values: The readings (numpy.ndarray)
+
+        Returns:
+        --------
+        windows: The number of windows queued (int)
+        """
+
+        buffer = self.buffers.get(meter_id)
+
+        if buffer is None:
+            buffer = self.buffers[meter_id] = RingBuffer(seqlen, self.hop)
+
+        windows, ends = buffer.extend(values)
+
+        for window, end in zip(windows, ends):
+            self.worker.submit(meter_id, int(timestamps[end]), window)
+
+        return ends.shape[0]
+
+    def remove(self, meter_id):
+
+        """
+        Description:
+        -----------
+        This function is used to forget the readings of a meter that will not send any more.
+
+        Parameters:
+        -----------
+        meter_id: The id of the meter (str)
+
+        Returns:
+        --------
+        None
+        """
+
+        self.buffers.pop(meter_id, None)
+
+    def stats(self):
+
+        """
+        Description:
+        -----------
+        This function is used to summarise the work of the detector, see InferenceWorker.stats().
+
+        Parameters:
+        -----------
+        None
+
+        Returns:
+        --------
+        stats: The stats of the worker and the number of meters (dict)
+        """
+
+        return dict(self.worker.stats(), meters = len(self.buffers))
+
+    def stop(self):
+
+        """
+        Description:
+        -----------
+        This function is used to score the windows still queued and stop the inference worker.
+
+        Parameters:
+        -----------
+        None
+
+        Returns:
+        --------
+        None
+        """
+
+        self.worker.stop()
@@ -0,0 +1,1050 @@
+import time
+import socket
+import signal
+import asyncio
+import multiprocessing
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from plexflo.connect import protocol
+from plexflo.connect.storage import ChunkStore
+from plexflo.connect.realtime import Detector
+from plexflo.connect.metrics import Metrics, PacketSampler, serve_http
+from plexflo.connect.datagram import BulkReceiver, SequenceTracker, datagram_socket
+
+# Class holding the state of a connected client
+class Connection:
+
+    def __init__(self, addr):
+
+        """
+        Description:
+        -----------
+        This class is used to hold the data received from a client and the counters of the connection.
+
+        Parameters:
+        -----------
+        addr: The address of the client (tuple)
+
+        Returns:
+        --------
+        None
+        """
+
+        self.addr = addr
+        self.values = []
+        self.frames = []
+        self.bytes = 0
+        self.packets = 0
+        self.readings = 0
+        self.meters = set()
+        self.dropped = 0
+        self.failed = 0
+        self.duplicates = 0
+        self.missing = 0
+        self.writer = None
+        self.queue = None
+
+        # The counters at the last rate measurement and the rates since then
+        self.last_bytes = 0
+        self.last_readings = 0
+        self.bytes_per_second = 0.0
+        self.readings_per_second = 0.0
+
+# Defining a function for creating the listening socket
+def listening_socket(host = "127.0.0.1", port = 5999, reuse_port = False, backlog = 1024):
+
+    """
+    Description:
+    -----------
+    This function is used to create the listening TCP socket of the server, optionally shared with other processes through SO_REUSEPORT.
+
+    Parameters:
+    -----------
+    host: The hostname of the server (str)
+    port: The port of the server (int)
+    reuse_port: Whether other processes can listen on the same port (bool)
+    backlog: The number of pending connections the socket queues (int)
+
+    Returns:
+    --------
+    s: The listening socket (socket)
+    """
+
+    # Raise an exception if the port cannot be shared on this platform
+    if reuse_port and not hasattr(socket, "SO_REUSEPORT"):
+        raise Exception("SO_REUSEPORT is not supported on this platform, use a single worker")
+
+    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+
+    if reuse_port:
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+
+    s.bind((host, port))
+    s.listen(backlog)
+    s.setblocking(False)
+
+    return s
+
+# Defining a function for joining decoded frames into a dataframe
+def frames_to_frame(frames):
+
+    """
+    Description:
+    -----------
+    This function is used to join the readings of decoded frames into a single dataframe.
+
+    Parameters:
+    -----------
+    frames: The decoded frames (list)
+
+    Returns:
+    --------
+    df: The dataframe with the meter_id, timestamp and values columns (pandas.DataFrame)
+    """
+
+    if not frames:
+        return pd.DataFrame({'meter_id': pd.Series([], dtype = object), 'timestamp': pd.Series([], dtype = "datetime64[ns]"), 'values': pd.Series([], dtype = np.float32)})
+
+    return pd.DataFrame({
+        'meter_id': np.repeat([frame.meter_id for frame in frames], [frame.values.shape[0] for frame in frames]),
+        'timestamp': np.concatenate([frame.timestamps for frame in frames]).view("datetime64[ns]"),
+        'values': np.concatenate([frame.values for frame in frames]),
+    })
+
+# Class for an asyncio server collecting data from many clients
+class Collector:
+
+    def __init__(self, host = "127.0.0.1", port = 5999, read_buffer = 1024, queue_size = 64, idle_timeout = 300, max_connections = 10000, shutdown_timeout = 10, reuse_port = False, backlog = 1024, frame_protocol = "text", max_frame = protocol.max_payload, storage = None, detector = None, metrics_port = None, log_sample = 0, datagram_batch = 64, verbose = False):
+
+        """
+        Description:
+        -----------
+        This class is used to collect data from many clients in a single process with asyncio, exporting the data of every client when it disconnects.
+
+        Every connection reads into a bounded queue that a consumer task empties. When the consumer falls behind the queue fills up,
+        the connection stops reading and TCP flow control slows the client down, so a fast client cannot grow the memory of the server.
+
+        Parameters:
+        -----------
+        host: The hostname of the server (str)
+        port: The port of the server (int)
+        read_buffer: The largest number of bytes read from a client at a time (int)
+        queue_size: The number of reads a connection queues before it stops reading (int)
+        idle_timeout: The number of seconds without data after which a client is disconnected, None never disconnects (float)
+        max_connections: The number of clients served at the same time, further clients are refused (int)
+        shutdown_timeout: The number of seconds the connections get to finish when the server shuts down (float)
+        reuse_port: Whether other processes can listen on the same port (bool)
+        backlog: The number of pending connections the listening socket queues (int)
+        frame_protocol: Either "text", every read is kept as a string value, "binary", the data is read as frames of readings, see connect.protocol,
+                        or "udp", the data is received as datagrams holding one sequenced frame each on a single UDP socket. Lost, duplicated
+                        and reordered datagrams are detected from the sequences of every meter, see datagram.SequenceTracker (str)
+        max_frame: The largest frame payload accepted in binary mode, larger frames close the connection (int)
+        storage: The store the readings are spilled to as they arrive instead of being kept until the client disconnects,
+                 see connect.storage, or the keyword arguments of a ChunkStore, which worker processes need as a store cannot be shared between processes.
+                 Text packets are stored under the <ip>_<port> of the client and stamped with the time they were received.
+                 In udp mode the datagrams of every meter share one socket that is only exported at shutdown, so a ChunkStore in output/collector is used by default (ChunkStore or dict)
+        detector: The real-time EV detector the readings are passed to as they arrive, see connect.realtime, or the keyword arguments
+                  of a Detector with the model_path of the model to load, which worker processes need (realtime.Detector or dict)
+        metrics_port: The port of the local HTTP endpoint serving the metrics at /metrics in the Prometheus text format, None serves none.
+                      The same metrics are returned by stats() (int)
+        log_sample: The share of the received packets printed for debugging, 0 prints none and 1 every packet (float)
+        datagram_batch: The largest number of datagrams received in one system call in udp mode (int)
+        verbose: Whether every received packet is printed, the same as a log_sample of 1 (bool)
+
+        Returns:
+        --------
+        None
+        """
+
+        self.host = host
+        self.port = port
+        self.read_buffer = read_buffer
+        self.queue_size = queue_size
+        self.idle_timeout = idle_timeout
+        self.max_connections = max_connections
+        self.shutdown_timeout = shutdown_timeout
+        self.reuse_port = reuse_port
+        self.backlog = backlog
+        self.frame_protocol = frame_protocol
+        self.max_frame = max_frame
+        self.storage = ChunkStore(**storage) if isinstance(storage, dict) else storage
+
+        # Spilling the datagrams to disk, as keeping the readings of every meter until shutdown would grow without bound
+        if frame_protocol == "udp" and self.storage is None:
+            self.storage = ChunkStore()
+
+        self.detector = detector
+
+        # Loading the model of the detector in this process
+        if isinstance(detector, dict):
+
+            from plexflo.datastream.model import Model
+
+            options = dict(detector)
+            self.detector = Detector(Model(options.pop("model_path", None)), **options)
+
+        self.metrics_port = metrics_port
+        self.metrics = Metrics()
+        self.sampler = PacketSampler(1 if verbose else log_sample)
+
+        if self.storage is not None and self.storage.on_write is None:
+            self.storage.on_write = self.metrics.observe_write
+
+        # Acknowledging sequenced readings once they are stored rather than once they are received
+        if self.storage is not None and self.storage.on_persist is None:
+            self.storage.on_persist = self.persisted
+
+        # Raise an exception if the protocol is not supported
+        if frame_protocol not in ("text", "binary", "udp"):
+            raise Exception("Protocol must be either 'text', 'binary' or 'udp'")
+
+        self.server = None
+        self.tasks = set()
+        self.connections = set()
+        self.stopping = None
+        self.flusher = None
+        self.rater = None
+        self.metrics_server = None
+
+        # The socket, receiver and sequences of the datagrams, and the connection their counters are kept on in udp mode
+        self.datagram_batch = datagram_batch
+        self.receiver = None
+        self.tracker = SequenceTracker()
+        self.udp = None
+
+        # The session of every meter sending sequenced frames and the sequence of the next reading expected from it
+        self.sequences = {}
+
+        # With a storage, the session of every meter and the sequence up to which its readings are stored,
+        # and the connection the meter last sent on, which the acknowledgements go to
+        self.stored = {}
+        self.routes = {}
+        self.loop = None
+
+    async def start(self):
+
+        """
+        Description:
+        -----------
+        This function is used to start accepting clients.
+
+        Parameters:
+        -----------
+        None
+
+        Returns:
+        --------
+        None
+        """
+
+        self.stopping = asyncio.Event()
+        self.loop = asyncio.get_running_loop()
+
+        if self.frame_protocol == "udp":
+
+            sock = datagram_socket(self.host, self.port, self.reuse_port)
+            self.receiver = BulkReceiver(sock, self.datagram_batch)
+
+            self.udp = Connection(("udp", self.port))
+            self.connections.add(self.udp)
+
+            # Receiving the datagrams whenever the socket is readable, without a task per sender
+            asyncio.get_running_loop().add_reader(sock.fileno(), self.receive_datagrams)
+
+        else:
+            sock = listening_socket(self.host, self.port, self.reuse_port, self.backlog)
+            self.server = await asyncio.start_server(self.handle, sock = sock, limit = self.read_buffer, backlog = self.backlog)
+
+        if self.storage is not None:
+            self.flusher = asyncio.create_task(self.flush_periodically())
+
+        self.rater = asyncio.create_task(self.measure_rates())
+
+        if self.metrics_port is not None:
+            self.metrics_server = await serve_http(self.stats, "127.0.0.1", self.metrics_port)
+            print("Serving metrics at: http://127.0.0.1:" + str(self.metrics_port) + "/metrics")
+
+        print("Listening on port: " + str(self.port))
+
+    async def handle(self, reader, writer):
+
+        """
+        Description:
+        -----------
+        This function is used to read the data of a client until it disconnects, goes idle or the server shuts down.
+
+        Parameters:
+        -----------
+        reader: The stream the data of the client is read from (asyncio.StreamReader)
+        writer: The stream of the connection to the client (asyncio.StreamWriter)
+
+        Returns:
+        --------
+        None
+        """
+
+        # Refusing the client when the server is full or shutting down
+        if len(self.tasks) >= self.max_connections or self.stopping.is_set():
+            self.metrics.add('refused_connections')
+            writer.close()
+            return
+
+        task = asyncio.current_task()
+        self.tasks.add(task)
+
+        conn = Connection(writer.get_extra_info("peername"))
+        conn.writer = writer
+        queue = asyncio.Queue(self.queue_size)
+        consumer = asyncio.create_task(self.consume(conn, queue))
+
+        conn.queue = queue
+        self.connections.add(conn)
+        self.metrics.add('connections')
+
+        print('Connected by', conn.addr)
+
+        try:
+
+            while True:
+
+                # Waiting at most idle_timeout seconds for the next packet or frame
+                if self.frame_protocol == "binary":
+                    packet = await asyncio.wait_for(protocol.read_frame(reader, self.max_frame), self.idle_timeout)
+                else:
+                    packet = await asyncio.wait_for(reader.read(self.read_buffer), self.idle_timeout)
+
+                # If the packet is empty, the client closed the connection
+                if not packet:
+                    break
+
+                # Waiting for room in the queue, which stops reading from the client until the consumer catches up
+                if not await self.enqueue(queue, consumer, (packet, time.monotonic())):
+                    print("Processing the data of " + str(conn.addr) + " failed, closing the connection")
+                    break
+
+        except asyncio.TimeoutError:
+            print("The client " + str(conn.addr) + " was idle for " + str(self.idle_timeout) + " s")
+
+        except asyncio.CancelledError:
+            print("Closing the connection to " + str(conn.addr) + " for the shutdown")
+
+        # Handle any exceptions, in binary mode they come from a malformed frame or one cut short
+        except Exception as e:
+
+            if self.frame_protocol == "binary":
+                self.metrics.add('frame_errors')
+
+            print(e)
+
+        finally:
+
+            # Letting the consumer process everything that was queued before exporting the data
+            if await self.enqueue(queue, consumer, None):
+                await consumer
+
+            elif not consumer.cancelled() and consumer.exception() is not None:
+                print(consumer.exception())
+
+            # Exporting before closing, so the acknowledgements of the readings stored last still reach the client
+            try:
+                await self.export(conn)
+
+            # Closing and forgetting the connection even when the export is cancelled by the shutdown
+            finally:
+
+                for meter_id in conn.meters:
+                    if self.routes.get(meter_id) is conn:
+                        del self.routes[meter_id]
+
+                writer.close()
+
+                # Moving the counters of the connection to the totals of the collector
+                for name, value in (('bytes', conn.bytes), ('readings', conn.readings), ('dropped_packets', conn.dropped), ('failed_packets', conn.failed), ('duplicate_readings', conn.duplicates), ('missing_readings', conn.missing)):
+                    self.metrics.add(name, value)
+
+                self.connections.discard(conn)
+                self.tasks.discard(task)
+
+            print("The client disconnected from the server")
+
+    def receive_datagrams(self):
+
+        """
+        Description:
+        -----------
+        This function is used to receive the waiting datagrams in bulk, drop the readings received before and process the others like frames.
+
+        Parameters:
+        -----------
+        None
+
+        Returns:
+        --------
+        None
+        """
+
+        conn = self.udp
+        received = time.monotonic()
+
+        for data in self.receiver.receive():
+
+            conn.packets += 1
+
+            # Dropping the datagrams that do not hold exactly one valid frame
+            try:
+
+                kind, length = protocol.unpack_header(data[:protocol.header.size], self.max_frame)
+
+                if len(data) != protocol.header.size + length:
+                    raise Exception("Datagram does not match the length of its frame")
+
+                frame = protocol.decode_payload(data[protocol.header.size:], kind)
+
+            except Exception:
+                self.metrics.add('frame_errors')
+                continue
+
+            if not isinstance(frame, protocol.Frame):
+                continue
+
+            n = frame.values.shape[0]
+            slices = [(0, n)] if frame.sequence is None else self.tracker.accept(frame.meter_id, frame.session, frame.sequence, n)
+
+            # Dropping the readings that fail to process, so the rest of the batch is still received
+            try:
+                for offset, length in slices:
+                    self.process(conn, protocol.Frame(frame.meter_id, frame.timestamps[offset:offset + length], frame.values[offset:offset + length]), received)
+
+            # Handle any exceptions
+            except Exception as e:
+                conn.failed += 1
+                print("Dropped a datagram of meter " + str(frame.meter_id) + " that failed to process: " + str(e))
+
+        conn.duplicates = self.tracker.duplicates
+        conn.missing = self.tracker.missing
+
+    async def enqueue(self, queue, consumer, item):
+
+        """
+        Description:
+        -----------
+        This function is used to queue an item for the consumer of a connection, waiting for room in the queue unless the consumer has stopped.
+
+        Parameters:
+        -----------
+        queue: The queue of the connection (asyncio.Queue)
+        consumer: The task consuming the queue (asyncio.Task)
+        item: The packet with the time it was received, or None to end the connection (tuple)
+
+        Returns:
+        --------
+        queued: Whether the item was queued, False when the consumer stopped, as nothing would empty the queue any more (bool)
+        """
+
+        if consumer.done():
+            return False
+
+        if not queue.full():
+            queue.put_nowait(item)
+            return True
+
+        put = asyncio.ensure_future(queue.put(item))
+
+        try:
+            await asyncio.wait((put, consumer), return_when = asyncio.FIRST_COMPLETED)
+
+        finally:
+            if not put.done():
+                put.cancel()
+
+        return put.done() and not put.cancelled()
+
+    async def consume(self, conn, queue):
+
+        """
+        Description:
+        -----------
+        This function is used to process the packets a connection queued, in the order they were received.
+
+        Parameters:
+        -----------
+        conn: The connection the packets were received on (Connection)
+        queue: The queue of packets or frames with the time they were received, None ends the connection (asyncio.Queue)
+
+        Returns:
+        --------
+        None
+        """
+
+        while True:
+
+            item = await queue.get()
+
+            if item is None:
+                return
+
+            conn.packets += 1
+
+            # Dropping a packet that fails to process, so one bad packet does not stop the connection
+            try:
+                self.process(conn, *item)
+
+            # Handle any exceptions
+            except Exception as e:
+                conn.failed += 1
+                print("Dropped a packet of " + str(conn.addr) + " that failed to process: " + str(e))
+
+            # Waiting for the client to read the acknowledgements when they pile up, a client that is gone is noticed by the reading side
+            if self.frame_protocol == "binary":
+                try:
+                    await conn.writer.drain()
+                except ConnectionError:
+                    pass
+
+    def process(self, conn, packet, received = None):
+
+        """
+        Description:
+        -----------
+        This function is used to keep the readings of a frame, or decode a text packet and keep its value, in the storage when there is one.
+
+        Parameters:
+        -----------
+        conn: The connection the packet was received on (Connection)
+        packet: The decoded frame or the bytes of the text packet (protocol.Frame or bytes)
+        received: The time.monotonic() the packet was received at (float)
+
+        Returns:
+        --------
+        None
+        """
+
+        self.sampler.log(conn.addr, packet)
+
+        # Acknowledgements are only sent by the collector
+        if isinstance(packet, protocol.Ack):
+            return
+
+        if isinstance(packet, protocol.Frame) and packet.sequence is not None:
+
+            packet = self.resume(conn, packet)
+
+            if packet is None:
+                return
+
+        if isinstance(packet, protocol.Frame):
+
+            meter_id, timestamps, values = packet.meter_id, packet.timestamps, packet.values
+
+            if self.storage is None:
+                conn.frames.append(packet)
+
+            conn.bytes += packet.timestamps.nbytes + packet.values.nbytes
+            conn.readings += packet.values.shape[0]
+
+        else:
+
+            meter_id = conn.addr[0] + "_" + str(conn.addr[1])
+            timestamps = np.array([time.time_ns()], dtype = np.int64)
+            values = None
+
+            if self.storage is None:
+                conn.values.append(packet.decode())
+
+            # Reading the value for the storage and the detector, dropping the packets that are not a single number as the text protocol cannot split merged values
+            if self.storage is not None or self.detector is not None:
+                try:
+                    values = np.array([float(packet.decode())], dtype = np.float32)
+                except ValueError:
+                    conn.dropped += 1
+
+            conn.bytes += len(packet)
+            conn.readings += 1
+
+        if values is not None:
+
+            if self.storage is not None:
+
+                token = None
+
+                # Acknowledging the readings of a sequenced frame once they are stored
+                if isinstance(packet, protocol.Frame) and packet.sequence is not None:
+                    token = (meter_id, packet.session, packet.sequence + packet.values.shape[0])
+
+                self.storage.append(meter_id, timestamps, values, received, token)
+
+            if self.detector is not None:
+                self.detector.add(meter_id, timestamps, values)
+
+            conn.meters.add(meter_id)
+
+    def resume(self, conn, frame):
+
+        """
+        Description:
+        -----------
+        This function is used to drop the readings of a sequenced frame that were already received, which a client resends
+        after reconnecting, and acknowledge the readings received so far. With a storage the readings are only acknowledged
+        once they are stored, see persisted(), so a client keeps the readings a crash of the collector would lose.
+        With several worker processes a client that reconnects to another worker can have readings received twice,
+        as every worker only knows the sequences of its own clients.
+
+        Parameters:
+        -----------
+        conn: The connection the frame was received on (Connection)
+        frame: The sequenced frame (protocol.Frame)
+
+        Returns:
+        --------
+        frame: The frame holding only the readings not received yet, None when all of them were (protocol.Frame)
+        """
+
+        n = frame.values.shape[0]
+        session, expected = self.sequences.get(frame.meter_id, (frame.session, frame.sequence))
+
+        # A new session of the meter starts its own sequence
+        if session != frame.session:
+            expected = frame.sequence
+
+        # Counting the readings that never arrived
+        if frame.sequence > expected:
+            conn.missing += frame.sequence - expected
+
+        skip = min(max(expected - frame.sequence, 0), n)
+        conn.duplicates += skip
+
+        self.sequences[frame.meter_id] = (frame.session, max(expected, frame.sequence + n))
+
+        if self.storage is None:
+            conn.writer.write(protocol.encode_ack(frame.meter_id, frame.session, max(expected, frame.sequence + n)))
+
+        else:
+
+            self.routes[frame.meter_id] = conn
+            conn.meters.add(frame.meter_id)
+
+            # Acknowledging resent readings that are stored already, the others are acknowledged when their write completes
+            session, stored = self.stored.get(frame.meter_id, (None, 0))
+
+            if skip == n and session == frame.session:
+                conn.writer.write(protocol.encode_ack(frame.meter_id, frame.session, stored))
+
+        if skip == n:
+            return None
+
+        if skip == 0:
+            return frame
+
+        return protocol.Frame(frame.meter_id, frame.timestamps[skip:], frame.values[skip:], frame.session, frame.sequence + skip)
+
+    def persisted(self, token):
+
+        """
+        Description:
+        -----------
+        This function is used as the on_persist of the storage, passing the stored sequence of a meter to the event loop from the thread that wrote it.
+
+        Parameters:
+        -----------
+        token: The meter id, the session and the sequence after the last stored reading (tuple)
+
+        Returns:
+        --------
+        None
+        """
+
+        try:
+            self.loop.call_soon_threadsafe(self.acknowledge, *token)
+
+        # The event loop is already closed when the storage is closed after the collector
+        except (AttributeError, RuntimeError):
+            pass
+
+    def acknowledge(self, meter_id, session, sequence):
+
+        """
+        Description:
+        -----------
+        This function is used to record the readings of a meter that are stored and acknowledge them on the connection the meter last sent on.
+
+        Parameters:
+        -----------
+        meter_id: The id of the meter (str)
+        session: The session of the sender (int)
+        sequence: The sequence after the last stored reading (int)
+
+        Returns:
+        --------
+        None
+        """
+
+        last_session, stored = self.stored.get(meter_id, (None, 0))
+
+        if last_session == session:
+            sequence = max(sequence, stored)
+
+        self.stored[meter_id] = (session, sequence)
+
+        conn = self.routes.get(meter_id)
+
+        if conn is not None and not conn.writer.is_closing():
+            conn.writer.write(protocol.encode_ack(meter_id, session, sequence))
+
+    async def finish(self, conn):
+
+        """
+        Description:
+        -----------
+        This function is used to export the data of a client on a thread, so the other clients are still served while the file is written.
+        With a storage the buffered readings of the meters of the client are written instead.
+
+        Parameters:
+        -----------
+        conn: The connection of the client (Connection)
+
+        Returns:
+        --------
+        None
+        """
+
+        if conn.duplicates or conn.missing:
+            print("Dropped " + str(conn.duplicates) + " readings of " + str(conn.addr) + " that were received before, " + str(conn.missing) + " readings never arrived")
+
+        # Forgetting the readings of a text client, the next connection of the same address is a new meter
+        if self.detector is not None and self.frame_protocol == "text":
+            for meter_id in conn.meters:
+                self.detector.remove(meter_id)
+
+        if self.storage is not None:
+
+            await asyncio.get_running_loop().run_in_executor(None, self.storage.flush, list(conn.meters))
+
+            if conn.dropped:
+                print("Dropped " + str(conn.dropped) + " text packets of " + str(conn.addr) + " that were not a single number")
+
+            print("Stored " + str(conn.readings - conn.dropped) + " readings of " + str(conn.addr) + " in: " + self.storage.root)
+            return
+
+        # File name convention: <client_ip>_<client_port>_<date>_<time>.csv
+        f_name = conn.addr[0] + "_" + str(conn.addr[1]) + "_" + datetime.now().strftime("%d-%m-%Y_%H-%M-%S.csv")
+
+        if self.frame_protocol != "text":
+            df = frames_to_frame(conn.frames)
+        else:
+            df = pd.DataFrame(conn.values, columns = ['values'])
+
+        start = time.monotonic()
+        await asyncio.get_running_loop().run_in_executor(None, lambda: df.to_csv(f_name, index = False))
+        self.metrics.observe_write(df.shape[0], None, time.monotonic() - start)
+
+        print("The dataframe has been saved to: " + f_name)
+
+    async def export(self, conn):
+
+        """
+        Description:
+        -----------
+        This function is used to export the data of a client like finish(), counting a failed export instead of raising,
+        so the connection is still closed and forgotten when the file or the storage cannot be written
+
+        Parameters:
+        -----------
+        conn: The connection of the client (Connection)
+
+        Returns:
+        --------
+        None
+        """
+
+        try:
+            await self.finish(conn)
+
+        except Exception as e:
+            self.metrics.add('export_errors')
+            print("Could not export the readings of " + str(conn.addr) + ": " + str(e))
+
+    async def close(self):
+
+        """
+        Description:
+        -----------
+        This function is used to shut the server down: stop accepting clients, close every connection after its queued data
+        has been processed and exported, and cancel what is still running after shutdown_timeout seconds.
+
+        Parameters:
+        -----------
+        None
+
+        Returns:
+        --------
+        None
+        """
+
+        self.stopping.set()
+        self.rater.cancel()
+
+        # Receiving the datagrams still waiting, then exporting the readings of the socket like those of a client
+        if self.udp is not None:
+
+            asyncio.get_running_loop().remove_reader(self.receiver.sock.fileno())
+            self.receive_datagrams()
+            self.receiver.sock.close()
+
+            try:
+                await self.export(self.udp)
+
+            finally:
+
+                for name, value in (('bytes', self.udp.bytes), ('readings', self.udp.readings), ('failed_packets', self.udp.failed), ('duplicate_readings', self.udp.duplicates), ('missing_readings', self.udp.missing)):
+                    self.metrics.add(name, value)
+
+                self.connections.discard(self.udp)
+                self.udp = None
+
+        else:
+
+            self.server.close()
+
+            tasks = list(self.tasks)
+
+            for task in tasks:
+                task.cancel()
+
+            if tasks:
+                await asyncio.wait(tasks, timeout = self.shutdown_timeout)
+
+            await self.server.wait_closed()
+
+        if self.metrics_server is not None:
+            self.metrics_server.close()
+
+        # Scoring the windows still queued once the connections are done
+        if self.detector is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self.detector.stop)
+
+        # Writing what is still buffered and closing every chunk once the connections are done
+        if self.storage is not None:
+
+            self.flusher.cancel()
+            await asyncio.get_running_loop().run_in_executor(None, self.storage.close)
+
+    async def measure_rates(self):
+
+        """
+        Description:
+        -----------
+        This function is used to measure the bytes and readings per second of every client once a second.
+
+        Parameters:
+        -----------
+        None
+
+        Returns:
+        --------
+        None
+        """
+
+        last = time.monotonic()
+
+        while True:
+
+            await asyncio.sleep(1)
+
+            now = time.monotonic()
+
+            for conn in self.connections:
+
+                conn.bytes_per_second = (conn.bytes - conn.last_bytes) / (now - last)
+                conn.readings_per_second = (conn.readings - conn.last_readings) / (now - last)
+                conn.last_bytes, conn.last_readings = conn.bytes, conn.readings
+
+            last = now
+
+    def stats(self):
+
+        """
+        Description:
+        -----------
+        This function is used to read the metrics of the collector, the same ones the metrics endpoint serves, see metrics.render().
+
+        Parameters:
+        -----------
+        None
+
+        Returns:
+        --------
+        stats: The uptime, the counters including the connected clients, the persist latency and flush duration histograms,
+               the counters, rates and queue depth of every client, and the buffers of the storage and the detector when there are ones (dict)
+        """
+
+        stats = self.metrics.snapshot()
+        counters = stats['counters']
+
+        clients = []
+
+        for conn in list(self.connections):
+
+            clients.append({
+                'client': conn.addr[0] + ":" + str(conn.addr[1]),
+                'bytes': conn.bytes,
+                'readings': conn.readings,
+                'bytes_per_second': conn.bytes_per_second,
+                'readings_per_second': conn.readings_per_second,
+                'queued': 0 if conn.queue is None else conn.queue.qsize(),
+                'dropped': conn.dropped,
+            })
+
+            counters['bytes'] += conn.bytes
+            counters['readings'] += conn.readings
+            counters['dropped_packets'] += conn.dropped
+            counters['failed_packets'] += conn.failed
+            counters['duplicate_readings'] += conn.duplicates
+            counters['missing_readings'] += conn.missing
+
+        stats['clients'] = clients
+        stats['storage'] = None if self.storage is None else {'buffered': self.storage.buffered(), 'open_chunks': self.storage.open_chunks(), 'write_errors': self.storage.write_errors}
+        stats['detector'] = None if self.detector is None else self.detector.stats()
+
+        counters['out_of_order_readings'] = self.tracker.out_of_order
+        counters['lost_readings'] = self.tracker.lost
+        counters['expired_readings'] = self.tracker.expired
+
+        return stats
+
+    async def flush_periodically(self):
+
+        """
+        Description:
+        -----------
+        This function is used to write the readings that have waited flush_seconds in the storage, so that quiet meters are persisted too.
+
+        Parameters:
+        -----------
+        None
+
+        Returns:
+        --------
+        None
+        """
+
+        loop = asyncio.get_running_loop()
+
+        while True:
+
+            await asyncio.sleep(min(self.storage.flush_seconds, self.storage.chunk_seconds) / 2)
+
+            try:
+                await loop.run_in_executor(None, self.storage.flush, None, True)
+
+            # Handle any exceptions
+            except Exception as e:
+                print(e)
+
+    async def serve_forever(self):
+
+        """
+        Description:
+        -----------
+        This function is used to run the server until SIGINT or SIGTERM is received, then shut it down gracefully.
+
+        Parameters:
+        -----------
+        None
+
+        Returns:
+        --------
+        None
+        """
+
+        await self.start()
+
+        loop = asyncio.get_running_loop()
+
+        # Stopping on SIGINT and SIGTERM, on platforms without signal handlers Ctrl + C cancels the server instead
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self.stopping.set)
+            except (NotImplementedError, RuntimeError):
+                pass
+
+        try:
+            await self.stopping.wait()
+
+        finally:
+            print("Shutting down the server")
+            await self.close()
+
+# Defining a function for running a collector in a worker process
+def run_worker(host, port, reuse_port, options):
+
+    """
+    Description:
+    -----------
+    This function is used to run a collector until it is shut down.
+
+    Parameters:
+    -----------
+    host: The hostname of the server (str)
+    port: The port of the server (int)
+    reuse_port: Whether other processes can listen on the same port (bool)
+    options: The keyword arguments of the collector (dict)
+
+    Returns:
+    --------
+    None
+    """
+
+    try:
+        asyncio.run(Collector(host, port, reuse_port = reuse_port, **options).serve_forever())
+
+    except KeyboardInterrupt:
+        pass
+
+# Defining a function for starting the asyncio server
+def serve(host = "127.0.0.1", port = 5999, workers = 1, **options):
+
+    """
+    Description:
+    -----------
+    This function is used to run the asyncio collector, optionally in several worker processes sharing the port through SO_REUSEPORT.
+    Every worker accepts its share of the clients. SIGINT or SIGTERM shuts every worker down gracefully.
+
+    Parameters:
+    -----------
+    host: The hostname of the server (str)
+    port: The port of the server (int)
+    workers: The number of worker processes (int)
+    options: The keyword arguments of the collector, see Collector (dict)
+
+    Returns:
+    --------
+    None
+    """
+
+    if workers == 1:
+        run_worker(host, port, False, options)
+        return
+
+    # Raise an exception if the port cannot be shared on this platform
+    if not hasattr(socket, "SO_REUSEPORT"):
+        raise Exception("SO_REUSEPORT is not supported on this platform, use a single worker")
+
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target = run_worker, args = (host, port, True, options)) for _ in range(workers)]
+
+    for process in processes:
+        process.start()
+
+    # Passing SIGTERM on to the workers, each of them shuts down gracefully
+    signal.signal(signal.SIGTERM, lambda signum, frame: [process.terminate() for process in processes])
+
+    try:
+        for process in processes:
+            process.join()
+
+    # Ctrl + C reaches the workers too, waiting for them to shut down
+    except KeyboardInterrupt:
+        for process in processes:
+            process.join()
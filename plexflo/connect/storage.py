@@ -0,0 +1,682 @@
+import os
+import re
+import json
+import time
+import itertools
+import threading
+import collections
+import importlib.util
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from datetime import datetime, timezone
+
+# The counter of the chunks opened by this process, shared by every store so that two stores never give a chunk the same name
+chunk_counter = itertools.count(1)
+
+# Defining a function for turning a meter id into a folder name
+def meter_folder(root, meter_id):
+
+    """
+    Description:
+    -----------
+    This function is used to build the folder of a meter, replacing the characters that are not safe in file names.
+
+    Parameters:
+    -----------
+    root: The folder of the store (str)
+    meter_id: The id of the meter (str)
+
+    Returns:
+    --------
+    folder: The folder of the meter (str)
+    """
+
+    return os.path.join(root, re.sub(r"[^A-Za-z0-9_.-]", "_", str(meter_id)))
+
+# Defining a function for checking whether a process is still running
+def running(pid):
+
+    """
+    Description:
+    -----------
+    This function is used to check whether the process that opened a chunk is still writing to it.
+
+    Parameters:
+    -----------
+    pid: The id of the process (int)
+
+    Returns:
+    --------
+    running: Whether the process is running (bool)
+    """
+
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        return True
+
+    return True
+
+# Defining a function for reading a chunk file
+def read_chunk(f):
+
+    """
+    Description:
+    -----------
+    This function is used to read the readings of a chunk file, up to the last complete batch of a chunk that was cut short by a crash.
+
+    Parameters:
+    -----------
+    f: The path of the chunk file (str)
+
+    Returns:
+    --------
+    table: The readings of the chunk (pyarrow.Table)
+    """
+
+    import pyarrow as pa
+
+    batches = []
+
+    try:
+        with pa.OSFile(f, "rb") as source:
+            reader = pa.ipc.open_stream(source)
+            schema = reader.schema
+
+            for batch in reader:
+                batches.append(batch)
+
+    # Keeping the complete batches of a chunk that ends in the middle of a batch
+    except (pa.ArrowInvalid, OSError):
+        if not batches:
+            return pa.table({'timestamp': pa.array([], pa.timestamp("ns")), 'values': pa.array([], pa.float32())})
+
+    return pa.Table.from_batches(batches, schema = batches[0].schema if batches else schema)
+
+# Class for buffering the readings of a meter and appending them to its chunk files
+class MeterChunks:
+
+    def __init__(self, folder):
+
+        """
+        Description:
+        -----------
+        This class is used to hold the readings of a meter that have not been written yet and the chunk file they are appended to.
+
+        Parameters:
+        -----------
+        folder: The folder of the meter (str)
+
+        Returns:
+        --------
+        None
+        """
+
+        self.folder = folder
+        self.timestamps = []
+        self.values = []
+        self.rows = 0
+        self.since = None
+        self.due = False
+        self.token = None
+
+        # Held while the readings of the meter are taken out of the buffer and written, so that the writes of a meter keep their order
+        self.lock = threading.Lock()
+
+        self.file = None
+        self.writer = None
+        self.path = None
+        self.chunk_rows = 0
+        self.opened = None
+
+# Class for storing the readings of many meters in rolling chunk files
+class ChunkStore:
+
+    def __init__(self, root = None, flush_rows = 10000, flush_seconds = 5, chunk_rows = 1000000, chunk_seconds = 3600, max_open_chunks = 256, on_write = None, on_persist = None):
+
+        """
+        Description:
+        -----------
+        This class is used to spill the readings received by the collector to disk, in one folder of chunk files per meter.
+
+        The readings of a meter are buffered until flush_rows of them are waiting or the oldest has waited flush_seconds, then appended
+        to the open chunk of the meter as an Arrow IPC stream batch, which is readable up to the last batch written even after a crash.
+        append() only buffers, the meters that reach flush_rows are written by a background thread and the others by flush(),
+        so the event loop of the collector never waits for the disk. The buffers are only locked while they are swapped out, never during a write.
+        The open chunk ends in .part and is renamed to .arrows once it holds chunk_rows readings or has been open for chunk_seconds,
+        or when max_open_chunks chunks are open and it is the one written least recently, so thousands of meters fit in the file limit of the process.
+        A write that fails keeps its readings buffered for the next attempt and is counted in write_errors.
+        compact() merges the closed chunks into daily parquet files.
+
+        Parameters:
+        -----------
+        root: The folder of the store, defaults to output/collector (str)
+        flush_rows: The number of buffered readings of a meter that are written at once (int)
+        flush_seconds: The longest time a reading is buffered before it is written (float)
+        chunk_rows: The number of readings after which a chunk is closed (int)
+        chunk_seconds: The number of seconds after which a chunk is closed (float)
+        max_open_chunks: The number of chunks open for writing at a time, each holds a file descriptor (int)
+        on_write: The function called after every write with the number of readings, the seconds the oldest of them waited since it was received
+                  and the duration of the write, see metrics.Metrics.observe_write (function)
+        on_persist: The function called after a write with the token of the last append() of the written readings that had one,
+                    once those readings are on disk, from the thread that wrote them (function)
+
+        Returns:
+        --------
+        None
+        """
+
+        # Raise an exception if pyarrow is not installed
+        if importlib.util.find_spec("pyarrow") is None:
+            raise Exception("The collector storage requires pyarrow to be installed")
+
+        self.root = root if root is not None else os.path.join(os.getcwd(), "output", "collector")
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self.chunk_rows = chunk_rows
+        self.chunk_seconds = chunk_seconds
+        self.max_open_chunks = max_open_chunks
+        self.on_write = on_write
+        self.on_persist = on_persist
+
+        self.meters = {}
+        self.lock = threading.Lock()
+        self.write_errors = 0
+
+        # The meters with an open chunk, the one written least recently first
+        self.open = collections.OrderedDict()
+
+        # The meters that reached flush_rows, written by the writer thread
+        self.due = []
+        self.condition = threading.Condition(self.lock)
+        self.closing = False
+
+        Path(self.root).mkdir(parents=True, exist_ok=True)
+
+        # Closing the chunks left open by processes that did not shut down cleanly
+        for f in Path(self.root).glob("*/*.part"):
+
+            pid = int(f.stem.split("_")[1])
+
+            if pid != os.getpid() and not running(pid):
+                os.replace(f, str(f)[:-len(".part")] + ".arrows")
+
+        self.thread = threading.Thread(target = self.run, daemon = True)
+        self.thread.start()
+
+    def append(self, meter_id, timestamps, values, received = None, token = None):
+
+        """
+        Description:
+        -----------
+        This function is used to add readings of a meter, handing the meter to the writer thread once enough are buffered.
+
+        Parameters:
+        -----------
+        meter_id: The id of the meter (str)
+        timestamps: The timestamps of the readings in nanoseconds since the epoch (numpy.ndarray)
+        values: The readings (numpy.ndarray)
+        received: The time.monotonic() the readings were received at, defaults to now (float)
+        token: The value passed to on_persist once these readings are on disk, None passes none (object)
+
+        Returns:
+        --------
+        None
+        """
+
+        with self.lock:
+
+            meter = self.meters.get(meter_id)
+
+            if meter is None:
+                meter = self.meters[meter_id] = MeterChunks(meter_folder(self.root, meter_id))
+
+            if meter.rows == 0:
+                meter.since = time.monotonic() if received is None else received
+
+            meter.timestamps.append(np.asarray(timestamps, dtype = np.int64))
+            meter.values.append(np.asarray(values, dtype = np.float32))
+            meter.rows += len(values)
+
+            if token is not None:
+                meter.token = token
+
+            if meter.rows >= self.flush_rows and not meter.due:
+                meter.due = True
+                self.due.append(meter)
+                self.condition.notify()
+
+    def run(self):
+
+        # Writing the meters that reached flush_rows until the store is closed
+        while True:
+
+            with self.condition:
+
+                self.condition.wait_for(lambda: self.due or self.closing)
+
+                if not self.due:
+                    return
+
+                meters, self.due = self.due, []
+
+            for meter in meters:
+
+                try:
+                    with meter.lock:
+                        self.write(meter)
+
+                # Handle any exceptions
+                except Exception as e:
+                    print(e)
+
+    def write(self, meter):
+
+        """
+        Description:
+        -----------
+        This function is used to append the buffered readings of a meter to its open chunk, opening a new chunk when needed.
+        It is called with the lock of the meter held, the buffers are swapped out under the lock of the store and written without it.
+
+        Parameters:
+        -----------
+        meter: The buffered readings of the meter (MeterChunks)
+
+        Returns:
+        --------
+        None
+        """
+
+        import pyarrow as pa
+
+        # Taking the buffered readings without removing them, so they are kept when the write fails
+        with self.lock:
+
+            if meter.rows == 0:
+                return
+
+            parts, rows = len(meter.values), meter.rows
+            timestamps, values, since, token = meter.timestamps[:parts], meter.values[:parts], meter.since, meter.token
+            meter.due = False
+
+        start = time.monotonic()
+
+        batch = pa.record_batch([
+            pa.array(np.concatenate(timestamps), pa.int64()).cast(pa.timestamp("ns")),
+            pa.array(np.concatenate(values), pa.float32()),
+        ], names = ['timestamp', 'values'])
+
+        try:
+
+            if meter.writer is None:
+
+                self.make_room(meter)
+
+                Path(meter.folder).mkdir(parents=True, exist_ok=True)
+
+                count = next(chunk_counter)
+
+                # Chunk name convention: <utc time the chunk was opened>_<process id>_<counter>.part
+                name = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S") + "_" + str(os.getpid()) + "_" + str(count) + ".part"
+
+                meter.path = os.path.join(meter.folder, name)
+                meter.file = pa.OSFile(meter.path, "wb")
+                meter.writer = pa.ipc.new_stream(meter.file, batch.schema)
+                meter.chunk_rows = 0
+                meter.opened = time.monotonic()
+
+            meter.writer.write_batch(batch)
+
+        # Closing the chunk the write failed on, it is readable up to its last complete batch, and keeping the readings for the next write
+        except Exception:
+
+            with self.lock:
+                self.write_errors += 1
+
+            try:
+                self.rotate(meter)
+            except Exception:
+                pass
+
+            raise
+
+        with self.lock:
+
+            del meter.timestamps[:parts]
+            del meter.values[:parts]
+            meter.rows -= rows
+
+            if meter.token is token:
+                meter.token = None
+
+            self.open[meter] = True
+            self.open.move_to_end(meter)
+
+        meter.chunk_rows += batch.num_rows
+
+        if meter.chunk_rows >= self.chunk_rows:
+            self.rotate(meter)
+
+        if self.on_write is not None:
+            end = time.monotonic()
+            self.on_write(batch.num_rows, end - since, end - start)
+
+        if self.on_persist is not None and token is not None:
+            self.on_persist(token)
+
+    def make_room(self, meter):
+
+        """
+        Description:
+        -----------
+        This function is used to close the chunks written least recently before the chunk of a meter is opened, keeping at most max_open_chunks open.
+        Chunks of meters that are being written at the same time are skipped, so the limit can briefly be exceeded.
+
+        Parameters:
+        -----------
+        meter: The meter a chunk is opened for (MeterChunks)
+
+        Returns:
+        --------
+        None
+        """
+
+        with self.lock:
+            excess = len(self.open) + 1 - self.max_open_chunks
+            candidates = [other for other in self.open if other is not meter] if excess > 0 else []
+
+        for other in candidates:
+
+            if excess <= 0:
+                break
+
+            # Taking the lock of the other meter without waiting, as waiting while holding the lock of this meter could deadlock
+            if not other.lock.acquire(blocking = False):
+                continue
+
+            try:
+                if other.writer is not None:
+                    self.rotate(other)
+                    excess -= 1
+
+            finally:
+                other.lock.release()
+
+    def rotate(self, meter):
+
+        """
+        Description:
+        -----------
+        This function is used to close the open chunk of a meter so that it can be compacted, with the lock of the meter held.
+
+        Parameters:
+        -----------
+        meter: The buffered readings of the meter (MeterChunks)
+
+        Returns:
+        --------
+        None
+        """
+
+        if meter.writer is None:
+            return
+
+        try:
+
+            try:
+                meter.writer.close()
+            finally:
+                meter.file.close()
+
+            os.replace(meter.path, meter.path[:-len(".part")] + ".arrows")
+
+        # Forgetting the chunk even when closing it failed, a .part file left behind is closed when the store is opened again
+        finally:
+
+            meter.writer = meter.file = meter.path = None
+
+            with self.lock:
+                self.open.pop(meter, None)
+
+    def flush(self, meter_ids = None, due_only = False):
+
+        """
+        Description:
+        -----------
+        This function is used to write the buffered readings and close the chunks that have been open for chunk_seconds.
+        The meters are written one at a time, appending to the store is only blocked while the buffers of a meter are swapped out.
+
+        Parameters:
+        -----------
+        meter_ids: The meters to be flushed, None flushes every meter (list)
+        due_only: Whether only the readings that have waited flush_seconds are written (bool)
+
+        Returns:
+        --------
+        None
+        """
+
+        now = time.monotonic()
+
+        with self.lock:
+            meters = list(self.meters.values()) if meter_ids is None else [self.meters[m] for m in meter_ids if m in self.meters]
+
+        for meter in meters:
+
+            with meter.lock:
+
+                with self.lock:
+                    write = meter.rows > 0 and (not due_only or now - meter.since >= self.flush_seconds)
+
+                if write:
+                    self.write(meter)
+
+                if meter.writer is not None and now - meter.opened >= self.chunk_seconds:
+                    self.rotate(meter)
+
+    def buffered(self):
+
+        """
+        Description:
+        -----------
+        This function is used to count the readings that are buffered and not written yet.
+
+        Parameters:
+        -----------
+        None
+
+        Returns:
+        --------
+        rows: The number of buffered readings (int)
+        """
+
+        with self.lock:
+            return sum(meter.rows for meter in self.meters.values())
+
+    def open_chunks(self):
+
+        """
+        Description:
+        -----------
+        This function is used to count the chunks open for writing.
+
+        Parameters:
+        -----------
+        None
+
+        Returns:
+        --------
+        chunks: The number of open chunks (int)
+        """
+
+        with self.lock:
+            return len(self.open)
+
+    def close(self):
+
+        """
+        Description:
+        -----------
+        This function is used to stop the writer thread, write every buffered reading and close every chunk.
+
+        Parameters:
+        -----------
+        None
+
+        Returns:
+        --------
+        None
+        """
+
+        with self.condition:
+            self.closing = True
+            self.condition.notify_all()
+
+        self.thread.join()
+
+        with self.lock:
+            meters, self.meters = list(self.meters.values()), {}
+
+        for meter in meters:
+
+            with meter.lock:
+
+                try:
+                    self.write(meter)
+
+                # Handle any exceptions, the readings that could not be written are reported as lost
+                except Exception as e:
+                    print("Lost " + str(meter.rows) + " readings that could not be written to " + meter.folder + ": " + str(e))
+
+                finally:
+                    self.rotate(meter)
+
+# Defining a function for reading the stored readings of a meter
+def read(meter_id, root = None):
+
+    """
+    Description:
+    -----------
+    This function is used to read every stored reading of a meter, from its daily files and its chunks, sorted by timestamp.
+
+    Parameters:
+    -----------
+    meter_id: The id of the meter (str)
+    root: The folder of the store, defaults to output/collector (str)
+
+    Returns:
+    --------
+    data: The dataframe with the timestamp and values columns (pandas.DataFrame)
+    """
+
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    root = root if root is not None else os.path.join(os.getcwd(), "output", "collector")
+    folder = Path(meter_folder(root, meter_id))
+
+    tables, merged = [], set()
+
+    for f in sorted(folder.glob("daily/*.parquet")):
+        table = pq.read_table(f)
+        merged |= set(json.loads((table.schema.metadata or {}).get(b"chunks", b"[]")))
+        tables.append(table.replace_schema_metadata(None))
+
+    # Skipping the chunks of an interrupted compaction that were already merged into a daily file
+    tables += [read_chunk(str(f)) for f in sorted(folder.glob("*.arrows")) + sorted(folder.glob("*.part")) if f.name not in merged]
+
+    if not tables:
+        return pd.DataFrame({'timestamp': pd.Series([], dtype = "datetime64[ns]"), 'values': pd.Series([], dtype = np.float32)})
+
+    return pa.concat_tables(tables).to_pandas().sort_values('timestamp', kind = "stable").reset_index(drop = True)
+
+# Defining a function for merging closed chunks into daily files
+def compact(root = None, meter_ids = None):
+
+    """
+    Description:
+    -----------
+    This function is used to merge the closed chunks of every meter into one parquet file per UTC day, in <meter>/daily/<YYYY-MM-DD>.parquet.
+    Readings of a day that already has a daily file are merged into it. Every daily file is written to a temporary file first,
+    and the chunks are only deleted once all of their days have been written, so an interrupted compaction loses no reading.
+    Every daily file records the names of the chunks merged into it, so a compaction run again after an interruption skips them
+    instead of merging their readings twice.
+    Open chunks are left alone, they are compacted once they are closed.
+
+    Parameters:
+    -----------
+    root: The folder of the store, defaults to output/collector (str)
+    meter_ids: The meters to be compacted, None compacts every meter (list)
+
+    Returns:
+    --------
+    files: The paths of the daily files that were written (list)
+    """
+
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+
+    root = root if root is not None else os.path.join(os.getcwd(), "output", "collector")
+
+    if meter_ids is None:
+        folders = [f for f in Path(root).iterdir() if f.is_dir()] if os.path.isdir(root) else []
+    else:
+        folders = [Path(meter_folder(root, meter_id)) for meter_id in meter_ids]
+
+    written = []
+
+    for folder in folders:
+
+        chunks = sorted(folder.glob("*.arrows"))
+        if not chunks:
+            continue
+
+        # Splitting every chunk by the UTC day of its readings
+        parts = collections.defaultdict(list)
+
+        for f in chunks:
+
+            table = read_chunk(str(f))
+            days = pc.strftime(table['timestamp'], format = "%Y-%m-%d").to_numpy(zero_copy_only = False)
+
+            for day in np.unique(days):
+                parts[day].append((f.name, table.filter(pa.array(days == day))))
+
+        Path(os.path.join(folder, "daily")).mkdir(parents=True, exist_ok=True)
+
+        for day, day_parts in sorted(parts.items()):
+
+            f = os.path.join(folder, "daily", day + ".parquet")
+            tables, merged = [], set()
+
+            # Merging the readings into the existing daily file, skipping the chunks it already holds
+            if os.path.exists(f):
+                existing = pq.read_table(f)
+                merged = set(json.loads((existing.schema.metadata or {}).get(b"chunks", b"[]")))
+                tables.append(existing.replace_schema_metadata(None))
+
+            new = [(name, part) for name, part in day_parts if name not in merged]
+
+            if not new:
+                continue
+
+            schema = tables[0].schema if tables else new[0][1].schema
+            part = pa.concat_tables(tables + [table.cast(schema) for _, table in new])
+            part = part.take(pc.sort_indices(part, sort_keys = [("timestamp", "ascending")]))
+
+            # Writing the data and the names of its chunks in the same file, then replacing the daily file in one step
+            part = part.replace_schema_metadata({b"chunks": json.dumps(sorted(merged | {name for name, _ in new})).encode("utf-8")})
+
+            pq.write_table(part, f + ".tmp")
+            os.replace(f + ".tmp", f)
+
+            written.append(f)
+
+        for f in chunks:
+            os.remove(f)
+
+    return written
@@ -1,29 +1,102 @@
 import time
+import random
 import socket
+import numpy as np
 import pandas as pd
+from plexflo.connect import protocol as frames
+from plexflo.connect import datagram
+
+# Class for pacing the readings to a target rate
+class TokenBucket:
+
+    def __init__(self, rate, capacity):
+
+        """
+        Description:
+        -----------
+        This class is used to limit the readings sent to a target rate, allowing bursts of up to capacity readings.
+
+        Parameters:
+        -----------
+        rate: The number of readings per second (float)
+        capacity: The largest burst of readings (int)
+
+        Returns:
+        --------
+        None
+        """
+
+        self.rate = rate
+        self.capacity = max(capacity, 1)
+        self.tokens = self.capacity
+        self.last = time.perf_counter()
+
+    def wait(self, n):
+
+        """
+        Description:
+        -----------
+        This function is used to wait until n readings can be sent.
+
+        Parameters:
+        -----------
+        n: The number of readings to be sent (int)
+
+        Returns:
+        --------
+        None
+        """
+
+        now = time.perf_counter()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+
+        # Sleeping until the bucket holds enough tokens, batches larger than the bucket go into debt
+        if self.tokens < n:
+            time.sleep((n - self.tokens) / self.rate)
+            self.tokens = 0.0
+            self.last = time.perf_counter()
+        else:
+            self.tokens -= n
 
 # Defining a function for sending the data to a server
-def stream(data, host = "127.0.0.1", port = 5999, interval = 1):
+def stream(data, host = "127.0.0.1", port = 5999, interval = 1, protocol = "text", batch_size = 900, time_column = None, speedup = None, rate = None, meter_id = "meter", stats_every = 10, buffer_size = 65536, datagram_size = datagram.datagram_size):
 
     """
     Description:
     -----------
     This function is used to stream the data to a server.
 
+    The readings are paced, in order of precedence, by their timestamps replayed speedup times faster than they were recorded,
+    by a token bucket at rate readings per second, or by interval seconds between readings. An interval of 0 sends as fast as possible.
+    In binary mode the kW column is serialised batch by batch into frames (see connect.protocol) and written through a buffered writer.
+    In text mode every reading is sent on its own, as the text protocol has no delimiter between values.
+    In udp mode every batch is sent as a datagram holding one sequenced frame, with batches cut short to fit in datagram_size bytes.
+    Datagrams can be lost, the collector counts the readings that never arrived from the sequences.
+
     Parameters:
     -----------
     data: The data to be streamed (pandas.DataFrame)
     host: The hostname of the server (str)
     port: The port of the server (int)
-    interval: The interval between successive data packets (int)
+    interval: The interval between successive readings in seconds, also the spacing of the timestamps of binary frames without time_column (float)
+    protocol: Either "text", "binary" or "udp" (str)
+    batch_size: The largest number of readings in a binary frame or a datagram (int)
+    time_column: The column with the timestamps of the readings (str)
+    speedup: How many times faster than recorded the readings are replayed, requires time_column (float)
+    rate: The number of readings sent per second (float)
+    meter_id: The meter id of the binary frames (str)
+    stats_every: The number of seconds between two throughput reports (float)
+    buffer_size: The size of the write buffer in bytes (int)
+    datagram_size: The largest datagram in bytes in udp mode (int)
 
     Returns:
     --------
-    None
+    stats: The number of readings and bytes sent and the seconds it took, None when the connection failed (dict)
     """
 
     # localhost IP Address
-    HOST = host  
+    HOST = host
 
     # Port to listen on
     PORT = port
@@ -31,21 +104,60 @@ def stream(data, host = "127.0.0.1", port = 5999, interval = 1):
     # Raise an exception if the dataframe is empty
     if data.empty:
         raise Exception("DataFrame is empty!")
-            
+
     # Raise an exception if the column grid is not found
     if 'kW' not in data.columns:
         raise Exception("Column named 'kW' not found in the dataframe!")
-    
+
     # Handling null values in the grid column
     if data.kW.isna().any():
         data.kW = data.kW.fillna(0)
-    
-    # Raise an exception if the column grid has data other than int and float    
+
+    # Raise an exception if the column grid has data other than int and float
     if pd.api.types.is_numeric_dtype(data.kW) == False:
         raise Exception("kW data must be a numeric type (integer or float)")
 
-    # Create a socket (SOCK_STREAM means a TCP socket) 
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+    # Raise an exception if the protocol is not supported
+    if protocol not in ("text", "binary", "udp"):
+        raise Exception("Protocol must be either 'text', 'binary' or 'udp'")
+
+    # Raise an exception if the replay has no timestamps to follow
+    if speedup is not None and time_column is None:
+        raise Exception("A time_column is required to replay with a speedup")
+
+    n = data.shape[0]
+    values = data.kW.to_numpy(dtype = np.float32)
+
+    # Reading the timestamps once, or stamping the readings at the interval from now
+    if time_column is not None:
+        timestamps = pd.to_datetime(data[time_column]).to_numpy(dtype = "datetime64[ns]").view(np.int64)
+    else:
+        timestamps = time.time_ns() + np.arange(n, dtype = np.int64) * int((interval or 1) * 1e9)
+
+    # Cutting the readings into the batches sent at once, single readings in text mode
+    if protocol == "udp":
+        size = min(batch_size, datagram.max_readings(meter_id, datagram_size))
+    else:
+        size = batch_size if protocol == "binary" else 1
+    starts = np.arange(0, n, size)
+    ends = np.minimum(starts + size, n)
+
+    # Serialising the text readings in one go
+    if protocol == "text":
+        texts = data.kW.astype(str).to_numpy()
+
+    bucket = None
+    if speedup is None:
+        if rate is not None:
+            bucket = TokenBucket(rate, size)
+        elif interval:
+            bucket = TokenBucket(1.0 / interval, size)
+
+    # Numbering the readings of the datagrams in a session of their own
+    session = random.getrandbits(63)
+
+    # Create a socket (SOCK_STREAM means a TCP socket, SOCK_DGRAM a UDP socket)
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM if protocol == "udp" else socket.SOCK_STREAM) as s:
 
         # Try connecting to the server
         try:
@@ -55,17 +167,71 @@ def stream(data, host = "127.0.0.1", port = 5999, interval = 1):
             print(e)
             print("Try again by entering the correct HOST and PORT. Re-check if your server is running.")
             return
-        
-        # If the connection is successful, iterate through the rows and send the data to the server
-        for i, r in data.iterrows():
 
-            s.send(str(r['kW']).encode())
-            print("Sent: ", str(r['kW']).encode())
+        if protocol != "udp":
+            s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        writer = s.makefile("wb", buffering = buffer_size)
+        lost = 0
+
+        start = time.perf_counter()
+        report = start + stats_every
+        sent = 0
+        sent_bytes = 0
+
+        # Sending the batches in order, pacing every batch before it is written
+        for first, last in zip(starts, ends):
+
+            if speedup is not None:
+                delay = start + (timestamps[last - 1] - timestamps[0]) / 1e9 / speedup - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+
+            elif bucket is not None:
+                bucket.wait(last - first)
+
+            if protocol == "udp":
+
+                packet = frames.encode(meter_id, timestamps[first:last], values[first:last], session, int(first))
 
-            # Wait for the interval to pass
-            time.sleep(interval)
-        
-        print("Finished sending data")
+                # Nobody listening on the port is reported on a later send, the datagrams are lost like any other
+                try:
+                    s.send(packet)
+                except ConnectionRefusedError:
+                    lost += 1
+
+            elif protocol == "binary":
+                packet = frames.encode(meter_id, timestamps[first:last], values[first:last])
+                writer.write(packet)
+
+                # Flushing when paced so that every batch leaves when it is due, unpaced batches fill the buffer first
+                if speedup is not None or bucket is not None:
+                    writer.flush()
+
+            else:
+                packet = texts[first].encode()
+                s.sendall(packet)
+
+            sent += int(last - first)
+            sent_bytes += len(packet)
+
+            # Printing the throughput every stats_every seconds instead of every reading
+            now = time.perf_counter()
+            if now >= report:
+                print("Sent " + str(sent) + " of " + str(n) + " readings, " + str(round(sent / (now - start), 1)) + " readings/s, " + str(round(sent_bytes / (now - start) / 1024, 1)) + " KB/s")
+                report = now + stats_every
+
+        writer.flush()
+        writer.close()
+
+        seconds = time.perf_counter() - start
+
+        print("Finished sending data: " + str(sent) + " readings in " + str(round(seconds, 3)) + " s")
+
+        if lost:
+            print(str(lost) + " datagrams were refused, check that the collector is listening for udp")
 
         # Close the socket
-        s.close()
\ No newline at end of file
+        s.close()
+
+    return {"readings": sent, "bytes": sent_bytes, "seconds": seconds}
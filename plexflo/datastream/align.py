@@ -0,0 +1,116 @@
+# Importing libraries
+
+import numpy as np
+import pandas as pd
+
+# Function to align a series to an even cadence before windowing
+def align(data, time_column = "localminute", cadence = "1s", method = "interpolate", duplicates = "mean", max_gap = None, time_format = None):
+
+    """
+    Description:
+    -----------
+    This function is used to turn a series with duplicate timestamps, gaps and jitter into evenly spaced samples at the cadence of the model.
+    The timestamps are parsed once, sorted and deduplicated, and the grid values are resampled with vectorized interpolation or forward-fill.
+    Every resampled sample that falls inside a gap longer than max_gap is marked in the gap column, so that predict() can skip the windows with too many of them.
+
+    Parameters:
+    -----------
+    data: The dataframe with a timestamp column and a grid column (pandas.DataFrame)
+    time_column: The name of the timestamp column (str)
+    cadence: The spacing of the resampled samples as a pandas timedelta string (str)
+    method: How the samples between observations are filled, either "interpolate" or "ffill" (str)
+    duplicates: How the grid values sharing a timestamp are combined, one of "mean", "first" or "last" (str)
+    max_gap: The longest time between two observations that is not a gap as a pandas timedelta string, defaults to twice the cadence (str)
+    time_format: The strftime format of the timestamps, speeds up the parsing of text timestamps (str)
+
+    Returns:
+    --------
+    data: The dataframe with the timestamp, grid and gap columns at the given cadence (pandas.DataFrame)
+    """
+
+    # Raise an exception if the dataframe is empty
+    if data.empty:
+        raise Exception("DataFrame is empty!")
+
+    # Converting column names to lower case internally for validation purposes
+    data.columns = map(str.lower, data.columns)
+    time_column = time_column.lower()
+
+    # Raise an exception if the columns grid and timestamp are not found
+    if 'grid' not in data.columns:
+        raise Exception("Column named 'grid' not found in the dataframe!")
+
+    if time_column not in data.columns:
+        raise Exception("Column named '" + time_column + "' not found in the dataframe!")
+
+    # Raise an exception if the column grid has data other than int and float
+    if pd.api.types.is_numeric_dtype(data.grid) == False:
+        raise Exception("Grid data must be a numeric type (integer or float)")
+
+    if method not in ("interpolate", "ffill"):
+        raise Exception("Method must be either 'interpolate' or 'ffill'")
+
+    if duplicates not in ("mean", "first", "last"):
+        raise Exception("Duplicates must be one of 'mean', 'first' or 'last'")
+
+    step = pd.Timedelta(cadence).value
+    gap = 2 * step if max_gap is None else pd.Timedelta(max_gap).value
+
+    # Raise an exception if the cadence is not positive
+    if step <= 0:
+        raise Exception("Cadence must be a positive duration")
+
+    # Parsing the timestamps once into nanoseconds
+    times = data[time_column]
+    if not pd.api.types.is_datetime64_any_dtype(times):
+        times = pd.to_datetime(times, format = time_format)
+
+    t = times.to_numpy(dtype = "datetime64[ns]").view(np.int64)
+    v = data.grid.to_numpy(dtype = np.float64)
+
+    # Dropping the rows without a timestamp or a grid value, they are filled like any other gap
+    keep = (t != np.iinfo(np.int64).min) & ~np.isnan(v)
+    t, v = t[keep], v[keep]
+
+    if t.shape[0] == 0:
+        raise Exception("No rows with both a timestamp and a grid value")
+
+    # Sorting the observations by time, keeping the order of the rows sharing a timestamp
+    if (t[1:] < t[:-1]).any():
+        order = np.argsort(t, kind = "stable")
+        t, v = t[order], v[order]
+
+    # Combining the observations sharing a timestamp
+    if (t[1:] == t[:-1]).any():
+
+        firsts = np.flatnonzero(np.concatenate(([True], t[1:] != t[:-1])))
+
+        if duplicates == "mean":
+            v = np.add.reduceat(v, firsts) / np.diff(np.append(firsts, t.shape[0]))
+        elif duplicates == "first":
+            v = v[firsts]
+        else:
+            v = v[np.append(firsts[1:], t.shape[0]) - 1]
+
+        t = t[firsts]
+
+    # Building the evenly spaced timestamps relative to the first one, floored to the cadence, so the arithmetic stays exact
+    t0 = t[0] - t[0] % step
+    observed = t - t0
+    target = np.arange(0, observed[-1] + 1, step, dtype = np.int64)
+
+    # Finding the observations before and after every resampled sample in linear time, from the first sample at or after every observation
+    first = -(-observed // step)
+    before = np.concatenate((np.zeros(first[0], dtype = np.int64), np.repeat(np.arange(observed.shape[0]), np.diff(np.append(first, target.shape[0])))))
+    after = np.minimum(before + (target > observed[before]), observed.shape[0] - 1)
+
+    if method == "interpolate":
+        values = np.interp(target, observed, v)
+    else:
+        values = v[before]
+
+    return pd.DataFrame({
+        time_column: (target + t0).view("datetime64[ns]"),
+        'grid': values.astype(np.float32),
+        'gap': (observed[after] - observed[before]) > gap,
+    })
@@ -0,0 +1,286 @@
+# Importing libraries
+
+import os
+import numpy as np
+from pathlib import Path
+from plexflo.datastream.inference import seqlen, binary_threshold_15_min, predict_windows
+
+import warnings
+warnings.filterwarnings("ignore")
+
+# Function to export the 15 min model to a TFLite flatbuffer
+def export_tflite(model, out_fname = None, quantization = None, representative_windows = None):
+
+    """
+    Description:
+    -----------
+    This function is used to export the 15 min model to a TFLite flatbuffer, with optional post-training quantization
+
+    Parameters:
+    -----------
+    model: The loaded model (plexflo.datastream.model.Model)
+    out_fname: The name of the exported flatbuffer inside output/models (str)
+    quantization: None, "float16" or "int8". The inputs and outputs stay float32 in every case (str)
+    representative_windows: The windows used to calibrate the int8 quantization with shape (n_windows, seqlen) (numpy.ndarray)
+
+    Returns:
+    --------
+    f: The path of the exported flatbuffer (str)
+    """
+
+    import tensorflow as tf
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model.model_15_min)
+
+    # Setting up the post-training quantization
+    if quantization == "float16":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+
+    elif quantization == "int8":
+
+        # Raise an exception if there is no data to calibrate the quantization with
+        if representative_windows is None:
+            raise Exception("Representative windows are required for int8 quantization")
+
+        def representative_dataset():
+            for window in representative_windows:
+                yield [np.reshape(window, (1, 1, seqlen)).astype(np.float32)]
+
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = representative_dataset
+
+    elif quantization is not None:
+        raise Exception("Quantization must be either None, 'float16' or 'int8'")
+
+    # Setting the export name
+    f = "model_15_min.tflite"
+    if out_fname is not None:
+        f = out_fname
+
+    Path(os.path.join(os.getcwd(), "output", "models")).mkdir(parents=True, exist_ok=True)
+    f = os.path.join(os.getcwd(), "output", "models", f)
+
+    with open(f, "wb") as file:
+        file.write(converter.convert())
+
+    print("15 Min Model exported to: " + f)
+
+    return f
+
+# Function to export the 15 min model as a SavedModel with a single concrete signature
+def export_saved_model(model, out_fname = None):
+
+    """
+    Description:
+    -----------
+    This function is used to export the inference graph of the 15 min model as a SavedModel with a (batch, 1, seqlen) signature
+
+    Parameters:
+    -----------
+    model: The loaded model (plexflo.datastream.model.Model)
+    out_fname: The name of the exported SavedModel folder inside output/models (str)
+
+    Returns:
+    --------
+    f: The path of the exported SavedModel folder (str)
+    """
+
+    import tensorflow as tf
+
+    module = tf.Module()
+    module.model = model.model_15_min
+
+    # Tracing the model once in inference mode for any batch size
+    @tf.function(input_signature = [tf.TensorSpec(shape = (None, 1, seqlen), dtype = tf.float32, name = "windows")])
+    def serve(windows):
+        return {"outputs": module.model(windows, training = False)}
+
+    module.serve = serve
+
+    # Setting the export name
+    f = "model_15_min"
+    if out_fname is not None:
+        f = out_fname
+
+    f = os.path.join(os.getcwd(), "output", "models", f)
+    tf.saved_model.save(module, f, signatures = {"serving_default": serve})
+
+    print("15 Min Model exported to: " + f)
+
+    return f
+
+# Class for running an exported TFLite flatbuffer in place of the Keras model
+class TFLiteModel:
+
+    def __init__(self, path = None, num_threads = None):
+
+        """
+        Description:
+        -----------
+        This class is used to load an exported TFLite flatbuffer. It can be passed to predict() in place of the Model class.
+        An instance must not be shared between threads.
+
+        Parameters:
+        -----------
+        path: The name of the flatbuffer inside output/models, defaults to model_15_min.tflite (str)
+        num_threads: The number of threads used by the interpreter (int)
+
+        Returns:
+        --------
+        None
+        """
+
+        if path is None:
+            path = "model_15_min.tflite"
+
+        self.path = os.path.join(os.getcwd(), "output", "models", path)
+
+        # Using the standalone TFLite runtime when it is installed, it is much lighter than the full TensorFlow package
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+
+        # Loading the flatbuffer with the interpreter
+        try:
+            self.interpreter = Interpreter(model_path = self.path, num_threads = num_threads)
+            print("15 Min TFLite Model loaded")
+
+        except:
+            raise Exception("15 Min TFLite Model not found")
+
+        self.input_index = self.interpreter.get_input_details()[0]["index"]
+        self.output_index = self.interpreter.get_output_details()[0]["index"]
+        self.batch_size = None
+
+        # Exposing the interpreter under the same name as the Keras model
+        self.model_15_min = self.run
+
+    def run(self, inputs, training = False):
+
+        """
+        Description:
+        -----------
+        This function is used to run a batch of windows through the interpreter
+
+        Parameters:
+        -----------
+        inputs: The windows with shape (batch, 1, seqlen) (numpy.ndarray or tf.Tensor)
+        training: Unused, kept for compatibility with the Keras model (bool)
+
+        Returns:
+        --------
+        outputs: The model outputs with shape (batch, 1) (numpy.ndarray)
+        """
+
+        inputs = np.asarray(inputs, dtype = np.float32)
+
+        # Resizing the input only when the batch size changes, the tensors are re-allocated on every resize
+        if inputs.shape[0] != self.batch_size:
+            self.interpreter.resize_tensor_input(self.input_index, inputs.shape)
+            self.interpreter.allocate_tensors()
+            self.batch_size = inputs.shape[0]
+
+        self.interpreter.set_tensor(self.input_index, inputs)
+        self.interpreter.invoke()
+
+        return self.interpreter.get_tensor(self.output_index)
+
+# Class for running an exported SavedModel signature in place of the Keras model
+class SignatureModel:
+
+    def __init__(self, path = None):
+
+        """
+        Description:
+        -----------
+        This class is used to load the serving signature of an exported SavedModel. It can be passed to predict() in place of the Model class.
+
+        Parameters:
+        -----------
+        path: The name of the SavedModel folder inside output/models, defaults to model_15_min (str)
+
+        Returns:
+        --------
+        None
+        """
+
+        if path is None:
+            path = "model_15_min"
+
+        self.path = os.path.join(os.getcwd(), "output", "models", path)
+
+        import tensorflow as tf
+
+        # Loading only the serving signature, the training graph is never rebuilt
+        try:
+            self.signature = tf.saved_model.load(self.path).signatures["serving_default"]
+            print("15 Min SavedModel loaded")
+
+        except:
+            raise Exception("15 Min SavedModel not found")
+
+        self.input_name = list(self.signature.structured_input_signature[1].keys())[0]
+
+        # Exposing the signature under the same name as the Keras model
+        self.model_15_min = self.run
+
+    def run(self, inputs, training = False):
+
+        """
+        Description:
+        -----------
+        This function is used to run a batch of windows through the serving signature
+
+        Parameters:
+        -----------
+        inputs: The windows with shape (batch, 1, seqlen) (numpy.ndarray or tf.Tensor)
+        training: Unused, kept for compatibility with the Keras model (bool)
+
+        Returns:
+        --------
+        outputs: The model outputs with shape (batch, 1) (numpy.ndarray)
+        """
+
+        outputs = self.signature(**{self.input_name: np.asarray(inputs, dtype = np.float32)})
+
+        return list(outputs.values())[0].numpy()
+
+# Function to compare the outputs of an inference backend against the Keras model
+def check_parity(model, backend, windows, batch_size = 256, atol = 1e-3):
+
+    """
+    Description:
+    -----------
+    This function is used to compare the outputs of an inference backend against the Keras model on the same windows
+
+    Parameters:
+    -----------
+    model: The loaded Keras model (plexflo.datastream.model.Model)
+    backend: The inference backend to be checked (TFLiteModel or SignatureModel)
+    windows: The windows to be compared with shape (n_windows, seqlen) (numpy.ndarray)
+    batch_size: The number of windows sent to the models in a single call (int)
+    atol: The largest absolute difference of the outputs that is accepted (float)
+
+    Returns:
+    --------
+    report: The largest and mean absolute difference, the share of matching EV labels and whether the check passed (dict)
+    """
+
+    expected = predict_windows(model, windows, batch_size)
+    outputs = predict_windows(backend, windows, batch_size)
+
+    difference = np.abs(expected - outputs)
+
+    report = {
+        "max_abs_diff": float(difference.max()),
+        "mean_abs_diff": float(difference.mean()),
+        "label_agreement": float(np.mean((expected > binary_threshold_15_min) == (outputs > binary_threshold_15_min))),
+    }
+    report["passed"] = report["max_abs_diff"] <= atol and report["label_agreement"] == 1.0
+
+    print("Parity check " + ("passed" if report["passed"] else "failed") + ": " + str(report))
+
+    return report
@@ -0,0 +1,313 @@
+# Importing libraries
+
+import os
+import time
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from plexflo.loadprofiles import profiles
+from plexflo.datastream.utils import peak_rss_mb
+from plexflo.datastream.inference import seqlen, predict
+
+# Function to generate a synthetic grid series with EV charging blocks
+def synthetic_grid(n_samples, profile = "morning_peak_average_household_WD_SU.csv", base_kw = 1.0, noise = 0.05, ev_kw = 7.2, events_per_day = 0.5, duration = (3600, 14400), seed = None):
+
+    """
+    Description:
+    -----------
+    This function is used to generate a 1 Hz grid series that follows a 24-hour load profile, with EV-like charging blocks added on top
+
+    Parameters:
+    -----------
+    n_samples: The number of samples to be generated (int)
+    profile: The load profile the household consumption follows, see loadprofiles.profiles.show() (str)
+    base_kw: The consumption in kW for a multiplier of 1 (float)
+    noise: The standard deviation of the noise in kW (float)
+    ev_kw: The power drawn by a charging EV in kW (float)
+    events_per_day: The average number of charging events per day (float)
+    duration: The shortest and longest charging event in seconds (tuple)
+    seed: The seed of the random generator (int)
+
+    Returns:
+    --------
+    data: The dataframe with the grid and ground_truth columns (pandas.DataFrame)
+    """
+
+    rng = np.random.default_rng(seed)
+
+    # Stretching the hourly multipliers of the profile to one value per second, wrapping around midnight
+    multipliers = profiles.multipliers(*profiles.parse(profile))
+    hours = (np.arange(n_samples) / 3600.0) % 24
+    grid = base_kw * np.interp(hours, np.arange(25), np.append(multipliers, multipliers[0]))
+    grid += rng.normal(0, noise, n_samples)
+
+    # Adding the charging blocks through a difference array, so overlapping events simply add up
+    n_events = rng.poisson(events_per_day * n_samples / 86400.0)
+    starts = rng.integers(0, n_samples, n_events)
+    ends = np.minimum(starts + rng.integers(duration[0], duration[1] + 1, n_events), n_samples)
+
+    changes = np.zeros(n_samples + 1, dtype = np.int64)
+    np.add.at(changes, starts, 1)
+    np.add.at(changes, ends, -1)
+    charging = np.cumsum(changes[:-1])
+
+    grid += ev_kw * charging
+
+    return pd.DataFrame({'grid': grid.astype(np.float32), 'ground_truth': (charging > 0).astype(np.int8)})
+
+# Class for a small randomly initialised model with the input and output shapes of the 15 min model
+class StandInModel:
+
+    def __init__(self, seed = 0):
+
+        """
+        Description:
+        -----------
+        This class is used to build a small randomly initialised model that stands in for the shipped weights, so the benchmark runs offline
+
+        Parameters:
+        -----------
+        seed: The seed used to initialise the weights (int)
+
+        Returns:
+        --------
+        None
+        """
+
+        import tensorflow as tf
+
+        tf.keras.utils.set_random_seed(seed)
+
+        inputs = tf.keras.Input(shape = (1, seqlen))
+        x = tf.keras.layers.Reshape((seqlen, 1))(inputs)
+        x = tf.keras.layers.Conv1D(16, 9, strides = 4, activation = "relu")(x)
+        x = tf.keras.layers.Conv1D(16, 9, strides = 4, activation = "relu")(x)
+        x = tf.keras.layers.GlobalAveragePooling1D()(x)
+        outputs = tf.keras.layers.Dense(1, activation = "sigmoid")(x)
+
+        self.model_15_min = tf.keras.Model(inputs, outputs)
+
+# Class for timing every call to a model
+class TimedModel:
+
+    def __init__(self, model):
+
+        """
+        Description:
+        -----------
+        This class is used to wrap a model and record how long every batch takes and how many windows it holds
+
+        Parameters:
+        -----------
+        model: The model to be timed (plexflo.datastream.model.Model)
+
+        Returns:
+        --------
+        None
+        """
+
+        self.model = model
+        self.calls = []
+
+    def model_15_min(self, inputs, training = False):
+
+        start = time.perf_counter()
+        outputs = np.asarray(self.model.model_15_min(inputs, training = training))
+        self.calls.append((time.perf_counter() - start, inputs.shape[0]))
+
+        return outputs
+
+# Function to benchmark predict() across input lengths and batch sizes
+def run(lengths = (86400, 7 * 86400), batch_sizes = (1, 64, 256, 1024), hop = None, model_path = None, repeats = 1, seed = 0, out_fname = None):
+
+    """
+    Description:
+    -----------
+    This function is used to benchmark predict() on synthetic data for every combination of input length and batch size.
+    The stand-in model is used unless model_path is given. The peak memory is the peak of the whole process up to the end of every run.
+
+    Parameters:
+    -----------
+    lengths: The number of samples of the synthetic inputs (tuple)
+    batch_sizes: The batch sizes to be compared (tuple)
+    hop: The number of samples between overlapping windows, None scores back-to-back windows (int)
+    model_path: The path of a fine-tuned model to load instead of the stand-in model, "default" loads the shipped model (str)
+    repeats: The number of times every combination is run, the fastest run is kept (int)
+    seed: The seed of the synthetic data and the stand-in model (int)
+    out_fname: The file name of the exported results inside output/files, None only returns them (str)
+
+    Returns:
+    --------
+    results: The dataframe with one row per input length and batch size (pandas.DataFrame)
+    """
+
+    # Timing the model load
+    start = time.perf_counter()
+
+    if model_path is None:
+        model = StandInModel(seed)
+    else:
+        from plexflo.datastream.model import Model
+        model = Model(None if model_path == "default" else model_path, cache = False)
+
+    load_time = time.perf_counter() - start
+
+    print("Model loaded in " + str(round(load_time, 3)) + " s")
+
+    rows = []
+
+    for length in lengths:
+
+        data = synthetic_grid(length, seed = seed)
+
+        for batch_size in batch_sizes:
+
+            best = None
+
+            for _ in range(repeats):
+
+                timed = TimedModel(model)
+
+                start = time.perf_counter()
+                predict(timed, data[['grid']].copy(), batch_size = batch_size, hop = hop, sink = "none")
+                elapsed = time.perf_counter() - start
+
+                if best is None or elapsed < best[0]:
+                    best = (elapsed, timed.calls)
+
+            elapsed, calls = best
+            windows = sum(n for _, n in calls)
+            per_window = np.array([t / n for t, n in calls]) * 1000.0
+
+            rows.append({
+                "samples": length,
+                "batch_size": batch_size,
+                "windows": windows,
+                "seconds": elapsed,
+                "windows_per_second": windows / elapsed if elapsed > 0 else float("nan"),
+                "model_share": sum(t for t, _ in calls) / elapsed if elapsed > 0 else float("nan"),
+                "window_latency_p50_ms": float(np.percentile(per_window, 50)) if windows else float("nan"),
+                "window_latency_p95_ms": float(np.percentile(per_window, 95)) if windows else float("nan"),
+                "window_latency_p99_ms": float(np.percentile(per_window, 99)) if windows else float("nan"),
+                "peak_rss_mb": peak_rss_mb(),
+                "model_load_seconds": load_time,
+            })
+
+            print("samples: " + str(length) + ", batch size: " + str(batch_size) + ", windows/s: " + str(round(rows[-1]["windows_per_second"], 1)))
+
+    results = pd.DataFrame(rows)
+
+    # Exporting the results to a csv file
+    if out_fname is not None:
+        Path(os.path.join(os.getcwd(), "output", "files")).mkdir(parents=True, exist_ok=True)
+        results.to_csv(os.path.join(os.getcwd(), "output", "files", out_fname), index = False)
+
+    return results
+
+# Function to build the training dataset the way finetune_15min_model() built it with Dataset.window()
+def nested_window_dataset(arr, seqlen = 900, shift = 30, batchsize = 64):
+
+    """
+    Description:
+    -----------
+    This function is used to build the windowed training dataset through nested window datasets, as the baseline of window_throughput()
+
+    Parameters:
+    -----------
+    arr: The array with the grid values in the first column and the ground truth in the others (numpy.ndarray)
+    seqlen: The number of samples in a window (int)
+    shift: Number of samples between the starts of two windows (int)
+    batchsize: The batchsize of the data (int)
+
+    Returns:
+    --------
+    dataset: The dataset of (window, label) batches (tf.data.Dataset)
+    """
+
+    import tensorflow as tf
+
+    dataset = tf.data.Dataset.from_tensor_slices(arr)
+    dataset = dataset.window(seqlen, shift = shift, drop_remainder = True).flat_map(lambda x: x.batch(seqlen)).map(lambda x: (x[:, 0], [x[-1, 1:]]))
+
+    return dataset.batch(batchsize, drop_remainder = True).prefetch(1)
+
+# Function to compare the throughput of the windowed training datasets
+def window_throughput(n_samples = 7 * 86400, shift = 30, batchsize = 64, epochs = 2, seed = 0):
+
+    """
+    Description:
+    -----------
+    This function is used to time full passes over the training windows of a synthetic series, with the nested window datasets
+    and with windows.window_dataset() from an in-memory and a memory-mapped array, checking that all of them yield the same batches
+
+    Parameters:
+    -----------
+    n_samples: The number of samples of the synthetic series (int)
+    shift: Number of samples between the starts of two windows (int)
+    batchsize: The batchsize of the data (int)
+    epochs: The number of passes timed for every dataset, the first pass is reported separately (int)
+    seed: The seed of the synthetic data (int)
+
+    Returns:
+    --------
+    results: The dataframe with the windows/s of the first and later passes of every dataset (pandas.DataFrame)
+    """
+
+    import tempfile
+    from plexflo.datastream.windows import window_dataset
+
+    arr = synthetic_grid(n_samples, seed = seed)[['grid', 'ground_truth']].to_numpy(dtype = np.float32)
+
+    # Writing the array to a temporary folder for the memory-mapped dataset, the folder is removed once every dataset was timed
+    with tempfile.TemporaryDirectory() as folder:
+
+        f = os.path.join(folder, "windows.npy")
+        np.save(f, arr)
+
+        datasets = {
+            "nested_window": nested_window_dataset(arr, seqlen, shift, batchsize),
+            "window_index": window_dataset(arr, seqlen, shift, batchsize, drop_remainder = True),
+            "window_index_mmap": window_dataset(np.load(f, mmap_mode = "r"), seqlen, shift, batchsize, drop_remainder = True),
+        }
+
+        rows = []
+        reference = None
+
+        for name, dataset in datasets.items():
+
+            times = []
+
+            for _ in range(epochs):
+
+                windows = 0
+                batches = []
+                start = time.perf_counter()
+
+                for x, y in dataset:
+                    windows += x.shape[0]
+                    batches.append((x, y))
+
+                times.append(time.perf_counter() - start)
+
+            # Raise an exception if the datasets do not yield the same windows and labels
+            x = np.concatenate([np.asarray(x) for x, _ in batches])
+            y = np.concatenate([np.asarray(y) for _, y in batches])
+
+            if reference is None:
+                reference = (x, y)
+            elif not (np.array_equal(reference[0], x) and np.array_equal(reference[1], y)):
+                raise Exception("The " + name + " dataset does not match the nested window dataset")
+
+            rows.append({
+                "dataset": name,
+                "windows": windows,
+                "first_pass_windows_per_second": windows / times[0],
+                "later_pass_windows_per_second": windows / min(times[1:]) if len(times) > 1 else float("nan"),
+            })
+
+            print(name + ", windows/s: " + str(round(rows[-1]["first_pass_windows_per_second"], 1)))
+
+    return pd.DataFrame(rows)
+
+if __name__ == "__main__":
+    print(run().to_string(index = False))
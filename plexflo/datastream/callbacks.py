@@ -0,0 +1,218 @@
+# Importing libraries
+
+import os
+import csv
+import json
+import time
+from pathlib import Path
+from plexflo.datastream.utils import peak_rss_mb
+
+# The callback class, only built the first time it is needed so that importing this module does not import TensorFlow
+training_monitor = None
+
+# Columns of the per-step log
+step_columns = ["epoch", "step", "wall", "overhead", "samples_per_second", "loss", "accuracy"]
+
+# Function to write a file through a temporary file so that readers never see a partial file
+def write_atomic(f, write):
+
+    """
+    Description:
+    -----------
+    This function is used to write a file to a temporary file first and move it in place once it is complete
+
+    Parameters:
+    -----------
+    f: The path of the file (str)
+    write: The function writing the content to an open text file (function)
+
+    Returns:
+    --------
+    None
+    """
+
+    with open(f + ".tmp", "w", newline = "") as handle:
+        write(handle)
+
+    os.replace(f + ".tmp", f)
+
+# Function to build the training monitor callback class
+def training_monitor_class():
+
+    """
+    Description:
+    -----------
+    This function is used to import TensorFlow and build the training monitor callback class the first time it is needed
+
+    Parameters:
+    -----------
+    None
+
+    Returns:
+    --------
+    TrainingMonitor: The training monitor callback class (tf.keras.callbacks.Callback)
+    """
+
+    global training_monitor
+
+    if training_monitor is None:
+
+        import tensorflow as tf
+
+        class TrainingMonitor(tf.keras.callbacks.Callback):
+
+            def __init__(self, name = "finetune", batch_size = None, profile_steps = None, flush_every = 100):
+
+                """
+                Description:
+                -----------
+                This class is used to record the time spent in every training step and epoch, the throughput and the peak memory,
+                and write them with the Keras history to output/logs/<name> while training runs:
+                steps.csv holds one row per training step, epochs.csv one row per epoch and history.json the history of every metric.
+
+                The wall time of a step is taken between on_train_batch_begin and on_train_batch_end, so it holds both the wait for the input
+                batch and the compute, and the first step also holds the tracing of the step function. The profiler trace splits the two,
+                see the input pipeline analysis of TensorBoard.
+                The overhead is the time between two steps spent outside Keras' step function, mostly in callbacks.
+
+                Parameters:
+                -----------
+                name: The folder the logs are written to, inside output/logs (str)
+                batch_size: The number of windows in a batch, used for the samples per second, the last batch of an epoch can be smaller (int)
+                profile_steps: The first and last training step, counted over all epochs, of a TensorFlow profiler trace written to output/logs/<name>/profile (tuple)
+                flush_every: The number of steps between two writes of steps.csv (int)
+
+                Returns:
+                --------
+                None
+                """
+
+                super().__init__()
+
+                self.folder = os.path.join(os.getcwd(), "output", "logs", name)
+                self.batch_size = batch_size
+                self.profile_steps = profile_steps
+                self.flush_every = flush_every
+
+                self.steps_path = os.path.join(self.folder, "steps.csv")
+                self.epochs_path = os.path.join(self.folder, "epochs.csv")
+                self.history_path = os.path.join(self.folder, "history.json")
+
+            def on_train_begin(self, logs = None):
+
+                Path(self.folder).mkdir(parents=True, exist_ok=True)
+
+                self.history = {}
+                self.epochs = []
+                self.rows = []
+                self.global_step = 0
+                self.profiling = False
+                self.last_end = None
+
+                # Starting a new steps.csv with its header
+                with open(self.steps_path, "w", newline = "") as handle:
+                    csv.writer(handle).writerow(step_columns)
+
+            def on_epoch_begin(self, epoch, logs = None):
+
+                self.epoch = epoch
+                self.epoch_start = time.time()
+                self.epoch_steps = 0
+                self.epoch_step_time = 0.0
+
+            def on_train_batch_begin(self, batch, logs = None):
+
+                if self.profile_steps is not None and self.global_step == self.profile_steps[0]:
+                    tf.profiler.experimental.start(os.path.join(self.folder, "profile"))
+                    self.profiling = True
+
+                self.step_begin = time.time()
+
+            def on_train_batch_end(self, batch, logs = None):
+
+                end = time.time()
+                logs = logs or {}
+
+                wall = end - self.step_begin
+                self.epoch_step_time += wall
+
+                self.rows.append([
+                    self.epoch, self.global_step, wall,
+                    None if self.last_end is None else self.step_begin - self.last_end,
+                    None if self.batch_size is None or wall <= 0 else self.batch_size / wall,
+                    logs.get("loss"), logs.get("accuracy"),
+                ])
+
+                self.last_end = end
+                self.epoch_steps += 1
+                self.global_step += 1
+
+                if self.profiling and self.global_step > self.profile_steps[1]:
+                    tf.profiler.experimental.stop()
+                    self.profiling = False
+
+                if len(self.rows) >= self.flush_every:
+                    self.flush()
+
+            def on_epoch_end(self, epoch, logs = None):
+
+                logs = logs or {}
+                wall = time.time() - self.epoch_start
+                samples = None if self.batch_size is None else self.epoch_steps * self.batch_size
+
+                self.epochs.append({
+                    "epoch": epoch,
+                    "wall": wall,
+                    "steps": self.epoch_steps,
+                    "samples_per_second": None if samples is None or wall <= 0 else samples / wall,
+                    "step_time": self.epoch_step_time,
+                    "peak_rss_mb": peak_rss_mb(),
+                    "peak_gpu_mb": self.peak_gpu_mb(),
+                    **{key: float(value) for key, value in logs.items()},
+                })
+
+                for key, value in logs.items():
+                    self.history.setdefault(key, []).append(float(value))
+
+                # Writing the logs at the end of every epoch so they can be read while training runs
+                self.flush()
+
+                columns = list(dict.fromkeys(key for row in self.epochs for key in row))
+
+                def write_epochs(handle):
+                    writer = csv.DictWriter(handle, fieldnames = columns)
+                    writer.writeheader()
+                    writer.writerows(self.epochs)
+
+                write_atomic(self.epochs_path, write_epochs)
+                write_atomic(self.history_path, lambda handle: json.dump(self.history, handle, indent = 1))
+
+            def on_train_end(self, logs = None):
+
+                if self.profiling:
+                    tf.profiler.experimental.stop()
+                    self.profiling = False
+
+                self.flush()
+
+            def flush(self):
+
+                # Appending the steps recorded since the last write to steps.csv
+                if self.rows:
+
+                    with open(self.steps_path, "a", newline = "") as handle:
+                        csv.writer(handle).writerows(self.rows)
+
+                    self.rows = []
+
+            def peak_gpu_mb(self):
+
+                # Reading the peak memory of the first GPU, None when there is no GPU
+                if not tf.config.list_physical_devices("GPU"):
+                    return None
+
+                return tf.config.experimental.get_memory_info("GPU:0")["peak"] / (1024.0 * 1024.0)
+
+        training_monitor = TrainingMonitor
+
+    return training_monitor
@@ -3,10 +3,11 @@
 import os
 import numpy as np
 import pandas as pd
-import tensorflow as tf
 from pathlib import Path
-from functools import partial
 from plexflo.datastream.utils import export
+from plexflo.datastream.windows import window_dataset
+from plexflo.datastream.shards import shard_dataset
+from plexflo.datastream.callbacks import training_monitor_class
 from sklearn.model_selection import train_test_split
 
 import warnings
@@ -14,7 +15,7 @@ warnings.filterwarnings("ignore")
 
 # Defining a function to finetune the model
 
-def finetune_15min_model(model, data, shift = 30, batchsize = 64, epochs = 5, val_split = 0, model_name = None):
+def finetune_15min_model(model, data, shift = 30, batchsize = 64, epochs = 5, val_split = 0, model_name = None, shuffle = False, cache = False, seqlen = 900, jit_compile = False, plot = True, profile_steps = None):
 
     """
     Description: 
@@ -30,25 +31,22 @@ def finetune_15min_model(model, data, shift = 30, batchsize = 64, epochs = 5, va
     epochs: The number of epochs for the model (int)
     val_split: The validation split for the model (float)
     model_name: The name of the model (str)
+    shuffle: Whether the training windows are reshuffled every epoch (bool)
+    cache: Whether the gathered batches are kept in memory after the first epoch, cannot be combined with shuffle (bool)
+    seqlen: The number of samples in a window, has to match the input of the model (int)
+    jit_compile: Whether the train and eval steps are compiled with XLA (bool)
+    plot: Whether the accuracy and loss graphs are exported (bool)
+    profile_steps: The first and last training step of a TensorFlow profiler trace (tuple)
 
     Returns:
     --------
     The trained model (keras.Model)
     """    
 
-    # Defining the constants
-    seqlen = 900
-
     # Creates graphs and models folder (if it doesn't exist) whenever this method is called
     Path(os.path.join(os.getcwd(), "output", "graphs")).mkdir(parents=True, exist_ok=True)
     Path(os.path.join(os.getcwd(), "output", "models")).mkdir(parents=True, exist_ok=True)
 
-    # Function for creating the sequence data
-    def collate_pair(x, window):
-
-        # a, last sample of b
-        return x[:, 0], [x[-1,1:]]
-
     # Raise an exception if the dataframe is empty
     if data.empty:
         raise Exception("DataFrame is empty!")
@@ -85,45 +83,123 @@ def finetune_15min_model(model, data, shift = 30, batchsize = 64, epochs = 5, va
 
     # Creating the training dataset using tf.data.Dataset 
     try:
-        train_dataset = tf.data.Dataset.from_tensor_slices(train_arr)
-        train_dataset = train_dataset.window(seqlen, shift = shift, drop_remainder = True).flat_map(lambda x: x.batch(seqlen)).map(partial(collate_pair, window=seqlen))
-        train_dataset = train_dataset.batch(batchsize, drop_remainder=True).prefetch(1)
+        train_dataset = window_dataset(train_arr, seqlen, shift, batchsize, shuffle = shuffle, cache = cache)
     
     except:            
         raise Exception("Error in creating the training dataset")
 
+    # Preparing the eval dataset using tf.data.Dataset
+    eval_dataset = None
+
+    if val_split != 0:            
+        
+        try:
+            eval_dataset = window_dataset(val_arr, seqlen, shift, batchsize, cache = cache)
+
+        except:
+            raise Exception("Error in creating the validation dataset")
+
+    return fit_15min_model(model, train_dataset, eval_dataset, epochs, model_name, jit_compile, batchsize, plot, profile_steps)
+
+# Defining a function to finetune the model on sharded data
+
+def finetune_15min_model_from_shards(model, index, val_index = None, shift = 30, batchsize = 64, epochs = 5, model_name = None, shuffle_buffer = 10000, cycle_length = 4, jit_compile = False, plot = True, profile_steps = None):
+
+    """
+    Description: 
+    -----------
+    This function is used to fine-tune the model on labelled data that does not fit in memory, streamed from the shards written by shards.build_shards()
+
+    Parameters:
+    -----------
+    model: The model to be finetuned (tf.keras.models.Model)
+    index: The path of the index of the training shards (str)
+    val_index: The path of the index of the validation shards (str)
+    shift: Number of samples to shift the data (int)
+    batchsize: The batchsize of the data (int)
+    epochs: The number of epochs for the model (int)
+    model_name: The name of the model (str)
+    shuffle_buffer: The number of training windows in the shuffle buffer (int)
+    cycle_length: The number of shards read at the same time (int)
+    jit_compile: Whether the train and eval steps are compiled with XLA (bool)
+    plot: Whether the accuracy and loss graphs are exported (bool)
+    profile_steps: The first and last training step of a TensorFlow profiler trace (tuple)
+
+    Returns:
+    --------
+    The trained model (keras.Model)
+    """    
+
+    # Creates graphs and models folder (if it doesn't exist) whenever this method is called
+    Path(os.path.join(os.getcwd(), "output", "graphs")).mkdir(parents=True, exist_ok=True)
+    Path(os.path.join(os.getcwd(), "output", "models")).mkdir(parents=True, exist_ok=True)
+
+    train_dataset = shard_dataset(index, shift, batchsize, shuffle_buffer, cycle_length)
+
+    eval_dataset = None
+    if val_index is not None:
+        eval_dataset = shard_dataset(val_index, shift, batchsize, 0, cycle_length)
+
+    return fit_15min_model(model, train_dataset, eval_dataset, epochs, model_name, jit_compile, batchsize, plot, profile_steps)
+
+# Defining a function to train the model on the prepared datasets
+
+def fit_15min_model(model, train_dataset, eval_dataset = None, epochs = 5, model_name = None, jit_compile = False, batchsize = None, plot = True, profile_steps = None):
+
+    """
+    Description: 
+    -----------
+    This function is used to compile and train the model, keeping the best checkpoint.
+    The step and epoch timings, the peak memory and the history are written to output/logs/<model name> while training runs, see callbacks.training_monitor_class().
+
+    Parameters:
+    -----------
+    model: The model to be finetuned (tf.keras.models.Model)
+    train_dataset: The training dataset of (window, label) batches (tf.data.Dataset)
+    eval_dataset: The validation dataset of (window, label) batches, None trains without validation (tf.data.Dataset)
+    epochs: The number of epochs for the model (int)
+    model_name: The name of the model (str)
+    jit_compile: Whether the train and eval steps are compiled with XLA (bool)
+    batchsize: The batchsize of the data, used for the samples per second (int)
+    plot: Whether the accuracy and loss graphs are exported from the recorded history (bool)
+    profile_steps: The first and last training step of a TensorFlow profiler trace (tuple)
+
+    Returns:
+    --------
+    The trained model (keras.Model)
+    """    
+
+    # Importing TensorFlow only when a model is finetuned
+    import tensorflow as tf
+
+    # Training a private copy of a model shared through the registry, so the other Model instances keep their predictions
+    if hasattr(model, "detach"):
+        model.detach()
+
     # Compiling the model with the optimizer and loss function
-    model.model_15_min.compile(optimizer = tf.keras.optimizers.Adam(learning_rate = 0.001), loss = 'binary_crossentropy', metrics = ['accuracy'])
+    model.model_15_min.compile(optimizer = tf.keras.optimizers.Adam(learning_rate = 0.001), loss = 'binary_crossentropy', metrics = ['accuracy'], jit_compile = jit_compile)
     
     # Setting the model export name
     f = "model_15_min.h5"
     if model_name is not None:
         f = model_name
 
-    # Preparing the eval dataset using tf.data.Dataset and train the model (with eval dataset) for the given epochs
-    if val_split != 0:            
-        
-        try:
-            eval_dataset = tf.data.Dataset.from_tensor_slices(val_arr)
-            eval_dataset = eval_dataset.window(seqlen, shift = shift, drop_remainder = True).flat_map(lambda x: x.batch(seqlen)).map(partial(collate_pair, window=seqlen))
-            eval_dataset = eval_dataset.batch(batchsize, drop_remainder = True)
+    monitor = training_monitor_class()(Path(f).stem, batchsize, profile_steps)
 
-        except:
-            raise Exception("Error in creating the validation dataset")
+    # Training the model (with eval dataset) for the given epochs
+    if eval_dataset is not None:
 
         chkpt = tf.keras.callbacks.ModelCheckpoint(filepath = os.path.join(os.getcwd(), "output", "models", f), monitor = 'val_loss', save_best_only = True, mode = 'min', verbose = 1)
-        history = model.model_15_min.fit(train_dataset, epochs = epochs, validation_data = eval_dataset, verbose = 1, callbacks = [chkpt])
-
-        # Generating and exporting the graphs
-        export(history)
+        model.model_15_min.fit(train_dataset, epochs = epochs, validation_data = eval_dataset, verbose = 1, callbacks = [chkpt, monitor])
 
     # Training the model only on training dataset for the given epochs
     else:
         
         chkpt = tf.keras.callbacks.ModelCheckpoint(filepath = os.path.join(os.getcwd(), "output", "models", f), monitor = 'loss', save_best_only = True, mode = 'min', verbose = 1)
-        history = model.model_15_min.fit(train_dataset, epochs = epochs, verbose = 1, callbacks = [chkpt])
+        model.model_15_min.fit(train_dataset, epochs = epochs, verbose = 1, callbacks = [chkpt, monitor])
 
-        # Generating and exporting the graphs
-        export(history)
+    # Generating and exporting the graphs from the recorded history
+    if plot:
+        export(monitor.history_path)
 
     return model.model_15_min
\ No newline at end of file
@@ -0,0 +1,235 @@
+# Importing libraries
+
+import numpy as np
+import pandas as pd
+import multiprocessing
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor
+from plexflo.datastream import sinks
+from plexflo.datastream.model import Model
+from plexflo.datastream.inference import seqlen, binary_threshold_15_min, window_view, predict_windows, aggregate_windows
+
+import warnings
+warnings.filterwarnings("ignore")
+
+# The model loaded once by every worker process of the pool
+worker_model = None
+
+# Function to label many meters whose series are stored back to back in one array
+def label_meters(model, grid, lengths, batch_size = 256, hop = None, aggregate = "mean"):
+
+    """
+    Description:
+    -----------
+    This function is used to window every meter independently and score the windows of all meters in shared batches
+
+    Parameters:
+    -----------
+    model: The loaded model (plexflo.datastream.model.Model)
+    grid: The grid values of all meters, each meter stored contiguously (numpy.ndarray)
+    lengths: The number of samples of every meter in the order they are stored (numpy.ndarray)
+    batch_size: The number of windows sent to the model in a single call (int)
+    hop: The number of samples between overlapping windows, None scores back-to-back windows (int)
+    aggregate: How the votes of overlapping windows are combined, either "mean" or "max" (str)
+
+    Returns:
+    --------
+    labels: The 0/1 label for every sample, -1 for the samples that were not labelled (numpy.ndarray)
+    """
+
+    lengths = np.asarray(lengths, dtype = np.int64)
+    offsets = np.cumsum(lengths) - lengths
+    labels = np.full(grid.shape[0], -1, dtype = np.int8)
+
+    # Counting the windows of every meter, with the same rules as predict() for a single meter
+    if hop is None:
+        n_windows = np.maximum(lengths - 1, 0) // seqlen
+        step = seqlen
+    else:
+        n_windows = np.where(lengths >= seqlen, (lengths - seqlen) // hop + 1, 0)
+        step = hop
+
+    # Finding the start of every window in the shared array
+    meter = np.repeat(np.arange(lengths.shape[0]), n_windows)
+    local = np.arange(meter.shape[0]) - np.repeat(np.cumsum(n_windows) - n_windows, n_windows)
+    starts = offsets[meter] + local * step
+
+    # Adding a window aligned to the end of every meter so that its trailing samples are labelled as well
+    if hop is not None:
+        tails = (lengths >= seqlen) & ((lengths - seqlen) % hop != 0)
+        starts = np.sort(np.concatenate((starts, offsets[tails] + lengths[tails] - seqlen)))
+
+    if starts.shape[0] == 0:
+        return labels
+
+    # Scoring the windows of all meters together, only one batch of windows is copied at a time
+    view = window_view(grid, 1)
+    outputs = np.empty(starts.shape[0], dtype = np.float32)
+
+    for start in range(0, starts.shape[0], batch_size):
+        outputs[start:start + batch_size] = predict_windows(model, view[starts[start:start + batch_size]], batch_size)
+
+    votes = (outputs > binary_threshold_15_min).astype(np.int8)
+
+    # Writing the labels back to the rows of their meter
+    if hop is None:
+        labels[(starts[:, None] + np.arange(seqlen)).reshape(-1)] = np.repeat(votes, seqlen)
+
+        # The last scored window of every meter also covers the first row after it, like predict()
+        last = np.cumsum(n_windows)[n_windows > 0] - 1
+        labels[starts[last] + seqlen] = votes[last]
+
+    else:
+        covered = np.repeat(lengths >= seqlen, lengths)
+        labels[covered] = aggregate_windows(votes, starts, grid.shape[0], aggregate)[covered]
+
+    return labels
+
+# Function to load the model once in every worker process
+def load_worker_model(model_path):
+
+    """
+    Description:
+    -----------
+    This function is used as the initializer of the worker processes to load the model once per process
+
+    Parameters:
+    -----------
+    model_path: The path of the fine-tuned model, None loads the default model (str)
+
+    Returns:
+    --------
+    None
+    """
+
+    global worker_model
+
+    worker_model = Model(model_path)
+
+# Function to label a shard of meters inside a worker process
+def label_shard(grid, lengths, batch_size, hop, aggregate):
+
+    """
+    Description:
+    -----------
+    This function is used to label a shard of meters with the model loaded by the worker process
+
+    Parameters:
+    -----------
+    grid: The grid values of the meters in the shard (numpy.ndarray)
+    lengths: The number of samples of every meter in the shard (numpy.ndarray)
+    batch_size: The number of windows sent to the model in a single call (int)
+    hop: The number of samples between overlapping windows, None scores back-to-back windows (int)
+    aggregate: How the votes of overlapping windows are combined, either "mean" or "max" (str)
+
+    Returns:
+    --------
+    labels: The 0/1 label for every sample, -1 for the samples that were not labelled (numpy.ndarray)
+    """
+
+    return label_meters(worker_model, grid, lengths, batch_size, hop, aggregate)
+
+# Function to generate predictions for many meters stored in long format
+def predict_fleet(model, data, meter_column = "meter_id", out_fname = None, batch_size = 256, hop = None, aggregate = "mean", processes = None, model_path = None, sink = "csv", background = False):
+
+    """
+    Description:
+    -----------
+    This function is used to predict the EV values for many meters stored in a single long-format dataframe.
+    Every meter is windowed independently, in the order its rows appear, and the windows of many meters share model batches.
+
+    Parameters:
+    -----------
+    model: The loaded model, can be None when processes is set (plexflo.datastream.model.Model)
+    data: The dataframe with a meter id column and a grid column (pandas.DataFrame)
+    meter_column: The name of the column holding the meter id (str)
+    out_fname: The file path for the exported dataframe (str)
+    batch_size: The number of windows sent to the model in a single call (int)
+    hop: The number of samples between overlapping windows, None scores back-to-back windows (int)
+    aggregate: How the votes of overlapping windows are combined, either "mean" or "max" (str)
+    processes: The number of worker processes the meters are sharded across, None runs in this process (int)
+    model_path: The path of the fine-tuned model loaded by every worker process, None loads the default model (str)
+    sink: How the predictions are exported, one of "none", "csv", "parquet", "arrow" or "npy" (str)
+    background: Whether the file is written on a background thread, see sinks.export (bool)
+
+    Returns:
+    --------
+    data: The dataframe with the predictions, EV is 1/0 and -1 for the rows that were not labelled (pandas.DataFrame)
+    """
+
+    # Raise an exception if the sink is not supported before any prediction is made
+    sinks.check_sink(sink)
+
+    # Raise an exception if the dataframe is empty
+    if data.empty:
+        raise Exception("DataFrame is empty!")
+
+    # Converting column names to lower case internally for validation purposes
+    data.columns = map(str.lower, data.columns)
+    meter_column = meter_column.lower()
+
+    # Raise an exception if the columns grid and meter id are not found
+    if 'grid' not in data.columns:
+        raise Exception("Column named 'grid' not found in the dataframe!")
+
+    if meter_column not in data.columns:
+        raise Exception("Column named '" + meter_column + "' not found in the dataframe!")
+
+    # Raise an exception if some rows do not belong to a meter
+    if data[meter_column].isna().any():
+        raise Exception(str(int(data[meter_column].isna().sum())) + " rows have no value in the column '" + meter_column + "', drop them or fill in their meter id")
+
+    # Handling null values in the grid column
+    if data.grid.isna().any():
+        data.grid = data.grid.fillna(0)
+
+    # Raise an exception if the column grid has data other than int and float
+    if pd.api.types.is_numeric_dtype(data.grid) == False:
+        raise Exception("Grid data must be a numeric type (integer or float)")
+
+    # Raise an exception if the hop is not a positive integer
+    if hop is not None and hop < 1:
+        raise Exception("Hop must be a positive integer")
+
+    # Raise an exception if there is no model to run in this process
+    if processes is None and model is None:
+        raise Exception("A model is required when processes is not set")
+
+    # Grouping the rows of every meter together while keeping their order
+    codes, meters = pd.factorize(data[meter_column], sort = False)
+    order = np.argsort(codes, kind = "stable")
+    lengths = np.bincount(codes, minlength = meters.shape[0]).astype(np.int64)
+    grid = data.grid.to_numpy(dtype = np.float32)[order]
+
+    print("Predicting 15 min EV values for " + str(meters.shape[0]) + " meters")
+
+    if (lengths < seqlen).any():
+        print(str(int((lengths < seqlen).sum())) + " meters have fewer than " + str(seqlen) + " samples and are not labelled")
+
+    if processes is None:
+        labels = label_meters(model, grid, lengths, batch_size, hop, aggregate)
+
+    else:
+
+        # Cutting the meters into shards with roughly the same number of rows, a few per process to balance the load
+        n_shards = min(processes * 4, lengths.shape[0])
+        ends = np.cumsum(lengths)
+        bounds = np.unique(np.concatenate(([0], np.searchsorted(ends, ends[-1] * np.arange(1, n_shards + 1) / n_shards, side = "left") + 1)))
+        rows = np.concatenate(([0], ends))[bounds]
+
+        grids = [grid[rows[i]:rows[i + 1]] for i in range(bounds.shape[0] - 1)]
+        shard_lengths = [lengths[bounds[i]:bounds[i + 1]] for i in range(bounds.shape[0] - 1)]
+
+        # Spawning the workers so that every process loads its own copy of the model once
+        with ProcessPoolExecutor(max_workers = processes, mp_context = multiprocessing.get_context("spawn"), initializer = load_worker_model, initargs = (model_path,)) as executor:
+            labels = np.concatenate(list(executor.map(label_shard, grids, shard_lengths, repeat(batch_size), repeat(hop), repeat(aggregate))))
+
+    # Writing the labels back to the original rows
+    ev = np.empty(data.shape[0], dtype = np.int8)
+    ev[order] = labels
+    data['EV'] = ev
+
+    # Exporting the dataframe with the predictions column
+    sinks.export(data, sink, out_fname, background, name = "fleet_predictions_15_min")
+
+    return data
@@ -1,15 +1,121 @@
 # Import libraries
 
-import os
 import numpy as np
 import pandas as pd
-import tensorflow as tf
+from openpyxl import load_workbook
+from plexflo.datastream import sinks, ingest
 
 import warnings
 warnings.filterwarnings("ignore")
 
+# Defining the constants required for generating the predictions
+seqlen = 900
+binary_threshold_15_min = 0.10
+
+# Function to cut a series into fixed length windows without copying it
+def window_view(grid, hop = seqlen):
+
+    """
+    Description:
+    -----------
+    This function is used to cut a series into windows of seqlen samples as a zero-copy strided view
+
+    Parameters:
+    -----------
+    grid: The series to be windowed (numpy.ndarray)
+    hop: The number of samples between the starts of successive windows (int)
+
+    Returns:
+    --------
+    windows: The read-only view of the windows with shape (n_windows, seqlen) (numpy.ndarray)
+    """
+
+    return np.lib.stride_tricks.sliding_window_view(grid, seqlen)[::hop]
+
+# Function to score a stack of windows in batches
+def predict_windows(model, windows, batch_size = 256, index = None):
+
+    """
+    Description:
+    -----------
+    This function is used to generate the raw model outputs for a stack of windows, batch_size windows per model call
+
+    Parameters:
+    -----------
+    model: The loaded model or inference backend (plexflo.datastream.model.Model)
+    windows: The windows to be predicted with shape (n_windows, seqlen) (numpy.ndarray)
+    batch_size: The number of windows sent to the model in a single call (int)
+    index: The positions of the windows to be predicted, None predicts every window. Only one batch of windows is copied at a time (numpy.ndarray)
+
+    Returns:
+    --------
+    outputs: The model output for every predicted window (numpy.ndarray)
+    """
+
+    if batch_size < 1:
+        raise Exception("Batch size must be a positive integer")
+
+    n_windows = windows.shape[0] if index is None else index.shape[0]
+    outputs = np.empty(n_windows, dtype = np.float32)
+
+    # Sending the windows through the model one batch at a time
+    for start in range(0, n_windows, batch_size):
+
+        batch = windows[start:start + batch_size] if index is None else windows[index[start:start + batch_size]]
+        outputs[start:start + batch.shape[0]] = np.reshape(np.asarray(model.model_15_min(np.reshape(batch, (batch.shape[0], 1, seqlen)), training = False)), -1)
+
+    return outputs
+
+# Function to combine the votes of overlapping windows into per-sample labels
+def aggregate_windows(votes, starts, n_samples, aggregate = "mean"):
+
+    """
+    Description:
+    -----------
+    This function is used to combine the 0/1 votes of overlapping windows into a label for every sample they cover
+
+    Parameters:
+    -----------
+    votes: The 0/1 vote of every window (numpy.ndarray)
+    starts: The sorted start index of every window (numpy.ndarray)
+    n_samples: The number of samples in the series (int)
+    aggregate: "mean" labels a sample as EV when at least half of its windows vote EV, "max" when any of them does (str)
+
+    Returns:
+    --------
+    labels: The 0/1 label for every sample, -1 for the samples not covered by any window (numpy.ndarray)
+    """
+
+    if aggregate not in ("mean", "max"):
+        raise Exception("Aggregate must be either 'mean' or 'max'")
+
+    # Finding the first and the last window covering every sample, the covering windows are always consecutive
+    samples = np.arange(n_samples)
+    first = np.searchsorted(starts, samples - seqlen + 1, side = "left")
+    last = np.searchsorted(starts, samples, side = "right") - 1
+    covered = last >= first
+
+    first, last = first[covered], last[covered]
+    labels = np.full(n_samples, -1, dtype = np.int8)
+
+    if aggregate == "mean":
+
+        # Counting the EV votes of the covering windows with a cumulative sum
+        cumulative = np.concatenate(([0], np.cumsum(votes, dtype = np.int64)))
+        labels[covered] = 2 * (cumulative[last + 1] - cumulative[first]) >= (last - first + 1)
+
+    else:
+
+        # Taking the maximum over the covering windows, one step per window overlapping a sample
+        label = votes[first]
+        for offset in range(1, int((last - first).max(initial = 0)) + 1):
+            label = np.maximum(label, votes[np.minimum(first + offset, last)])
+        labels[covered] = label
+
+    return labels
+
 # Function to generate predictions for a given file path
-def predict_from_file(model, file, out_fname = None):
+def predict_from_file(model, file, out_fname = None, batch_size = 256, hop = None, aggregate = "mean", chunksize = None, sink = "csv", background = False, columns = None, cache = None):
 
     """
     Description:
@@ -21,29 +127,248 @@ def predict_from_file(model, file, out_fname = None):
     model: The model to be finetuned (tf.keras.models.Model)
     file: The file path to be predicted (str)
     out_fname: The file path for the exported dataframe (str)
+    batch_size: The number of windows sent to the model in a single call (int)
+    hop: The number of samples between overlapping windows, None scores back-to-back windows (int)
+    aggregate: How the votes of overlapping windows are combined, either "mean" or "max" (str)
+    chunksize: The number of rows read at a time, None reads the whole file at once (int)
+    sink: How the predictions are exported, one of "none", "csv", "parquet", "arrow" or "npy" (str)
+    background: Whether the file is written on a background thread, see sinks.export. Not supported with chunksize, as every chunk is written once it is predicted (bool)
+    columns: The columns to be read besides grid, None reads every column (list)
+    cache: None, "parquet" or "npy" to read the file through a cached sidecar, see ingest.read (str)
 
     Returns:
     --------
-    data: The dataframe with the predictions (pandas.DataFrame)
+    data: The dataframe with the predictions, or the path of the exported file when chunksize is set (pandas.DataFrame or str)
     """
 
-    # Reading the data from the file only if the extension is .csv
+    # Streaming the file chunk by chunk so that the memory use does not grow with the file size
+    if chunksize is not None:
+
+        if hop is not None:
+            raise Exception("Chunked prediction only supports back-to-back windows (hop = None)")
+
+        # Raise an exception if a background write is requested, the chunks are written as they are predicted
+        if background:
+            raise Exception("Chunked prediction writes every chunk as it is predicted and does not support background = True")
+
+        return predict_chunks(model, read_chunks(file, chunksize, columns), out_fname, batch_size, sink)
+
+    # Reading only the requested columns of the file, or its cached sidecar
+    data = ingest.read(file, columns, cache)
+
+    # Calling the predict function to generate the predictions
+    return predict(model, data, out_fname, batch_size, hop, aggregate, sink, background)
+
+# Function to read a file in chunks of rows
+def read_chunks(file, chunksize, columns = None):
+
+    """
+    Description:
+    -----------
+    This function is used to read a csv, excel or npy file as consecutive dataframes of at most chunksize rows
+
+    Parameters:
+    -----------
+    file: The file path to be read (str)
+    chunksize: The number of rows in every chunk (int)
+    columns: The columns to be read besides grid, None reads every column (list)
+
+    Returns:
+    --------
+    chunks: The generator of chunks with a continuous row index (generator of pandas.DataFrame)
+    """
+
+    if chunksize < 1:
+        raise Exception("Chunk size must be a positive integer")
+
     if file.endswith(".csv"):
-        data = pd.read_csv(file)
+        return pd.read_csv(file, chunksize = chunksize, **ingest.csv_options(file, columns))
 
-        # Calling the predict function to generate the predictions
-        return predict(model, data, out_fname)
-    
     elif file.endswith(".xlsx"):
-        data = pd.read_excel(file)
+        return read_excel_chunks(file, chunksize, columns)
+
+    elif file.endswith(".npy"):
+        return read_npy_chunks(file, chunksize)
 
-        # Calling the predict function to generate the predictions
-        return predict(model, data, out_fname)
     else:
-        raise Exception("File extension not supported! File must be either in csv or excel format")
+        raise Exception("File extension not supported! File must be either in csv, excel or npy format")
+
+# Function to read the first sheet of an excel file in chunks of rows
+def read_excel_chunks(file, chunksize, columns = None):
+
+    """
+    Description:
+    -----------
+    This function is used to read the first sheet of an excel file row by row in read-only mode and yield it in chunks
+
+    Parameters:
+    -----------
+    file: The file path to be read (str)
+    chunksize: The number of rows in every chunk (int)
+    columns: The columns to be read besides grid, None reads every column (list)
+
+    Returns:
+    --------
+    chunks: The generator of chunks with a continuous row index (generator of pandas.DataFrame)
+    """
+
+    workbook = load_workbook(file, read_only = True, data_only = True)
+
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only = True)
+        header = next(rows, None)
+
+        if header is None:
+            return
+
+        # Keeping only the requested columns
+        usecols = ingest.resolve_columns(header, columns)
+        keep = [index for index, name in enumerate(header) if str(name) in usecols]
+        header = [header[index] for index in keep]
+        dtype = {name: np.float32 for name in header if str(name).lower() == 'grid'}
+
+        start = 0
+        buffer = []
+
+        for row in rows:
+
+            buffer.append([row[index] for index in keep])
+
+            if len(buffer) == chunksize:
+                yield pd.DataFrame(buffer, columns = header, index = pd.RangeIndex(start, start + len(buffer))).astype(dtype)
+                start += len(buffer)
+                buffer = []
+
+        if buffer:
+            yield pd.DataFrame(buffer, columns = header, index = pd.RangeIndex(start, start + len(buffer))).astype(dtype)
+
+    finally:
+        workbook.close()
+
+# Function to read a npy file of grid values in chunks of rows
+def read_npy_chunks(file, chunksize):
+
+    """
+    Description:
+    -----------
+    This function is used to memory-map a npy file of grid values and yield it in chunks, only the current chunk is read from disk
+
+    Parameters:
+    -----------
+    file: The file path to be read (str)
+    chunksize: The number of rows in every chunk (int)
+
+    Returns:
+    --------
+    chunks: The generator of chunks with a continuous row index (generator of pandas.DataFrame)
+    """
+
+    grid = ingest.read_source(file).grid.to_numpy()
+
+    for start in range(0, grid.shape[0], chunksize):
+        yield pd.DataFrame({'grid': np.array(grid[start:start + chunksize])}, index = pd.RangeIndex(start, min(start + chunksize, grid.shape[0])))
+
+# Function to generate predictions for a stream of dataframe chunks
+def predict_chunks(model, chunks, out_fname = None, batch_size = 256, sink = "csv"):
+
+    """
+    Description:
+    -----------
+    This function is used to predict the EV values chunk by chunk and append every finished chunk to the exported file.
+    The rows after the last complete window are carried over into the next chunk, so the output matches predict().
+
+    Parameters:
+    -----------
+    model: The loaded model (plexflo.datastream.model.Model)
+    chunks: The consecutive chunks of the data to be predicted (iterable of pandas.DataFrame)
+    out_fname: The file path for the exported dataframe (str)
+    batch_size: The number of windows sent to the model in a single call (int)
+    sink: How the predictions are exported, one of "none", "csv", "parquet", "arrow" or "npy" (str)
+
+    Returns:
+    --------
+    f: The path of the exported file, None for the "none" sink (str)
+    """
+
+    sinks.check_sink(sink)
+
+    f = None
+    if sink != "none":
+        f = sinks.output_path(sink, out_fname)
+
+    writer = sinks.ChunkWriter(sink, f)
+
+    carry = None
+    label = None
+    n_rows = 0
+
+    print("Predicting 15 min EV values in chunks")
+
+    try:
+
+        for chunk in chunks:
+
+            # Converting column names to lower case internally for validation purposes
+            chunk.columns = map(str.lower, chunk.columns)
+
+            # Raise an exception if the column grid is not found
+            if 'grid' not in chunk.columns:
+                raise Exception("Column named 'grid' not found in the dataframe!")
+
+            # Handling null values in the grid column
+            if chunk.grid.isna().any():
+                chunk.grid = chunk.grid.fillna(0)
+
+            # Raise an exception if the column grid has data other than int and float
+            if pd.api.types.is_numeric_dtype(chunk.grid) == False:
+                raise Exception("Grid data must be a numeric type (integer or float)")
+
+            n_rows += chunk.shape[0]
+
+            # Prepending the unfinished rows of the previous chunk
+            if carry is not None:
+                chunk = pd.concat([carry, chunk])
+
+            # A window is only scored once at least one row after it has been read, exactly like predict()
+            n_windows = (chunk.shape[0] - 1) // seqlen
+
+            # Carrying the rows on until a full window and the row after it are buffered, an empty chunk leaves nothing to score
+            if n_windows <= 0:
+                carry = chunk
+                continue
+
+            outputs = predict_windows(model, window_view(chunk.grid.to_numpy(dtype = np.float32)[:n_windows * seqlen]), batch_size)
+            labels = (outputs > binary_threshold_15_min).astype(np.int8)
+
+            # Appending the labelled rows to the exported file
+            writer.write(chunk.iloc[:n_windows * seqlen].assign(EV = np.repeat(labels, seqlen)))
+
+            carry = chunk.iloc[n_windows * seqlen:]
+            label = labels[-1]
+
+        # Raise an exception if the file is empty
+        if n_rows == 0:
+            raise Exception("DataFrame is empty!")
+
+        # Raise an exception if there are not enough samples in the file
+        if n_rows < seqlen:
+            raise Exception("Data too short for 15 minute prediction")
+
+        # Exporting the remaining rows, the first of them is covered by the last scored window
+        ev = np.full(carry.shape[0], -1, dtype = np.int8)
+
+        if label is not None:
+            ev[0] = label
+
+        writer.write(carry.assign(EV = ev))
+
+    finally:
+        writer.close()
+
+    return f
 
 # Function to generate predictions for a given dataframe
-def predict(model, data, out_fname = None):
+def predict(model, data, out_fname = None, batch_size = 256, hop = None, aggregate = "mean", sink = "csv", background = False, max_missing = None):
 
     """
     Description:
@@ -55,13 +380,20 @@ def predict(model, data, out_fname = None):
     model: The model to be finetuned (tf.keras.models.Model)
     data: The dataframe to be predicted (pandas.DataFrame)
     out_fname: The file path for the exported dataframe (str)
+    batch_size: The number of windows sent to the model in a single call (int)
+    hop: The number of samples between overlapping windows, None scores back-to-back windows (int)
+    aggregate: How the votes of overlapping windows are combined, either "mean" or "max" (str)
+    sink: How the predictions are exported, one of "none", "csv", "parquet", "arrow" or "npy" (str)
+    background: Whether the file is written on a background thread, see sinks.export (bool)
+    max_missing: The largest share of gap-filled samples in a scored window, the other windows are skipped. Needs the gap column added by align.align (float)
 
     Returns:
     --------
-    data: The dataframe with the predictions (pandas.DataFrame)
+    data: The dataframe with the predictions, EV is 1/0 and -1 for the rows that were not labelled (pandas.DataFrame)
     """
 
-    binary_threshold_15_min = 0.10
+    # Raise an exception if the sink is not supported before any prediction is made
+    sinks.check_sink(sink)
 
     # Raise an exception if the dataframe is empty
     if data.empty:
@@ -86,53 +418,63 @@ def predict(model, data, out_fname = None):
     if data.shape[0] < 900:
         raise Exception("Data too short for 15 minute prediction")
 
-    # Internal function to output the EV 0/1 values given the sequence data
-    def predict_loop(infer_data):
+    # Raise an exception if the hop is not a positive integer
+    if hop is not None and hop < 1:
+        raise Exception("Hop must be a positive integer")
 
-        """
-        Description:
-        -----------
-        This function is used to predict the EV values for a given sequence data
+    # Raise an exception if windows have to be skipped but the gaps are not marked
+    if max_missing is not None and 'gap' not in data.columns:
+        raise Exception("Column named 'gap' not found in the dataframe! Align the data with align.align first")
 
-        Parameters:
-        -----------
-        infer_data: The sequence data to be predicted (numpy.ndarray)
+    grid = data.grid.to_numpy(dtype = np.float32)
 
-        Returns:
-        --------
-        EV: The EV value 0/1 for the sequence data (float)
-        """
+    if hop is not None:
 
-        # Reshaping the data to be compatible with the model and predicting the EV values
-        outputs = model.model_15_min(tf.reshape(infer_data, shape = (1, 1, 900)), training = False).numpy()[0]
-        
-        # Converting the EV values to 0/1 based on the threshold
-        EV = 0
-        if outputs > binary_threshold_15_min:
-            EV = 1
+        print("Predicting 15 min EV values with a hop of " + str(hop) + " samples")
 
-        return EV
+        # Starting overlapping windows every hop samples, with a window aligned to the end of the data so that the trailing samples are labelled as well
+        starts = np.arange(0, data.shape[0] - seqlen + 1, hop)
 
-    # Creating a new column for the EV values
-    data['EV'] = " "
+        if starts[-1] != data.shape[0] - seqlen:
+            starts = np.append(starts, data.shape[0] - seqlen)
 
-    print("Predicting 15 min EV values")
+    else:
 
-    # Looping through the dataframe and generating the EV values
-    for i, r in data.iterrows():
+        print("Predicting 15 min EV values")
 
-       
-        if i % 900 == 0 and i != 0:
-                val = predict_loop(data.iloc[i-900:i]['grid'].to_list())
-                data.loc[i-900:i, ["EV"]] = val
+        # Only the complete windows ending before the last row are scored, each label also covers the first row of the next window
+        n_windows = (data.shape[0] - 1) // seqlen
+        starts = np.arange(n_windows) * seqlen
 
-    # Exporting the dataframe with the predictions column to a csv file
-    f = "predictions_" + str(15) + "_min.csv"
+    # Skipping the windows holding too many gap-filled samples
+    if max_missing is not None:
+        missing = np.concatenate(([0], np.cumsum(data.gap.to_numpy(dtype = np.int64))))
+        starts = starts[missing[starts + seqlen] - missing[starts] <= max_missing * seqlen]
 
-    if out_fname is not None:
-        f = out_fname
+    # Generating the EV values of the windows in batches and converting them to 0/1 based on the threshold
+    outputs = predict_windows(model, window_view(grid, 1), batch_size, starts)
+    votes = (outputs > binary_threshold_15_min).astype(np.int8)
 
-    # Exporting the dataframe to a csv file
-    data.to_csv(os.path.join(os.getcwd(), "output", "files", f))
-    
-    return data
\ No newline at end of file
+    if hop is not None:
+
+        # Labelling every sample from the windows covering it
+        data['EV'] = aggregate_windows(votes, starts, data.shape[0], aggregate)
+
+    else:
+
+        # Writing the EV value of every window to all of its rows, the skipped windows stay -1
+        labels = np.full(n_windows, -1, dtype = np.int8)
+        labels[starts // seqlen] = votes
+
+        ev = np.full(data.shape[0], -1, dtype = np.int8)
+
+        if n_windows > 0:
+            ev[:n_windows * seqlen] = np.repeat(labels, seqlen)
+            ev[n_windows * seqlen] = labels[-1]
+
+        data['EV'] = ev
+
+    # Exporting the dataframe with the predictions column
+    sinks.export(data, sink, out_fname, background)
+
+    return data
@@ -0,0 +1,259 @@
+# Importing libraries
+
+import os
+import hashlib
+import datetime
+import importlib.util
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+# Function to find the columns of a file that have to be read
+def resolve_columns(names, columns = None):
+
+    """
+    Description:
+    -----------
+    This function is used to match the requested columns against the columns of a file, ignoring the case
+
+    Parameters:
+    -----------
+    names: The columns of the file (list)
+    columns: The columns to be read, None reads every column (list)
+
+    Returns:
+    --------
+    usecols: The matching columns with the case used in the file (list)
+    """
+
+    names = [str(name) for name in names]
+
+    # Raise an exception if the column grid is not found
+    if 'grid' not in map(str.lower, names):
+        raise Exception("Column named 'grid' not found in the dataframe!")
+
+    if columns is None:
+        return names
+
+    wanted = set(map(str.lower, columns)) | {'grid'}
+
+    return [name for name in names if name.lower() in wanted]
+
+# Function to build the pandas options for reading the selected columns of a csv file
+def csv_options(file, columns = None):
+
+    """
+    Description:
+    -----------
+    This function is used to read the header of a csv file and build the usecols and dtype options that prune the columns and read grid as float32
+
+    Parameters:
+    -----------
+    file: The file path to be read (str)
+    columns: The columns to be read, None reads every column (list)
+
+    Returns:
+    --------
+    options: The keyword arguments for pandas.read_csv (dict)
+    """
+
+    usecols = resolve_columns(pd.read_csv(file, nrows = 0).columns, columns)
+
+    return {"usecols": usecols, "dtype": {name: np.float32 for name in usecols if name.lower() == 'grid'}}
+
+# Function to check whether a parser turned a column into dates or times
+def is_temporal(column):
+
+    """
+    Description:
+    -----------
+    This function is used to check whether a column was parsed into timestamps, dates or times rather than kept as text
+
+    Parameters:
+    -----------
+    column: The column of a dataframe (pandas.Series)
+
+    Returns:
+    --------
+    temporal: Whether the column holds dates or times (bool)
+    """
+
+    if pd.api.types.is_datetime64_any_dtype(column):
+        return True
+
+    if column.dtype != object:
+        return False
+
+    values = column.dropna()
+
+    return not values.empty and isinstance(values.iloc[0], (datetime.date, datetime.time))
+
+# Function to read a source file with the fastest available parser
+def read_source(file, columns = None):
+
+    """
+    Description:
+    -----------
+    This function is used to read a csv, excel, parquet or npy file, only reading the requested columns.
+    Csv files are parsed with the pyarrow engine and excel files with calamine when they are installed. Npy files hold the grid values and are memory-mapped.
+
+    Parameters:
+    -----------
+    file: The file path to be read (str)
+    columns: The columns to be read, None reads every column (list)
+
+    Returns:
+    --------
+    data: The dataframe read from the file (pandas.DataFrame)
+    """
+
+    if file.endswith(".csv"):
+
+        options = csv_options(file, columns)
+
+        if importlib.util.find_spec("pyarrow") is not None:
+            options["engine"] = "pyarrow"
+
+        try:
+            data = pd.read_csv(file, **options)
+
+        # Telling a grid column that is not numeric apart from a file that cannot be parsed, by reading it again without the float32 dtype
+        except ValueError as e:
+            pd.read_csv(file, **dict(options, dtype = None))
+            raise Exception("Grid data must be a numeric type (integer or float)") from e
+
+        # The pyarrow engine parses dates and times that the c engine keeps as text, so those columns are read again as text
+        temporal = [name for name in data.columns if str(name).lower() != 'grid' and is_temporal(data[name])]
+
+        if temporal:
+            data[temporal] = pd.read_csv(file, usecols = temporal, dtype = object)[temporal]
+
+        return data
+
+    elif file.endswith(".xlsx"):
+
+        options = {}
+        if importlib.util.find_spec("python_calamine") is not None:
+            options["engine"] = "calamine"
+
+        wanted = None if columns is None else set(map(str.lower, columns)) | {'grid'}
+
+        data = pd.read_excel(file, usecols = None if wanted is None else lambda name: str(name).lower() in wanted, **options)
+
+        # Raise an exception if the column grid is not found, otherwise cast it to float32 like the other formats
+        grid = resolve_columns(data.columns, ['grid'])[0]
+
+        # Raise an exception if the column grid could not be parsed as float32
+        try:
+            data[grid] = data[grid].astype(np.float32)
+        except (ValueError, TypeError) as e:
+            raise Exception("Grid data must be a numeric type (integer or float)") from e
+
+        return data
+
+    elif file.endswith(".parquet"):
+
+        import pyarrow.parquet as pq
+
+        return pd.read_parquet(file, columns = resolve_columns(pq.read_schema(file).names, columns))
+
+    elif file.endswith(".npy"):
+
+        grid = np.load(file, mmap_mode = "r")
+
+        # Raise an exception if the array does not hold a single series
+        if grid.ndim != 1:
+            raise Exception("Npy files must hold a one dimensional array of grid values")
+
+        return pd.DataFrame({'grid': grid}, copy = False)
+
+    raise Exception("File extension not supported! File must be either in csv, excel, parquet or npy format")
+
+# Function to build the path of the sidecar of a source file
+def sidecar_path(file, columns = None, cache = "parquet"):
+
+    """
+    Description:
+    -----------
+    This function is used to build the path of the cached sidecar of a source file, keyed by its path, size, modification time and the columns read
+
+    Parameters:
+    -----------
+    file: The file path of the source file (str)
+    columns: The columns to be read, None reads every column (list)
+    cache: The sidecar format, either "parquet" or "npy" (str)
+
+    Returns:
+    --------
+    f: The path of the sidecar inside output/cache (str)
+    """
+
+    stat = os.stat(file)
+
+    # The npy sidecar only holds the grid column
+    if cache == "npy":
+        columns = ['grid']
+
+    key = "|".join([os.path.realpath(file), str(stat.st_size), str(stat.st_mtime_ns), ",".join(sorted(map(str.lower, columns or [])))])
+    key = hashlib.sha1(key.encode()).hexdigest()[:16]
+
+    return os.path.join(os.getcwd(), "output", "cache", Path(file).stem + "_" + key + "." + cache)
+
+# Function to read a file, through the cached sidecar when requested
+def read(file, columns = None, cache = None):
+
+    """
+    Description:
+    -----------
+    This function is used to read a source file. With cache set, the parsed columns are written to a sidecar the first time
+    the file is read and later reads of the unchanged file load the sidecar instead of parsing the file again.
+
+    Parameters:
+    -----------
+    file: The file path to be read (str)
+    columns: The columns to be read, None reads every column (list)
+    cache: None, "parquet" or "npy". The npy sidecar only keeps the grid column and is memory-mapped when read (str)
+
+    Returns:
+    --------
+    data: The dataframe read from the file or its sidecar (pandas.DataFrame)
+    """
+
+    if cache is None:
+        return read_source(file, columns)
+
+    # Raise an exception if the cache format is not supported
+    if cache not in ("parquet", "npy"):
+        raise Exception("Cache must be either None, 'parquet' or 'npy'")
+
+    if cache == "parquet" and importlib.util.find_spec("pyarrow") is None:
+        raise Exception("The parquet cache requires pyarrow to be installed")
+
+    f = sidecar_path(file, columns, cache)
+
+    # Loading the sidecar written by an earlier read of the same file
+    if os.path.exists(f):
+        return read_source(f)
+
+    data = read_source(file, columns if cache == "parquet" else ['grid'])
+
+    # Writing the sidecar to a temporary file first so that a crash never leaves a partial sidecar behind
+    Path(os.path.dirname(f)).mkdir(parents=True, exist_ok=True)
+    tmp = f + ".tmp"
+
+    if cache == "parquet":
+        data.to_parquet(tmp, index = False)
+
+    else:
+        grid = [name for name in data.columns if str(name).lower() == 'grid'][0]
+
+        with open(tmp, "wb") as handle:
+            np.save(handle, data[grid].to_numpy(dtype = np.float32))
+
+    os.replace(tmp, f)
+
+    # Reading the npy sidecar back so that the grid column is memory-mapped
+    if cache == "npy":
+        return read_source(f)
+
+    return data
@@ -1,60 +1,126 @@
 # Importing libraries
 
 import os
-import tensorflow as tf
 from pathlib import Path
+from plexflo.datastream import registry
 
 import warnings
 warnings.filterwarnings("ignore")
 
 # Defining the constansts required for loading the model
-batchsize = 64
 seqlen = 900
 
-# Defining a class for the loading the Custom model. This is a templatized class taken from TensorFlow's guide: https://www.tensorflow.org/guide/keras/save_and_serialize#custom_objects
-class CustomModel(tf.keras.Model):    
+# The custom model class, only built the first time a model is loaded so that importing this module does not import TensorFlow
+custom_model = None
 
-    def train_step(self, data):
+# Function to build the custom model class
+def custom_model_class():
+
+    """
+    Description:
+    -----------
+    This function is used to import TensorFlow and build the custom model class the first time it is needed
+
+    Parameters:
+    -----------
+    None
+
+    Returns:
+    --------
+    CustomModel: The custom model class (tf.keras.Model)
+    """
+
+    global custom_model
+
+    if custom_model is None:
+
+        import tensorflow as tf
+
+        # Defining a class for the loading the Custom model. This is a templatized class taken from TensorFlow's guide: https://www.tensorflow.org/guide/keras/save_and_serialize#custom_objects
+        # The steps take the batch size and window length from the data, so batches of any size can be trained and evaluated
+        class CustomModel(tf.keras.Model):    
+
+            def train_step(self, data):
         
-        x_batch_train, y_batch_train = data
+                x_batch_train, y_batch_train, _ = tf.keras.utils.unpack_x_y_sample_weight(data)
+
+                x_batch_train = tf.reshape(x_batch_train, shape = (-1, 1, tf.shape(x_batch_train)[-1]))
+                y_batch_train = tf.reshape(y_batch_train, shape = (-1, 1))
 
-        with tf.GradientTape() as tape:
+                with tf.GradientTape() as tape:
 
-            logits = self(tf.reshape(x_batch_train, shape = (batchsize, 1, seqlen)), training = True)
-            loss = self.compiled_loss(tf.reshape(y_batch_train, shape = (batchsize, 1)), logits, regularization_losses = self.losses)
+                    logits = self(x_batch_train, training = True)
+                    loss = self.compiled_loss(y_batch_train, logits, regularization_losses = self.losses)
 
-        trainable_vars = self.trainable_variables
-        gradients = tape.gradient(loss, trainable_vars)
+                trainable_vars = self.trainable_variables
+                gradients = tape.gradient(loss, trainable_vars)
 
-        self.optimizer.apply_gradients(zip(gradients, trainable_vars))
-        self.compiled_metrics.update_state(tf.reshape(y_batch_train, shape = (batchsize, 1)), logits)
+                self.optimizer.apply_gradients(zip(gradients, trainable_vars))
+                self.compiled_metrics.update_state(y_batch_train, logits)
 
-        return {m.name : m.result() for m in self.metrics}
+                return {m.name : m.result() for m in self.metrics}
 
-    def test_step(self, data):
+            def test_step(self, data):
         
-        x_batch_eval, y_batch_eval = data
+                x_batch_eval, y_batch_eval, _ = tf.keras.utils.unpack_x_y_sample_weight(data)
+
+                x_batch_eval = tf.reshape(x_batch_eval, shape = (-1, 1, tf.shape(x_batch_eval)[-1]))
+                y_batch_eval = tf.reshape(y_batch_eval, shape = (-1, 1))
+
+                # Evaluating in inference mode so that layers such as dropout behave like they do for predictions
+                logits = self(x_batch_eval, training = False)
+                loss = self.compiled_loss(y_batch_eval, logits, regularization_losses = self.losses)
+
+                self.compiled_metrics.update_state(y_batch_eval, logits)
+
+                return {m.name : m.result() for m in self.metrics}
 
-        logits = self(tf.reshape(x_batch_eval, shape = (batchsize, 1, seqlen)), training = True)
-        loss = self.compiled_loss(tf.reshape(y_batch_eval, shape = (batchsize, 1)), logits, regularization_losses = self.losses)
+        custom_model = CustomModel
 
-        self.compiled_metrics.update_state(tf.reshape(y_batch_eval, shape = (batchsize, 1)), logits)
+    return custom_model
 
-        return {m.name : m.result() for m in self.metrics}
+# Function to build the custom objects needed to load a model
+def custom_objects():
+
+    """
+    Description:
+    -----------
+    This function is used to build the custom objects of a saved model, passed to the registry uncalled so that a cached model does not import TensorFlow
+
+    Parameters:
+    -----------
+    None
+
+    Returns:
+    --------
+    custom_objects: The custom classes needed to load the model (dict)
+    """
+
+    return {"CustomModel": custom_model_class()}
+
+# Resolving the CustomModel attribute lazily for the code importing it from this module
+def __getattr__(name):
+
+    if name == "CustomModel":
+        return custom_model_class()
+
+    raise AttributeError("module " + repr(__name__) + " has no attribute " + repr(name))
 
 # Main Model Class for loading plexflo's trained models
 class Model:
 
-    def __init__(self, path=None):
+    def __init__(self, path=None, cache=True, warm_up=False):
 
         """
         Description:
         -----------
-        This class is used to load the trained model
+        This class is used to load the trained model. Models loaded from the same file are shared through the process-wide registry.
 
         Parameters:
         -----------
         path: The path to load the fine-tuned model. Has to be inside the output folder (str)
+        cache: Whether the model is shared through the registry. A shared model gets a private copy before it is finetuned, see detach() (bool)
+        warm_up: Whether a dummy batch is run through the model right after loading (bool)
 
         Returns:
         --------
@@ -67,14 +133,58 @@ class Model:
         else:
             self.path = os.path.join(os.getcwd(), 'output', 'models', path)
 
+        self.cache = cache
+
         # Loading the model with the custom model class
         try:
-            self.model_15_min = tf.keras.models.load_model(self.path, custom_objects = {"CustomModel": CustomModel})
-            print("15 Min Model loaded")
+            self.model_15_min = registry.load(self.path, custom_objects = custom_objects, cache = cache)
 
         except:
             raise Exception("15 Min Model not found")
 
+        # Running a dummy batch so that the first prediction is not slowed down by tracing
+        if warm_up:
+            self.warm_up()
+
         # Creates an output folder and a files sub-folder (if it doesn't exist) whenever this class is initialized
         Path(os.path.join(os.getcwd(), "output")).mkdir(parents=True, exist_ok=True)
-        Path(os.path.join(os.getcwd(), "output", "files")).mkdir(parents=True, exist_ok=True)
\ No newline at end of file
+        Path(os.path.join(os.getcwd(), "output", "files")).mkdir(parents=True, exist_ok=True)
+
+    def detach(self):
+
+        """
+        Description:
+        -----------
+        This function is used to replace a model shared through the registry with a private copy loaded from the same file,
+        so that compiling and training it does not change the predictions of the other Model instances of the process
+
+        Parameters:
+        -----------
+        None
+
+        Returns:
+        --------
+        None
+        """
+
+        if self.cache:
+            self.model_15_min = registry.load(self.path, custom_objects = custom_objects, cache = False)
+            self.cache = False
+
+    def warm_up(self, batch_size = 1):
+
+        """
+        Description:
+        -----------
+        This function is used to run one dummy batch through the model
+
+        Parameters:
+        -----------
+        batch_size: The number of dummy windows in the batch (int)
+
+        Returns:
+        --------
+        None
+        """
+
+        registry.warm_up(self.model_15_min, batch_size, seqlen)
\ No newline at end of file
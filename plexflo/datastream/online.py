@@ -0,0 +1,278 @@
+# Importing libraries
+
+import os
+import threading
+import numpy as np
+from pathlib import Path
+
+# Class for finetuning a running model on labelled samples as they arrive
+class OnlineTrainer:
+
+    def __init__(self, model, capacity = 10000, shift = 30, batchsize = 64, update_every = 64, steps = 1, publish_every = 10, learning_rate = 0.0001, seqlen = 900, seed = None):
+
+        """
+        Description:
+        -----------
+        This class is used to finetune a running model incrementally. Labelled samples are windowed as they arrive, like finetune_15min_model()
+        windows a dataframe, and kept in a replay buffer of the most recent windows. A background thread trains a copy of the model on
+        batches drawn from the buffer whenever enough new windows have arrived, and regularly publishes the trained weights to the model.
+
+        Publishing swaps model.model_15_min for a new copy holding the trained weights, so every call to the model sees either the old or
+        the new weights and never a mix of both. Only this Model object is updated, other Model objects sharing the file through the registry are not.
+
+        Parameters:
+        -----------
+        model: The loaded model, load it with cache = False (plexflo.datastream.model.Model)
+        capacity: The number of windows kept in the replay buffer, the oldest windows are replaced first (int)
+        shift: Number of samples between the starts of two windows (int)
+        batchsize: The number of windows in a training batch (int)
+        update_every: The number of new windows that starts a training update (int)
+        steps: The number of gradient steps of a training update (int)
+        publish_every: The number of training updates between two publishes of the weights (int)
+        learning_rate: The learning rate of the optimizer (float)
+        seqlen: The number of samples in a window (int)
+        seed: The seed used to draw the training batches (int)
+
+        Returns:
+        --------
+        None
+        """
+
+        import tensorflow as tf
+
+        self.model = model
+        self.capacity = capacity
+        self.shift = shift
+        self.batchsize = batchsize
+        self.update_every = update_every
+        self.steps = steps
+        self.publish_every = publish_every
+        self.seqlen = seqlen
+        self.rng = np.random.default_rng(seed)
+
+        # The replay buffer and the number of windows written to it so far
+        self.windows = np.zeros((capacity, seqlen), dtype = np.float32)
+        self.labels = np.zeros(capacity, dtype = np.float32)
+        self.count = 0
+
+        # The samples that have not been windowed yet, the absolute position of the first one and of the next window start
+        self.tail = np.empty((0, 2), dtype = np.float32)
+        self.offset = 0
+        self.next_start = 0
+
+        self.new_windows = 0
+        self.updates = 0
+        self.error = None
+
+        # Training a copy of the model so that the running model only ever sees published weights
+        self.trainer = tf.keras.models.clone_model(model.model_15_min)
+        self.trainer.set_weights(model.model_15_min.get_weights())
+        self.trainer.compile(optimizer = tf.keras.optimizers.Adam(learning_rate = learning_rate), loss = 'binary_crossentropy', metrics = ['accuracy'])
+
+        self.condition = threading.Condition()
+        self.stopping = False
+        self.thread = threading.Thread(target = self.run, daemon = True)
+        self.thread.start()
+
+    def add(self, grid, ground_truth):
+
+        """
+        Description:
+        -----------
+        This function is used to add labelled samples in the order they were recorded, from any thread
+
+        Parameters:
+        -----------
+        grid: The grid values of the samples (numpy.ndarray, list or float)
+        ground_truth: The ground truth of the samples (numpy.ndarray, list or float)
+
+        Returns:
+        --------
+        None
+        """
+
+        self.check()
+
+        grid = np.atleast_1d(np.asarray(grid, dtype = np.float32))
+        ground_truth = np.atleast_1d(np.asarray(ground_truth, dtype = np.float32))
+
+        # Raise an exception if the grid and ground truth values do not pair up
+        if grid.shape != ground_truth.shape or grid.ndim != 1:
+            raise Exception("Grid and ground_truth must have the same number of samples")
+
+        # Raise an exception if the column grid has NaN values
+        if np.isnan(grid).any():
+            raise Exception("Missing grid data (NaN values)")
+
+        with self.condition:
+
+            self.tail = np.concatenate((self.tail, np.stack((grid, ground_truth), axis = 1)))
+
+            # Cutting every window that now fits, with the label of its last sample
+            starts = np.arange(self.next_start - self.offset, self.tail.shape[0] - self.seqlen + 1, self.shift)
+
+            if starts.shape[0] > 0:
+                view = np.lib.stride_tricks.sliding_window_view(self.tail[:, 0], self.seqlen)
+                self.store(view[starts], self.tail[starts + self.seqlen - 1, 1])
+
+                self.next_start += starts.shape[0] * self.shift
+
+            # Dropping the samples before the next window start, they are not part of any later window
+            drop = min(self.next_start - self.offset, self.tail.shape[0])
+            self.tail = self.tail[drop:]
+            self.offset += drop
+
+            if self.new_windows >= self.update_every:
+                self.condition.notify()
+
+    def add_frame(self, data):
+
+        """
+        Description:
+        -----------
+        This function is used to add the labelled samples of a dataframe
+
+        Parameters:
+        -----------
+        data: The dataframe with the grid and ground_truth columns (pandas.DataFrame)
+
+        Returns:
+        --------
+        None
+        """
+
+        columns = {str(name).lower(): name for name in data.columns}
+
+        # Raise an exception if the column grid and ground truth is not found
+        if 'grid' not in columns or 'ground_truth' not in columns:
+            raise Exception("No grid and ground_truth columns")
+
+        self.add(data[columns['grid']].to_numpy(), data[columns['ground_truth']].to_numpy())
+
+    def store(self, windows, labels):
+
+        # Writing the windows to the replay buffer, only the last capacity windows are kept when there are more
+        windows, labels = windows[-self.capacity:], labels[-self.capacity:]
+        positions = (self.count + np.arange(windows.shape[0])) % self.capacity
+
+        self.windows[positions] = windows
+        self.labels[positions] = labels
+
+        self.count += windows.shape[0]
+        self.new_windows += windows.shape[0]
+
+    def run(self):
+
+        # Training whenever enough new windows have arrived, until the trainer is stopped
+        while True:
+
+            with self.condition:
+
+                self.condition.wait_for(lambda: self.stopping or self.new_windows >= self.update_every)
+
+                if self.stopping:
+                    return
+
+                self.new_windows = 0
+                size = min(self.count, self.capacity)
+
+                # Drawing the batches under the lock, so the buffer can be written again while the model trains
+                batches = [self.rng.integers(0, size, min(self.batchsize, size)) for _ in range(self.steps)]
+                batches = [(self.windows[i], self.labels[i][:, None, None]) for i in batches]
+
+            try:
+
+                for x, y in batches:
+                    self.trainer.train_on_batch(x, y)
+
+                self.updates += 1
+
+                if self.updates % self.publish_every == 0:
+                    self.publish()
+
+            # Keeping the error to raise it in the thread adding samples
+            except Exception as e:
+                self.error = e
+                return
+
+    def publish(self):
+
+        """
+        Description:
+        -----------
+        This function is used to publish the current weights of the trained copy to the running model
+
+        Parameters:
+        -----------
+        None
+
+        Returns:
+        --------
+        None
+        """
+
+        import tensorflow as tf
+
+        model = tf.keras.models.clone_model(self.trainer)
+        model.set_weights(self.trainer.get_weights())
+
+        # Swapping the model in a single assignment, calls already running finish with the old weights
+        self.model.model_15_min = model
+
+    def save(self, out_fname = "model_15_min_online.h5"):
+
+        """
+        Description:
+        -----------
+        This function is used to save the published model inside output/models, through a temporary file so that a crash never leaves a partial model behind
+
+        Parameters:
+        -----------
+        out_fname: The file name of the saved model (str)
+
+        Returns:
+        --------
+        f: The path of the saved model (str)
+        """
+
+        Path(os.path.join(os.getcwd(), "output", "models")).mkdir(parents=True, exist_ok=True)
+
+        f = os.path.join(os.getcwd(), "output", "models", out_fname)
+        tmp = os.path.join(os.getcwd(), "output", "models", "tmp_" + out_fname)
+
+        self.model.model_15_min.save(tmp)
+        os.replace(tmp, f)
+
+        return f
+
+    def check(self):
+
+        # Raise the error of a failed training update
+        if self.error is not None:
+            raise Exception("Online training failed: " + str(self.error))
+
+    def stop(self, publish = True):
+
+        """
+        Description:
+        -----------
+        This function is used to stop the background training, waiting for the running update to finish
+
+        Parameters:
+        -----------
+        publish: Whether the weights trained since the last publish are published (bool)
+
+        Returns:
+        --------
+        None
+        """
+
+        with self.condition:
+            self.stopping = True
+            self.condition.notify()
+
+        self.thread.join()
+        self.check()
+
+        if publish and self.updates % self.publish_every != 0:
+            self.publish()
@@ -0,0 +1,137 @@
+# Importing libraries
+
+import os
+import threading
+import numpy as np
+from collections import OrderedDict
+
+# The loaded models keyed by their resolved path and modification time, the least recently used model is first
+models = OrderedDict()
+
+# The maximum number of models kept in memory
+max_models = 4
+
+# The lock guarding the cache, so that models shared by several threads are only loaded once
+lock = threading.Lock()
+
+# Function to load a Keras model through the process-wide cache
+def load(path, custom_objects = None, cache = True):
+
+    """
+    Description:
+    -----------
+    This function is used to load a Keras model, returning the cached model when the same file was already loaded.
+    TensorFlow is only imported, and custom_objects only resolved, the first time a model is read from disk.
+
+    Parameters:
+    -----------
+    path: The path of the model file (str)
+    custom_objects: The custom classes needed to load the model, or a function returning them (dict or function)
+    cache: Whether the loaded model is shared through the cache. Models that will be finetuned should not be shared (bool)
+
+    Returns:
+    --------
+    model: The loaded model (tf.keras.Model)
+    """
+
+    path = os.path.realpath(path)
+    key = (path, os.stat(path).st_mtime_ns)
+
+    with lock:
+
+        # Returning the cached model and marking it as the most recently used
+        if cache and key in models:
+            models.move_to_end(key)
+            return models[key]
+
+        import tensorflow as tf
+
+        if callable(custom_objects):
+            custom_objects = custom_objects()
+
+        model = tf.keras.models.load_model(path, custom_objects = custom_objects)
+        print("Model loaded from: " + path)
+
+        if cache:
+
+            # Dropping the models loaded from an older version of the same file
+            for stale in [k for k in models if k[0] == path]:
+                del models[stale]
+
+            models[key] = model
+
+            # Evicting the least recently used models above the size limit
+            while len(models) > max_models:
+                models.popitem(last = False)
+
+    return model
+
+# Function to set the maximum number of cached models
+def set_max_models(n):
+
+    """
+    Description:
+    -----------
+    This function is used to set the maximum number of models kept in the cache, evicting the least recently used ones
+
+    Parameters:
+    -----------
+    n: The maximum number of cached models (int)
+
+    Returns:
+    --------
+    None
+    """
+
+    global max_models
+
+    if n < 1:
+        raise Exception("The cache must hold at least one model")
+
+    with lock:
+
+        max_models = n
+
+        while len(models) > max_models:
+            models.popitem(last = False)
+
+# Function to empty the cache
+def clear():
+
+    """
+    Description:
+    -----------
+    This function is used to remove every model from the cache
+
+    Parameters:
+    -----------
+    None
+
+    Returns:
+    --------
+    None
+    """
+
+    with lock:
+        models.clear()
+
+# Function to run a dummy batch through a model
+def warm_up(model, batch_size = 1, seqlen = 900):
+
+    """
+    Description:
+    -----------
+    This function is used to run one dummy batch through the model so that the first real prediction is not slowed down by tracing
+
+    Parameters:
+    -----------
+    model: The loaded model (tf.keras.Model)
+    batch_size: The number of dummy windows in the batch (int)
+    seqlen: The number of samples in every window (int)
+
+    Returns:
+    --------
+    None
+    """
+
+    model(np.zeros((batch_size, 1, seqlen), dtype = np.float32), training = False)
@@ -0,0 +1,193 @@
+# Importing libraries
+
+import os
+import json
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from plexflo.datastream import ingest
+
+# Function to read the grid and ground truth columns of a labelled file chunk by chunk
+def read_labelled_chunks(file, chunksize = 1000000):
+
+    """
+    Description:
+    -----------
+    This function is used to read the grid and ground truth columns of a labelled csv, parquet or excel file in chunks of rows
+
+    Parameters:
+    -----------
+    file: The file path to be read (str)
+    chunksize: The number of rows read at a time from csv and parquet files (int)
+
+    Returns:
+    --------
+    chunks: The generator of arrays with the grid and ground truth columns (generator)
+    """
+
+    columns = ['grid', 'ground_truth']
+
+    if file.endswith(".csv"):
+        chunks = pd.read_csv(file, chunksize = chunksize, **ingest.csv_options(file, columns))
+
+    elif file.endswith(".parquet"):
+
+        import pyarrow.parquet as pq
+
+        parquet = pq.ParquetFile(file)
+        chunks = (batch.to_pandas() for batch in parquet.iter_batches(batch_size = chunksize, columns = ingest.resolve_columns(parquet.schema_arrow.names, columns)))
+
+    elif file.endswith(".xlsx"):
+        chunks = [ingest.read_source(file, columns)]
+
+    else:
+        raise Exception("File extension not supported! File must be either in csv, excel or parquet format")
+
+    for data in chunks:
+
+        # Converting column names to lower case internally for validation purposes
+        data.columns = map(str.lower, data.columns)
+
+        # Raise an exception if the column ground truth is not found
+        if 'ground_truth' not in data.columns:
+            raise Exception("No grid and ground_truth columns in " + file)
+
+        # Raise an exception if the column grid has NaN values
+        if data.grid.isna().any():
+            raise Exception("Missing grid data (NaN values) in " + file)
+
+        yield data[['grid', 'ground_truth']].to_numpy(dtype = np.float32)
+
+# Function to convert many labelled files into npy shards with an index
+def build_shards(files, name = "shards", shard_rows = 1000000, seqlen = 900):
+
+    """
+    Description:
+    -----------
+    This function is used to convert many labelled files into npy shards of grid and ground truth values, with an index of the shards.
+    Every file is treated as its own series, so no window crosses two files. Consecutive shards of a file overlap by seqlen - 1 rows,
+    so every window of the file lies entirely in one shard. Only one shard per file is held in memory while it is built.
+
+    Parameters:
+    -----------
+    files: The file paths of the labelled csv, parquet or excel files (list)
+    name: The folder the shards are written to, inside output/shards (str)
+    shard_rows: The number of window starts per shard, every shard holds up to shard_rows + seqlen - 1 rows (int)
+    seqlen: The number of samples in a window (int)
+
+    Returns:
+    --------
+    f: The path of the index of the shards (str)
+    """
+
+    folder = os.path.join(os.getcwd(), "output", "shards", name)
+    Path(folder).mkdir(parents=True, exist_ok=True)
+
+    shards = []
+
+    def write(buffer, source, offset):
+
+        f = os.path.join(folder, "shard_" + str(len(shards)).zfill(6) + ".npy")
+        np.save(f, buffer)
+        shards.append({"path": os.path.basename(f), "source": os.path.realpath(source), "offset": offset, "rows": int(buffer.shape[0])})
+
+    for file in files:
+
+        buffer = np.empty((0, 2), dtype = np.float32)
+        offset = 0
+
+        for chunk in read_labelled_chunks(file, shard_rows):
+
+            buffer = np.concatenate((buffer, chunk))
+
+            # Writing full shards, keeping the last seqlen - 1 rows for the windows that start in the next shard
+            while buffer.shape[0] >= shard_rows + seqlen - 1:
+                write(buffer[:shard_rows + seqlen - 1], file, offset)
+                buffer = buffer[shard_rows:]
+                offset += shard_rows
+
+        # Writing the rest of the file when it still holds a window, the earlier shards only hold the windows starting before offset
+        if buffer.shape[0] >= seqlen:
+            write(buffer, file, offset)
+
+        print("Sharded " + file)
+
+    # Writing the index to a temporary file first so that a crash never leaves a partial index behind
+    f = os.path.join(folder, "index.json")
+
+    with open(f + ".tmp", "w") as handle:
+        json.dump({"seqlen": seqlen, "shards": shards}, handle, indent = 1)
+
+    os.replace(f + ".tmp", f)
+
+    return f
+
+# Function to stream the training windows from the shards
+def shard_dataset(index, shift = 30, batchsize = 64, shuffle_buffer = 10000, cycle_length = 4, seed = None, drop_remainder = False):
+
+    """
+    Description:
+    -----------
+    This function is used to stream the windows of the shards listed in an index, reading the shards as memory-mapped arrays.
+    The shards are visited in a shuffled order, cycle_length of them are read at a time and their windows are interleaved,
+    then mixed in a shuffle buffer of a bounded number of windows, so the memory used does not grow with the number of shards.
+    Window starts are counted from the start of every file, like the windows of finetune_15min_model() for that file.
+
+    Parameters:
+    -----------
+    index: The path of the index written by build_shards() (str)
+    shift: Number of samples between the starts of two windows (int)
+    batchsize: The batchsize of the data (int)
+    shuffle_buffer: The number of windows in the shuffle buffer, 0 turns both shuffles off (int)
+    cycle_length: The number of shards read at the same time (int)
+    seed: The seed of the shuffles (int)
+    drop_remainder: Whether the last incomplete batch is dropped (bool)
+
+    Returns:
+    --------
+    dataset: The dataset of (window, label) batches (tf.data.Dataset)
+    """
+
+    import tensorflow as tf
+
+    with open(index) as handle:
+        meta = json.load(handle)
+
+    seqlen = meta["seqlen"]
+    folder = os.path.dirname(os.path.realpath(index))
+
+    # Raise an exception if the index does not list any shard
+    if not meta["shards"]:
+        raise Exception("No shards found in " + index)
+
+    paths = [os.path.join(folder, shard["path"]) for shard in meta["shards"]]
+    phases = [(-shard["offset"]) % shift for shard in meta["shards"]]
+
+    def windows(path, phase):
+
+        # Slicing the windows of a shard a few hundred at a time so that only those are copied
+        arr = np.load(path.decode(), mmap_mode = "r")
+        view = np.lib.stride_tricks.sliding_window_view(arr[:, 0], seqlen)
+        starts = np.arange(phase, arr.shape[0] - seqlen + 1, shift)
+
+        for i in range(0, starts.shape[0], 256):
+            s = starts[i:i + 256]
+            yield np.ascontiguousarray(view[s], dtype = np.float32), np.asarray(arr[s + seqlen - 1, 1:], dtype = np.float32)[:, None, :]
+
+    def shard(path, phase):
+
+        signature = (tf.TensorSpec((None, seqlen), tf.float32), tf.TensorSpec((None, 1, 1), tf.float32))
+
+        return tf.data.Dataset.from_generator(windows, output_signature = signature, args = (path, phase)).unbatch()
+
+    dataset = tf.data.Dataset.from_tensor_slices((paths, phases))
+
+    if shuffle_buffer:
+        dataset = dataset.shuffle(len(paths), seed = seed, reshuffle_each_iteration = True)
+
+    dataset = dataset.interleave(shard, cycle_length = cycle_length, block_length = 16, num_parallel_calls = tf.data.AUTOTUNE, deterministic = not shuffle_buffer)
+
+    if shuffle_buffer:
+        dataset = dataset.shuffle(shuffle_buffer, seed = seed, reshuffle_each_iteration = True)
+
+    return dataset.batch(batchsize, drop_remainder = drop_remainder).prefetch(tf.data.AUTOTUNE)
@@ -0,0 +1,358 @@
+# Importing libraries
+
+import os
+import struct
+import numpy as np
+import pandas as pd
+import importlib.util
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+# The file extension written by every sink, the "none" sink only returns the predictions
+extensions = {"csv": ".csv", "parquet": ".parquet", "arrow": ".arrow", "npy": ".npy"}
+
+# The background thread writing the exports and the writes that have not finished yet
+writer = None
+pending = []
+
+# Function to validate a sink and the optional libraries it needs
+def check_sink(sink):
+
+    """
+    Description:
+    -----------
+    This function is used to validate the name of a sink and check that pyarrow is installed for the columnar sinks
+
+    Parameters:
+    -----------
+    sink: The sink to be validated, one of "none", "csv", "parquet", "arrow" or "npy" (str)
+
+    Returns:
+    --------
+    None
+    """
+
+    if sink != "none" and sink not in extensions:
+        raise Exception("Sink must be one of 'none', 'csv', 'parquet', 'arrow' or 'npy'")
+
+    if sink in ("parquet", "arrow") and importlib.util.find_spec("pyarrow") is None:
+        raise Exception("The " + sink + " sink requires pyarrow to be installed")
+
+# Function to build the path of an exported file
+def output_path(sink, out_fname = None, name = "predictions_15_min"):
+
+    """
+    Description:
+    -----------
+    This function is used to build the path of an exported file inside output/files
+
+    Parameters:
+    -----------
+    sink: The sink the file is written with (str)
+    out_fname: The file name for the exported file, defaults to name with the extension of the sink (str)
+    name: The default file name without extension (str)
+
+    Returns:
+    --------
+    f: The path of the exported file (str)
+    """
+
+    f = name + extensions[sink]
+
+    if out_fname is not None:
+        f = out_fname
+
+    Path(os.path.join(os.getcwd(), "output", "files")).mkdir(parents=True, exist_ok=True)
+
+    return os.path.join(os.getcwd(), "output", "files", f)
+
+# Function to write a dataframe with the predictions to a file
+def write(data, sink, f):
+
+    """
+    Description:
+    -----------
+    This function is used to write the dataframe with the predictions with the given sink
+
+    Parameters:
+    -----------
+    data: The dataframe with the predictions (pandas.DataFrame)
+    sink: One of "csv", "parquet", "arrow" or "npy". The npy sink only writes the EV labels (str)
+    f: The path of the exported file (str)
+
+    Returns:
+    --------
+    None
+    """
+
+    if sink == "csv":
+        data.to_csv(f)
+
+    elif sink == "parquet":
+        data.to_parquet(f)
+
+    elif sink == "arrow":
+
+        import pyarrow as pa
+
+        table = pa.Table.from_pandas(data)
+
+        with pa.ipc.new_file(f, table.schema) as file:
+            file.write_table(table)
+
+    elif sink == "npy":
+        np.save(f, data['EV'].to_numpy(dtype = np.int8))
+
+# Function to export the predictions, optionally on a background thread
+def export(data, sink = "csv", out_fname = None, background = False, name = "predictions_15_min"):
+
+    """
+    Description:
+    -----------
+    This function is used to export the dataframe with the predictions with the given sink.
+    With background set, the write runs on a background thread and the dataframe must not be modified until wait() returns.
+
+    Parameters:
+    -----------
+    data: The dataframe with the predictions (pandas.DataFrame)
+    sink: One of "none", "csv", "parquet", "arrow" or "npy". The npy sink only writes the EV labels (str)
+    out_fname: The file name for the exported file (str)
+    background: Whether the file is written on a background thread (bool)
+    name: The default file name without extension (str)
+
+    Returns:
+    --------
+    f: The path of the exported file, None for the "none" sink (str)
+    """
+
+    global writer
+
+    check_sink(sink)
+
+    if sink == "none":
+        return None
+
+    f = output_path(sink, out_fname, name)
+
+    if background:
+
+        # Starting a single writer thread so that the files are written in the order they were exported
+        if writer is None:
+            writer = ThreadPoolExecutor(max_workers = 1)
+
+        pending.append(writer.submit(write, data, sink, f))
+
+    else:
+        write(data, sink, f)
+
+    return f
+
+# Function to wait for the background writes
+def wait():
+
+    """
+    Description:
+    -----------
+    This function is used to wait until every background write has finished, raising the first error of a failed write
+
+    Parameters:
+    -----------
+    None
+
+    Returns:
+    --------
+    None
+    """
+
+    while pending:
+        pending.pop(0).result()
+
+# Function to build a fixed size npy header for a label array
+def npy_header(rows):
+
+    """
+    Description:
+    -----------
+    This function is used to build a 128 byte npy (version 1.0) header for a one dimensional int8 array, so it can be rewritten in place
+
+    Parameters:
+    -----------
+    rows: The number of labels in the array (int)
+
+    Returns:
+    --------
+    header: The header bytes (bytes)
+    """
+
+    header = "{'descr': '|i1', 'fortran_order': False, 'shape': (" + str(rows) + ",), }"
+
+    return b"\x93NUMPY\x01\x00" + struct.pack("<H", 118) + header.ljust(117).encode("latin1") + b"\n"
+
+# Class for appending chunks of predictions to a single file
+class ChunkWriter:
+
+    def __init__(self, sink, f):
+
+        """
+        Description:
+        -----------
+        This class is used to append the predictions chunk by chunk to a single file, keeping only one chunk in memory.
+        The parquet and arrow sinks write grid as float32, EV as int8 and the row index as int64, the other integer columns as float64
+        and the object columns as text, so that a later chunk where a column has missing values still matches the schema of the file.
+
+        Parameters:
+        -----------
+        sink: One of "none", "csv", "parquet", "arrow" or "npy". The npy sink only writes the EV labels (str)
+        f: The path of the exported file (str)
+
+        Returns:
+        --------
+        None
+        """
+
+        check_sink(sink)
+
+        self.sink = sink
+        self.f = f
+        self.file = None
+        self.schema = None
+        self.rows = 0
+
+    def write(self, data):
+
+        """
+        Description:
+        -----------
+        This function is used to append a chunk of predictions to the file
+
+        Parameters:
+        -----------
+        data: The chunk with the predictions (pandas.DataFrame)
+
+        Returns:
+        --------
+        None
+        """
+
+        if self.sink == "csv":
+            data.to_csv(self.f, mode = "w" if self.rows == 0 else "a", header = self.rows == 0)
+
+        elif self.sink in ("parquet", "arrow"):
+
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            # Storing the row index as a column so that every chunk has the same schema
+            data = self.fixed_dtypes(data.reset_index())
+
+            if self.file is None:
+                self.schema = self.arrow_schema(data)
+                self.file = pq.ParquetWriter(self.f, self.schema) if self.sink == "parquet" else pa.ipc.new_file(self.f, self.schema)
+
+            self.file.write_table(pa.Table.from_pandas(data, schema = self.schema, preserve_index = False))
+
+        elif self.sink == "npy":
+
+            # Writing a placeholder header, it is rewritten with the real shape once the last chunk is written
+            if self.file is None:
+                self.file = open(self.f, "wb")
+                self.file.write(npy_header(0))
+
+            self.file.write(data['EV'].to_numpy(dtype = np.int8).tobytes())
+
+        self.rows += data.shape[0]
+
+    def fixed_dtypes(self, data):
+
+        """
+        Description:
+        -----------
+        This function is used to convert the columns of a chunk to the dtypes every chunk is written with
+
+        Parameters:
+        -----------
+        data: The chunk with the row index as its first column (pandas.DataFrame)
+
+        Returns:
+        --------
+        data: The chunk with the converted columns (pandas.DataFrame)
+        """
+
+        dtypes = {}
+
+        for i, name in enumerate(data.columns):
+
+            if name == 'grid':
+                dtypes[name] = np.float32
+            elif name == 'EV':
+                dtypes[name] = np.int8
+            elif i == 0 and pd.api.types.is_integer_dtype(data[name]):
+                dtypes[name] = np.int64
+
+            # An integer column becomes float64 as soon as a chunk has a missing value in it
+            elif pd.api.types.is_integer_dtype(data[name]):
+                dtypes[name] = np.float64
+
+        return data.astype(dtypes)
+
+    def arrow_schema(self, data):
+
+        """
+        Description:
+        -----------
+        This function is used to build the schema of the file from the dtypes of the columns rather than from their values,
+        so that a column holding only missing values in the first chunk is not typed as null
+
+        Parameters:
+        -----------
+        data: The chunk converted to the dtypes every chunk is written with (pandas.DataFrame)
+
+        Returns:
+        --------
+        schema: The schema of the file (pyarrow.Schema)
+        """
+
+        import pyarrow as pa
+
+        inferred = pa.Schema.from_pandas(data, preserve_index = False)
+        fields = []
+
+        for name in data.columns:
+
+            dtype = data[name].dtype
+
+            if dtype == object or pd.api.types.is_string_dtype(dtype):
+                fields.append(pa.field(str(name), pa.string()))
+            elif isinstance(dtype, np.dtype) and dtype.kind in "biufM":
+                fields.append(pa.field(str(name), pa.from_numpy_dtype(dtype)))
+            else:
+                fields.append(inferred.field(str(name)))
+
+        return pa.schema(fields, metadata = inferred.metadata)
+
+    def close(self):
+
+        """
+        Description:
+        -----------
+        This function is used to finish the file once the last chunk has been written
+
+        Parameters:
+        -----------
+        None
+
+        Returns:
+        --------
+        None
+        """
+
+        if self.file is None:
+            return
+
+        # Rewriting the npy header with the real number of labels
+        if self.sink == "npy":
+            self.file.seek(0)
+            self.file.write(npy_header(self.rows))
+
+        self.file.close()
+        self.file = None
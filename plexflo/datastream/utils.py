@@ -1,8 +1,10 @@
 # Importing libraries
 
 import os
+import sys
+import json
 import datetime
-import matplotlib.pyplot as plt
+from pathlib import Path
 
 # Function to plot the graph and export them as pngs
 def export(history):
@@ -14,20 +16,34 @@ def export(history):
 
     Parameters:
     -----------
-    history: The history of the model (keras.callbacks.History)
+    history: The history of the model, the dict of its metrics or the path of the history.json written by the training monitor (keras.callbacks.History, dict or str)
 
     Returns:
     --------
     None
     """
+
+    # Reading the history recorded by the training monitor
+    if isinstance(history, str):
+        with open(history) as handle:
+            history = json.load(handle)
+
+    if not isinstance(history, dict):
+        history = history.history
+
+    # Importing matplotlib only when graphs are exported
+    import matplotlib.pyplot as plt
+
+    # Creates the graphs folder (if it doesn't exist)
+    Path(os.path.join(os.getcwd(), "output", "graphs")).mkdir(parents=True, exist_ok=True)
     
     # Plotting the Accuracy Graph
     plt.figure()              
-    plt.plot(history.history['accuracy'])
+    plt.plot(history['accuracy'])
     
     # Handling the validation accuracy if the metrics exists in history object
     try:    
-        plt.plot(history.history['val_accuracy'])
+        plt.plot(history['val_accuracy'])
     except:
         pass
 
@@ -42,11 +58,11 @@ def export(history):
 
     # Plotting the Accuracy Graph
     plt.figure()
-    plt.plot(history.history['loss'])
+    plt.plot(history['loss'])
 
     # Handling the validation accuracy if the metrics exists in history object
     try:
-        plt.plot(history.history['val_loss'])
+        plt.plot(history['val_loss'])
     except:
         pass
 
@@ -57,4 +73,31 @@ def export(history):
     plt.grid()
 
     # Saving the loss graph as png
-    plt.savefig(os.path.join(os.getcwd(), "output", "graphs", "loss.png"))
\ No newline at end of file
+    plt.savefig(os.path.join(os.getcwd(), "output", "graphs", "loss.png"))
+
+# Function to read the peak resident memory of the process
+def peak_rss_mb():
+
+    """
+    Description:
+    -----------
+    This function is used to read the peak resident memory of the process so far
+
+    Parameters:
+    -----------
+    None
+
+    Returns:
+    --------
+    rss: The peak resident memory in MB, None when it cannot be read on this platform (float)
+    """
+
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # Linux reports kilobytes and macOS reports bytes
+    return rss / (1024.0 * 1024.0) if sys.platform == "darwin" else rss / 1024.0
@@ -0,0 +1,70 @@
+# Importing libraries
+
+import numpy as np
+
+# Function to build a training dataset that serves windows by their start offset
+def window_dataset(arr, seqlen = 900, shift = 30, batchsize = 64, shuffle = False, cache = False, seed = None, drop_remainder = False):
+
+    """
+    Description:
+    -----------
+    This function is used to build the windowed training dataset from a single array of grid and ground truth values.
+    Only the window start offsets and labels flow through the dataset, the windows are gathered from one buffer a whole batch at a time.
+    Every element matches the pairs built with Dataset.window(): the grid values of the window and the ground truth of its last sample.
+
+    Parameters:
+    -----------
+    arr: The array with the grid values in the first column and the ground truth in the others, can be memory-mapped (numpy.ndarray)
+    seqlen: The number of samples in a window (int)
+    shift: Number of samples between the starts of two windows (int)
+    batchsize: The batchsize of the data (int)
+    shuffle: Whether the window order is reshuffled every epoch, only the start offsets are shuffled (bool)
+    cache: Whether the gathered batches are kept in memory after the first epoch, cannot be combined with shuffle (bool)
+    seed: The seed of the shuffle (int)
+    drop_remainder: Whether the last incomplete batch is dropped (bool)
+
+    Returns:
+    --------
+    dataset: The dataset of (window, label) batches (tf.data.Dataset)
+    """
+
+    import tensorflow as tf
+
+    # Raise an exception if the cached batches would freeze the shuffled order
+    if shuffle and cache:
+        raise Exception("Cache cannot be combined with shuffle")
+
+    # Finding every window start, none when the data is shorter than a window, and reading the labels of the last sample of every window in one go
+    starts = np.arange(0, arr.shape[0] - seqlen + 1, shift, dtype = np.int64)
+    labels = np.asarray(arr[starts + seqlen - 1, 1:], dtype = np.float32)[:, None, :]
+
+    dataset = tf.data.Dataset.from_tensor_slices((starts, labels))
+
+    if shuffle:
+        dataset = dataset.shuffle(max(starts.shape[0], 1), seed = seed, reshuffle_each_iteration = True)
+
+    dataset = dataset.batch(batchsize, drop_remainder = drop_remainder)
+
+    # Gathering the windows of a batch from the grid values, memory-mapped arrays are sliced by numpy so they are never loaded whole
+    if isinstance(arr, np.memmap):
+
+        view = np.lib.stride_tricks.sliding_window_view(arr[:, 0], seqlen)
+
+        def gather(s, y):
+            x = tf.numpy_function(lambda s: np.ascontiguousarray(view[s], dtype = np.float32), [s], tf.float32)
+            return tf.reshape(x, (-1, seqlen)), y
+
+    else:
+
+        grid = tf.constant(np.asarray(arr[:, 0], dtype = np.float32))
+        offsets = tf.range(seqlen, dtype = tf.int64)
+
+        def gather(s, y):
+            return tf.gather(grid, s[:, None] + offsets[None, :]), y
+
+    dataset = dataset.map(gather, num_parallel_calls = tf.data.AUTOTUNE)
+
+    if cache:
+        dataset = dataset.cache()
+
+    return dataset.prefetch(tf.data.AUTOTUNE)
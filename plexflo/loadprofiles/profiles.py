@@ -1,9 +1,172 @@
 import os
+import re
+import threading
+import numpy as np
 import pandas as pd
 
+# The folder of the bundled profiles
+folder = os.path.join(os.path.dirname(os.path.realpath(__file__)), "files")
+
+# The file name of a profile: the peak type, the day type (WD weekday, WE weekend) and the season (SU summer, WI winter, SH shoulder)
+pattern = re.compile(r"^([a-z]+)_peak_average_household_(W[DE])_([A-Z]{2})(\.csv)?$")
+
+# The store shared by show() and use(), loaded on first access
+store = None
+store_lock = threading.Lock()
+
+# Defining a function for splitting a profile name into its parts
+def parse(name):
+
+    """
+    Description:
+    -----------
+    This function is used to split the name of a profile into its peak type, day type and season
+
+    Parameters:
+    -----------
+    name: The name of the profile, with or without the .csv extension, e.g. morning_peak_average_household_WD_SU.csv (str)
+
+    Returns:
+    --------
+    parts: The peak type, the day type and the season, e.g. ("morning", "WD", "SU") (tuple)
+    """
+
+    match = pattern.match(os.path.basename(name))
+
+    # Raise an exception if the name is not the name of a profile
+    if match is None:
+        raise Exception("Not a load profile name: " + str(name) + ", see show()")
+
+    return match.group(1), match.group(2), match.group(3)
+
+# Class for holding every profile in a single array
+class ProfileStore:
+
+    def __init__(self, folder = folder):
+
+        """
+        Description:
+        -----------
+        This class is used to read every profile of a folder once into a single (peak_type, day_type, season, hour) array of kW multipliers.
+        Files with an Hour column are ordered by it, files with only a kW_multiplier column are taken in order.
+
+        Parameters:
+        -----------
+        folder: The folder of the profile files (str)
+
+        Returns:
+        --------
+        None
+        """
+
+        self.names = sorted(f for f in os.listdir(folder) if f.endswith(".csv") and pattern.match(f))
+
+        # Raise an exception if there is nothing to load
+        if not self.names:
+            raise Exception("No load profiles found in " + folder)
+
+        parts = [parse(name) for name in self.names]
+
+        self.peak_types = tuple(sorted({p[0] for p in parts}))
+        self.day_types = tuple(sorted({p[1] for p in parts}))
+        self.seasons = tuple(sorted({p[2] for p in parts}))
+
+        self.multipliers = np.full((len(self.peak_types), len(self.day_types), len(self.seasons), 24), np.nan, dtype = np.float64)
+        self.positions = {}
+
+        for name, (peak_type, day_type, season) in zip(self.names, parts):
+
+            df = pd.read_csv(os.path.join(folder, name))
+
+            # Raise an exception if the file does not hold one multiplier per hour
+            if 'kW_multiplier' not in df.columns or len(df) != 24:
+                raise Exception("Load profile " + name + " must have a kW_multiplier column with 24 rows")
+
+            if 'Hour' in df.columns:
+                df = df.sort_values('Hour')
+
+            position = (self.peak_types.index(peak_type), self.day_types.index(day_type), self.seasons.index(season))
+            self.multipliers[position] = df['kW_multiplier'].to_numpy(dtype = np.float64)
+            self.positions[(peak_type, day_type, season)] = position
+
+        # Sharing the array read-only, so views handed out cannot change the store
+        self.multipliers.setflags(write = False)
+
+    def get(self, peak_type, day_type, season):
+
+        """
+        Description:
+        -----------
+        This function is used to look up a profile by its parts, without copying it
+
+        Parameters:
+        -----------
+        peak_type: The peak type, e.g. morning, evening or dual (str)
+        day_type: Either "WD" or "WE" (str)
+        season: Either "SU", "WI" or "SH" (str)
+
+        Returns:
+        --------
+        multipliers: The read-only view of the 24 hourly kW multipliers (numpy.ndarray)
+        """
+
+        position = self.positions.get((peak_type, day_type, season))
+
+        # Raise an exception if the profile is not bundled
+        if position is None:
+            raise Exception("No load profile for " + "_".join((str(peak_type), str(day_type), str(season))) + ", see show()")
+
+        return self.multipliers[position]
+
+# Defining a function for loading the store
+def load():
+
+    """
+    Description:
+    -----------
+    This function is used to get the store of the bundled profiles, reading the files on the first call only
+
+    Parameters:
+    -----------
+    None
+
+    Returns:
+    --------
+    store: The store of the bundled profiles (ProfileStore)
+    """
+
+    global store
+
+    with store_lock:
+        if store is None:
+            store = ProfileStore()
+
+    return store
+
+# Defining a function for looking up a profile
+def multipliers(peak_type, day_type, season):
+
+    """
+    Description:
+    -----------
+    This function is used to look up the hourly multipliers of a bundled profile, e.g. multipliers("evening", "WD", "SU")
+
+    Parameters:
+    -----------
+    peak_type: The peak type, e.g. morning, evening or dual (str)
+    day_type: Either "WD" or "WE" (str)
+    season: Either "SU", "WI" or "SH" (str)
+
+    Returns:
+    --------
+    multipliers: The read-only view of the 24 hourly kW multipliers (numpy.ndarray)
+    """
+
+    return load().get(peak_type, day_type, season)
+
 # Defining a function for listing files in a directory
 def show():
-    
+
     """
     Description:
     -----------
@@ -18,32 +181,28 @@ def show():
     None
     """
 
-    # Listing all the files in the directory
-    files = os.listdir(os.path.join(os.path.dirname(os.path.realpath(__file__)), 'files'))
-
     # Printing the files
-    for file in files:
-        print(file)
+    for name in load().names:
+        print(name)
 
 # Defining a function for loading a profile
 def use(name="morning_peak_average_household_WD_SU.csv"):
-        
+
     """
     Description:
     -----------
-    This function is used to load a profile from the files directory
+    This function is used to load a profile from the store. Every profile has the same Hour and kW_multiplier columns.
 
     Parameters:
     -----------
-    profile: The filename to load (string)
+    name: The name of the profile, see show() (str)
 
     Returns:
     --------
-    data: The dataframe with the predictions (pandas.DataFrame)
+    data: The dataframe with the hourly multipliers, a copy that can be changed freely (pandas.DataFrame)
     """
 
-    # Loading the profile
-    df = pd.read_csv(os.path.join(os.path.dirname(os.path.realpath(__file__)), "files", name))
+    values = multipliers(*parse(name))
 
     # Returning the loaded profile
-    return df
\ No newline at end of file
+    return pd.DataFrame({'Hour': np.arange(24), 'kW_multiplier': values.copy()})
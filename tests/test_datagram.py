@@ -0,0 +1,58 @@
+from plexflo.connect.datagram import SequenceTracker
+
+
+def test_in_order_duplicate_and_late_datagrams():
+
+    tracker = SequenceTracker()
+
+    assert tracker.accept("m", 1, 0, 10) == [(0, 10)]
+
+    # Skipping 10 to 19 opens a gap
+    assert tracker.accept("m", 1, 20, 10) == [(0, 10)]
+    assert tracker.stats("m")["missing"] == 10
+
+    # A resent datagram is dropped
+    assert tracker.accept("m", 1, 20, 10) == []
+
+    # A late datagram fills part of the gap
+    assert tracker.accept("m", 1, 10, 5) == [(0, 5)]
+
+    stats = tracker.stats("m")
+    assert stats["received"] == 25
+    assert stats["duplicates"] == 10
+    assert stats["out_of_order"] == 5
+    assert stats["missing"] == 5
+    assert stats["gaps"] == [(15, 20)]
+
+
+def test_gaps_given_up_are_lost_not_duplicates():
+
+    tracker = SequenceTracker(max_gaps = 2)
+
+    for sequence in (0, 2, 4, 6):
+        tracker.accept("m", 1, sequence, 1)
+
+    # The gap at 1 was given up when the third gap opened
+    stats = tracker.stats("m")
+    assert stats["lost"] == 1
+    assert stats["missing"] == 2
+    assert stats["gaps"] == [(3, 4), (5, 6)]
+
+    # Its reading arriving late is expired rather than a duplicate
+    assert tracker.accept("m", 1, 1, 1) == []
+    assert tracker.stats("m")["expired"] == 1
+    assert tracker.stats("m")["duplicates"] == 0
+
+    # The open gaps can still be filled
+    assert tracker.accept("m", 1, 3, 1) == [(0, 1)]
+    assert tracker.stats("m")["missing"] == 1
+
+
+def test_new_session_restarts_the_sequence():
+
+    tracker = SequenceTracker()
+
+    tracker.accept("m", 1, 0, 10)
+
+    assert tracker.accept("m", 2, 0, 10) == [(0, 10)]
+    assert tracker.stats()["duplicates"] == 0
@@ -0,0 +1,38 @@
+import numpy as np
+from plexflo.connect import protocol
+
+
+def test_readings_frame_round_trip():
+
+    timestamps = np.arange(5, dtype = np.int64) * 60 * 10**9
+    values = np.linspace(0, 1, 5, dtype = np.float32)
+
+    frames = protocol.Decoder().feed(protocol.encode("meter_1", timestamps, values))
+
+    assert len(frames) == 1
+    assert frames[0].meter_id == "meter_1"
+    assert frames[0].session is None and frames[0].sequence is None
+    np.testing.assert_array_equal(frames[0].timestamps, timestamps)
+    np.testing.assert_array_equal(frames[0].values, values)
+
+
+def test_sequenced_frames_and_acks_split_across_reads():
+
+    data = protocol.encode("meter_1", [1, 2], [0.5, 1.5], session = 7, sequence = 40) + protocol.encode_ack("meter_1", 7, 42)
+
+    decoder = protocol.Decoder()
+    frames = []
+
+    # Feeding one byte at a time, so every frame arrives in pieces
+    for i in range(len(data)):
+        frames += decoder.feed(data[i:i + 1])
+
+    assert len(frames) == 2
+
+    frame, ack = frames
+    assert (frame.meter_id, frame.session, frame.sequence) == ("meter_1", 7, 40)
+    np.testing.assert_array_equal(frame.values, np.array([0.5, 1.5], dtype = np.float32))
+
+    assert isinstance(ack, protocol.Ack)
+    assert (ack.meter_id, ack.session, ack.sequence) == ("meter_1", 7, 42)
+    assert len(decoder.buffer) == 0
@@ -0,0 +1,41 @@
+import numpy as np
+from plexflo.connect.realtime import RingBuffer
+
+
+def test_back_to_back_windows_across_calls():
+
+    ring = RingBuffer(seqlen = 4)
+    series = np.arange(10, dtype = np.float32)
+
+    windows, ends = ring.extend(series[:3])
+    assert windows.shape == (0, 4)
+
+    windows, ends = ring.extend(series[3:])
+    np.testing.assert_array_equal(windows, [[0, 1, 2, 3], [4, 5, 6, 7]])
+    np.testing.assert_array_equal(ends, [0, 4])
+
+
+def test_hopped_windows_one_reading_at_a_time():
+
+    ring = RingBuffer(seqlen = 4, hop = 2)
+    windows = []
+
+    for value in np.arange(9, dtype = np.float32):
+        completed, _ = ring.extend([value])
+        windows += list(completed)
+
+    np.testing.assert_array_equal(windows, [[0, 1, 2, 3], [2, 3, 4, 5], [4, 5, 6, 7]])
+
+
+def test_windows_match_a_sliding_view_for_any_split():
+
+    series = np.random.default_rng(0).random(200).astype(np.float32)
+    expected = np.lib.stride_tricks.sliding_window_view(series, 16)[::5]
+
+    ring = RingBuffer(seqlen = 16, hop = 5)
+    windows = []
+
+    for part in np.array_split(series, [1, 7, 30, 31, 120]):
+        windows += list(ring.extend(part)[0])
+
+    np.testing.assert_array_equal(windows, expected)
@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+import pytest
+from pathlib import Path
+
+pytest.importorskip("pyarrow")
+
+from plexflo.connect import storage
+
+
+def readings(start, n):
+
+    # One reading a minute from 23:00 so that the readings span two days
+    timestamps = pd.Timestamp("2024-01-01 23:00").value + np.arange(start, start + n, dtype = np.int64) * 60 * 10**9
+    return timestamps, np.arange(start, start + n, dtype = np.float32)
+
+
+def test_write_rotate_compact(tmp_path):
+
+    root = str(tmp_path)
+    store = storage.ChunkStore(root, flush_rows = 50, chunk_rows = 100)
+
+    # Writing every append, so the chunk is closed after its first write reaching chunk_rows
+    for start in range(0, 300, 30):
+        store.append("meter_1", *readings(start, 30))
+        store.flush()
+
+    store.close()
+
+    folder = Path(storage.meter_folder(root, "meter_1"))
+    assert len(list(folder.glob("*.arrows"))) >= 2
+    assert not list(folder.glob("*.part"))
+
+    data = storage.read("meter_1", root)
+    np.testing.assert_array_equal(data['values'], np.arange(300, dtype = np.float32))
+
+    files = storage.compact(root)
+
+    assert len(files) == 2
+    assert not list(folder.glob("*.arrows"))
+
+    data = storage.read("meter_1", root)
+    np.testing.assert_array_equal(data['values'], np.arange(300, dtype = np.float32))
+
+
+def test_compact_merges_into_existing_days_once(tmp_path):
+
+    root = str(tmp_path)
+
+    for start in (0, 100):
+        store = storage.ChunkStore(root)
+        store.append("meter_1", *readings(start, 100))
+        store.close()
+        storage.compact(root)
+
+    # Compacting again without new chunks changes nothing
+    storage.compact(root)
+
+    data = storage.read("meter_1", root)
+    np.testing.assert_array_equal(data['values'], np.arange(200, dtype = np.float32))